@@ -1,9 +1,29 @@
 
+from ferpa_startup import STARTUP, lazy, load_default
+import io
+import os
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
-from ferpa_logic import SimuladorFerpaV5
+from ferpa_cache import LRUCache, cached_figure, canonical_key, fingerprint
+from ferpa_config import DEFAULT_CONFIG_PATH, compile_config
+from ferpa_debt import PROFILES, debt_frame
+from ferpa_goalseek import goal_seek
+from ferpa_logic import COLUMNAS, SIDEBAR_RANGES, batch_result, run_batch
+from ferpa_sensitivity import tornado
+from ferpa_portfolio import parse_ramp, run_portfolio
+from ferpa_profile import PROFILER
+from ferpa_stages import IncrementalModel
+
+# Heavy imports load on first use: Streamlit streams each element as the script reaches
+# it, so the header and KPIs paint before plotly, scipy (riesgo), openpyxl (bóveda) and
+# pyarrow (comparar) are imported
+go = lazy("plotly.graph_objects")
+px = lazy("plotly.express")
+ferpa_export = lazy("ferpa_export")
+ferpa_montecarlo = lazy("ferpa_montecarlo")
+ferpa_scenarios = lazy("ferpa_scenarios")
+STARTUP.mark("imports")
 
 # --- 1. PAGE CONFIG & THEME ---
 st.set_page_config(page_title="FERPA FINANCIAL SUITE", page_icon="💎", layout="wide", initial_sidebar_state="expanded")
@@ -68,34 +88,231 @@ with st.sidebar:
         tax = st.slider("Impuesto Renta (%)", 0, 30, 30)
         inf = st.number_input("Inflación Anual (%)", 0.0, 10.0, 3.0) / 100.0
 
+    with st.expander("🏛️ 5. FINANCIAMIENTO", expanded=False):
+        debt_share = st.slider("Deuda Senior (% CAPEX)", 0, 80, 0) / 100.0
+        interest = st.slider("Tasa de Interés (%)", 0.0, 20.0, 8.0) / 100.0
+        debt_tenor = st.slider("Plazo (Años)", 2, 10, 7)
+        debt_grace = st.slider("Periodo de Gracia (Años)", 0, debt_tenor - 1, min(1, debt_tenor - 1))
+        debt_profile = st.selectbox("Amortización", PROFILES, format_func=lambda p: {
+            "annuity": "Cuota fija", "linear": "Lineal", "sculpted": "Esculpida (DSCR)", "bullet": "Bullet"}[p])
+        debt_dscr = st.slider("DSCR Objetivo (esculpida)", 1.0, 2.0, 1.3, disabled=debt_profile != "sculpted")
+        lockup_dscr = st.slider("Covenant DSCR (bloqueo de dividendos)", 1.0, 2.0, 1.2)
+        cash_sweep = st.slider("Cash Sweep (%)", 0, 100, 0) / 100.0
+
     st.markdown("---")
     st.caption("FERPA SUITE v5.0")
     st.markdown("<div style='margin-top: 20px; font-size: 11px; color: #666;'>Desarrollado por:<br><strong style='color: #00FFAA;'>Juan Gabriel Ortiz</strong><br>Director de Proyectos</div>", unsafe_allow_html=True)
 
 # --- 3. LOGIC EXECUTION ---
-sim = SimuladorFerpaV5(
+# Process-wide caches shared by every session: results keyed on the canonical parameter
+# tuple, figures keyed on the content of the df slices each builder reads
+@st.cache_resource
+def get_caches():
+    return (LRUCache(max_entries=512, max_bytes=64 * 2**20, name="scenarios"),
+            LRUCache(max_entries=2048, max_bytes=128 * 2**20, name="figures"))
+
+scenario_cache, figure_cache = get_caches()
+
+# Product mix and cost structure: ferpa_config.json, or the JSON/YAML file in FERPA_CONFIG
+@st.cache_resource
+def get_plan(path):
+    return compile_config(path)
+
+plan_path = os.environ.get("FERPA_CONFIG", DEFAULT_CONFIG_PATH)
+plan = get_plan(plan_path)
+
+# Default sidebar scenario precomputed at build time (python ferpa_startup.py precompute):
+# the first paint of a fresh container is served from it instead of the model
+@st.cache_resource
+def seed_default(plan_key):
+    hit = load_default(plan)
+    if hit is not None:
+        params, result = hit
+        scenario_cache.put((plan.key, canonical_key(params)), (result, None))
+    return hit is not None
+
+seed_default(plan.key)
+
+# Per-session stage graph: a slider only re-runs the stages downstream of it
+stage_model = st.session_state.setdefault("stage_model", IncrementalModel())
+
+# Sidebar financing values -> one senior tranche (ferpa_debt), None while unlevered
+DEBT_KEYS = ["debt_share", "debt_tenor", "debt_grace", "debt_profile", "debt_dscr", "lockup_dscr", "cash_sweep"]
+
+def financing(params):
+    if params["debt_share"] <= 0:
+        return None
+    tranche = dict(share=params["debt_share"], tenor=params["debt_tenor"], grace=params["debt_grace"],
+                   profile=params["debt_profile"], dscr=params["debt_dscr"])
+    return {"tranches": [tranche], "lockup_dscr": params["lockup_dscr"], "sweep": params["cash_sweep"]}
+
+def simulate(params):
+    def run():
+        batch = stage_model.run(**{k: v for k, v in params.items() if k not in DEBT_KEYS}, plan=plan,
+                                debt=financing(params))
+        return batch_result(batch, 0), debt_frame(batch, 0)
+    return scenario_cache.get_or_compute((plan.key, canonical_key(params)), run)
+
+stage_model.last_run = []
+sim_params = dict(
     t_dia=ton_dia, p_base_bloque=p_bloque, p_tipping=p_tip, p_recic=p_rec,
-    p_bono_co2=p_co2, p_bono_agua=p_agua, capex=capex, interest_rate=0.0,
-    tax_rate=tax/100.0, inflation=inf, roi_target=roi_target
+    p_bono_co2=p_co2, p_bono_agua=p_agua, capex=capex, interest_rate=interest,
+    tax_rate=tax/100.0, inflation=inf, roi_target=roi_target,
+    debt_share=debt_share, debt_tenor=debt_tenor, debt_grace=debt_grace, debt_profile=debt_profile,
+    debt_dscr=debt_dscr, lockup_dscr=lockup_dscr, cash_sweep=cash_sweep
 )
-res = sim.run_simulation()
+res, debt_df = simulate(sim_params)
+STARTUP.mark("modelo")
+
+with st.sidebar:
+    with st.expander("⏱️ Recálculo por Etapas", expanded=False):
+        if stage_model.last_run:
+            st.dataframe(pd.DataFrame([
+                {"Etapa": r["stage"], "Recalculada": "✅" if r["ran"] else "💾 caché", "ms": r["seconds"] * 1e3}
+                for r in stage_model.last_run
+            ]), hide_index=True, use_container_width=True)
+        else:
+            st.caption("Escenario servido completo desde caché.")
 df = res["df"]
 m = res["metrics"]
 
 def fmt(x): return f"${x:,.0f}"
 
+# --- FIGURE BUILDERS (memoized on the data they receive) ---
+@cached_figure(figure_cache)
+def fig_sankey(y1, opex_pct):
+    # Nodes: 0:Bloques, 1:Recic, 2:Tipping, 3:Bonos, 4:TOTAL_REV, 
+    #        5:OPEX, 6:Impuestos, 7:RetornoCap, 8:Dividendo, 9:CajaFerpa
+    labels = ["Venta Bloques", "Venta Recic.", "Tipping Fee", "Bonos Verdes", "INGRESOS TOTALES",
+              f"OPEX ({opex_pct:.0%})", "Impuestos", "Retorno Capital", "Dividendos", "Caja Ferpa"]
+    s_source = [0, 1, 2, 3, 4, 4, 4, 4, 4]
+    s_target = [4, 4, 4, 4, 5, 6, 7, 8, 9]
+    s_values = [y1["Rev_Bloques"], y1["Rev_Recic"], y1["Rev_Tipping"], y1["Rev_Bonos"],
+                y1["OPEX_Total"], y1["Impuestos"], y1["Pago_Retorno_Capital"], y1["Pago_Dividendos"], y1["Caja_Ferpa"]]
+    colors = ["#3498DB", "#F1C40F", "#9B59B6", "#2ECC71", "#FFFFFF", "#E74C3C", "#95A5A6", "#00FFAA", "#00FFAA", "#34495E"]
+    
+    fig = go.Figure(go.Sankey(
+        node=dict(pad=15, thickness=20, line=dict(color="black", width=0.5), label=labels, color=colors),
+        link=dict(source=s_source, target=s_target, value=s_values, color=['rgba(100,100,100,0.3)']*9)
+    ))
+    fig.update_layout(height=500, font_size=12, paper_bgcolor='rgba(0,0,0,0)', font_color="white")
+    return fig
+
+@cached_figure(figure_cache)
+def fig_sunburst(mix_data):
+    fig = px.sunburst(
+        names=list(mix_data.index),
+        parents=["Mix"] * len(mix_data),
+        values=mix_data.tolist(),
+        color_discrete_sequence=px.colors.sequential.Teal
+    )
+    fig.update_layout(height=400, paper_bgcolor='rgba(0,0,0,0)', font_color="white")
+    return fig
+
+@cached_figure(figure_cache)
+def fig_gauge(value, title, color):
+    fig = go.Figure(go.Indicator(mode="gauge+number", value=value, title={'text':title}, gauge={'axis':{'range':[0,100]}, 'bar':{'color':color}}))
+    fig.update_layout(height=200, margin=dict(t=30,b=10,l=20,r=20), paper_bgcolor='rgba(0,0,0,0)', font_color="white")
+    return fig
+
+def opex_lines(plan, y1):
+    """Year-one OPEX split into the variable part and each fixed-cost line of the plan."""
+    lines = {"Insumos/Variable": y1["Cost_Variable"]}
+    for name, column, amount in plan.fixed_lines:
+        # Lines booked to the same column share it pro rata to their configured amounts
+        total = plan.fixed_costs[column]
+        lines[f"{name} (${amount / 1e3:,.0f}k)"] = y1[column] * amount / total if total else 0.0
+    return pd.Series(lines, dtype=float)
+
+TREEMAP_COLORS = ["#2E86C1", "#1ABC9C", "#FF0055", "#F1C40F", "#9B59B6", "#E67E22"]
+
+@cached_figure(figure_cache)
+def fig_treemap(opex_total, lines):
+    fig = go.Figure(go.Treemap(
+        labels = ["OPEX TOTAL", *lines.index],
+        parents = [""] + ["OPEX TOTAL"] * len(lines),
+        values =  [opex_total, *lines.tolist()],
+        textinfo = "label+value+percent parent",
+        marker_colors = ["#333"] + [TREEMAP_COLORS[k % len(TREEMAP_COLORS)] for k in range(len(lines))]
+    ))
+    fig.update_layout(height=400, paper_bgcolor='rgba(0,0,0,0)', font_color="white")
+    return fig
+
+@cached_figure(figure_cache)
+def fig_investor_combo(pay):
+    fig = go.Figure()
+    # Bars: Payments
+    fig.add_trace(go.Bar(x=pay["Año"], y=pay["Pago_Retorno_Capital"], name="Retorno Capital", marker_color="#00FFAA"))
+    fig.add_trace(go.Bar(x=pay["Año"], y=pay["Pago_Dividendos"], name="Dividendos", marker_color="#3498DB"))
+    # Line: Remaining Investment
+    fig.add_trace(go.Scatter(x=pay["Año"], y=pay["Saldo_Inversion"], name="Saldo Inversión", mode='lines+markers', line=dict(color='#FF0055', width=3)))
+    
+    fig.update_layout(barmode='stack', title="Flujo al Socio vs Saldo Pendiente", 
+                      height=450, paper_bgcolor='rgba(0,0,0,0)', font_color="white",
+                      yaxis=dict(title="Flujo ($)"), yaxis2=dict(title="Saldo", overlaying="y", side="right"))
+    return fig
+
+@cached_figure(figure_cache)
+def fig_debt(sched, covenant):
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=sched["Año"], y=sched["Intereses"], name="Intereses", marker_color="#E74C3C"))
+    fig.add_trace(go.Bar(x=sched["Año"], y=sched["Amortizacion"], name="Amortización", marker_color="#F1C40F"))
+    fig.add_trace(go.Bar(x=sched["Año"], y=sched["Prepago"], name="Cash Sweep", marker_color="#9B59B6"))
+    fig.add_trace(go.Scatter(x=sched["Año"], y=sched["DSCR"], name="DSCR", mode='lines+markers', yaxis="y2",
+                             line=dict(color='#00FFAA', width=3)))
+    fig.add_hline(y=covenant, line_dash="dash", line_color="#FF0055", yref="y2", annotation_text="Covenant")
+    fig.update_layout(barmode='stack', title="Servicio de Deuda vs Cobertura (DSCR)",
+                      height=400, paper_bgcolor='rgba(0,0,0,0)', font_color="white",
+                      yaxis=dict(title="Servicio ($)"), yaxis2=dict(title="DSCR (x)", overlaying="y", side="right"))
+    return fig
+
+PARAM_LABELS = {
+    "t_dia": "Toneladas / Día", "p_base_bloque": "Precio Bloque", "p_tipping": "Tipping Fee",
+    "p_recic": "Precio Reciclables", "p_bono_co2": "Bono CO2", "p_bono_agua": "Bono Lixiviado",
+    "capex": "CAPEX", "tax_rate": "Impuesto Renta", "inflation": "Inflación"
+}
+
+@cached_figure(figure_cache)
+def fig_tornado(tor, metric, base_val):
+    lo, hi = tor[f"{metric}_Bajo"] - base_val, tor[f"{metric}_Alto"] - base_val
+    labels = tor["Parámetro"].map(PARAM_LABELS)
+    fig = go.Figure()
+    fig.add_trace(go.Bar(y=labels, x=lo, orientation='h', name="Parámetro −", marker_color="#FF0055"))
+    fig.add_trace(go.Bar(y=labels, x=hi, orientation='h', name="Parámetro +", marker_color="#00FFAA"))
+    fig.update_layout(barmode='overlay', title=f"Impacto sobre {metric} vs Caso Base", height=450,
+                      paper_bgcolor='rgba(0,0,0,0)', font_color="white", yaxis=dict(autorange="reversed"))
+    return fig
+
+@cached_figure(figure_cache)
+def fig_response_map(xs, ys, z, x_label, y_label, z_label, point):
+    fig = go.Figure(go.Heatmap(
+        x=xs, y=ys, z=z, colorscale="Viridis", colorbar=dict(title=z_label),
+        hovertemplate=f"{x_label}: %{{x:,.3~f}}<br>{y_label}: %{{y:,.3~f}}<br>{z_label}: %{{z:,.4~g}}<extra></extra>"))
+    fig.add_trace(go.Scatter(x=[point[0]], y=[point[1]], mode="markers", name="Escenario actual",
+                             marker=dict(color="#FF0055", size=14, symbol="x", line=dict(color="white", width=1))))
+    fig.update_layout(title=z_label, height=500, paper_bgcolor='rgba(0,0,0,0)', font_color="white",
+                      xaxis=dict(title=x_label), yaxis=dict(title=y_label), showlegend=False)
+    return fig
+
 # --- 4. MAIN INTERFACE ---
 st.markdown("<h1 style='text-align:center;'>💎 FERPA FINANCIAL SUITE <span class='neon-green'>V5</span></h1>", unsafe_allow_html=True)
 st.markdown("---")
 
-# TABS
-t1, t2, t3, t4, t5 = st.tabs([
-    "🏢 DASHBOARD GERENCIAL", "🏭 INGENIERÍA Y VENTAS", "💸 ESTRUCTURA DE COSTOS", 
-    "🤝 EL INVERSIONISTA", "📚 BÓVEDA DE DATOS"
-])
+# SECTIONS
+# Only the selected section runs: st.tabs executes every tab's code (Monte Carlo, goal
+# seeks, tornado...) on each rerun, even while it is hidden
+SECTIONS = ["🏢 DASHBOARD GERENCIAL", "🏭 INGENIERÍA Y VENTAS", "💸 ESTRUCTURA DE COSTOS",
+            "🤝 EL INVERSIONISTA", "📚 BÓVEDA DE DATOS", "🎲 RIESGO", "🌐 PORTAFOLIO", "🔀 COMPARAR"]
+section = st.radio("Sección", SECTIONS, horizontal=True, label_visibility="collapsed", key="section")
+
+# Operating inputs of run_batch and the sidebar financing, shared by several sections
+base_params = dict(t_dia=ton_dia, p_base_bloque=p_bloque, p_tipping=p_tip, p_recic=p_rec,
+                   p_bono_co2=p_co2, p_bono_agua=p_agua, capex=capex, tax_rate=tax/100.0, inflation=inf)
+debt = financing(sim_params)
+y1 = df.iloc[0]
 
 # === TAB 1: DASHBOARD GERENCIAL ===
-with t1:
+if section == SECTIONS[0]:
     # KPIs
     k1, k2, k3, k4 = st.columns(4)
     k1.markdown(f"""<div class="glass-card"><div class="metric-label">VAN (10 AÑOS)</div><div class="metric-val neon-green">{fmt(m['npv'])}</div></div>""", unsafe_allow_html=True)
@@ -105,112 +322,134 @@ with t1:
     
     # SANKEY
     st.markdown("### 🌊 FLUJO DE CAJA INTELIGENTE (AÑO 1)")
-    y1 = df.iloc[0]
-    
-    # Sankey Data
-    # Nodes: 0:Bloques, 1:Recic, 2:Tipping, 3:Bonos, 4:TOTAL_REV, 
-    #        5:OPEX, 6:Impuestos, 7:RetornoCap, 8:Dividendo, 9:CajaFerpa
-    labels = ["Venta Bloques", "Venta Recic.", "Tipping Fee", "Bonos Verdes", "INGRESOS TOTALES",
-              "OPEX (45%)", "Impuestos", "Retorno Capital", "Dividendos", "Caja Ferpa"]
-    s_source = [0, 1, 2, 3, 4, 4, 4, 4, 4]
-    s_target = [4, 4, 4, 4, 5, 6, 7, 8, 9]
-    s_values = [y1["Rev_Bloques"], y1["Rev_Recic"], y1["Rev_Tipping"], y1["Rev_Bonos"],
-                y1["OPEX_Total"], y1["Impuestos"], y1["Pago_Retorno_Capital"], y1["Pago_Dividendos"], y1["Caja_Ferpa"]]
-    colors = ["#3498DB", "#F1C40F", "#9B59B6", "#2ECC71", "#FFFFFF", "#E74C3C", "#95A5A6", "#00FFAA", "#00FFAA", "#34495E"]
-    
-    fig_san = go.Figure(go.Sankey(
-        node=dict(pad=15, thickness=20, line=dict(color="black", width=0.5), label=labels, color=colors),
-        link=dict(source=s_source, target=s_target, value=s_values, color=['rgba(100,100,100,0.3)']*9)
-    ))
-    fig_san.update_layout(height=500, font_size=12, paper_bgcolor='rgba(0,0,0,0)', font_color="white")
-    st.plotly_chart(fig_san, use_container_width=True)
+    sankey_cols = ["Rev_Bloques", "Rev_Recic", "Rev_Tipping", "Rev_Bonos", "OPEX_Total", "Impuestos",
+                   "Pago_Retorno_Capital", "Pago_Dividendos", "Caja_Ferpa"]
+    st.plotly_chart(fig_sankey(y1[sankey_cols], plan.opex_pct), use_container_width=True)
+STARTUP.mark("primer render")
 
 # === TAB 2: INGENIERÍA Y VENTAS ===
-with t2:
+if section == SECTIONS[1]:
     c2a, c2b = st.columns([2, 1])
     
     with c2a:
         st.markdown("#### MIX DE INGRESOS (SUNBURST)")
         # Calculate totals for year 1 mix
-        mix_data = df[["Bloque #5", "Adoquín Pesado", "Ladrillo Decorativo"]].iloc[0]
-        fig_sun = px.sunburst(
-            names=["Bloques", "Adoquines", "Ladrillos"],
-            parents=["Mix", "Mix", "Mix"],
-            values=[mix_data["Bloque #5"], mix_data["Adoquín Pesado"], mix_data["Ladrillo Decorativo"]],
-            color_discrete_sequence=px.colors.sequential.Teal
-        )
-        fig_sun.update_layout(height=400, paper_bgcolor='rgba(0,0,0,0)', font_color="white")
-        st.plotly_chart(fig_sun, use_container_width=True)
+        mix_data = df[plan.sku_names].iloc[0]
+        st.plotly_chart(fig_sunburst(mix_data), use_container_width=True)
         
     with c2b:
         st.markdown("#### PERFORMANCE")
         # Gauge 1 Capacity
         cap_util = min(100, (m['total_prod'] / 35000000)*100) # Assuming 35M max
-        fig_g1 = go.Figure(go.Indicator(mode="gauge+number", value=cap_util, title={'text':"Uso Planta %"}, gauge={'axis':{'range':[0,100]}, 'bar':{'color':"#00FFAA"}}))
-        fig_g1.update_layout(height=200, margin=dict(t=30,b=10,l=20,r=20), paper_bgcolor='rgba(0,0,0,0)', font_color="white")
-        st.plotly_chart(fig_g1, use_container_width=True)
+        st.plotly_chart(fig_gauge(cap_util, "Uso Planta %", "#00FFAA"), use_container_width=True)
         
         # Gauge 2 Sales Target
         sales_target = 10000000 # Example target
         sales_pct = min(100, (y1["Ingresos"] / sales_target)*100)
-        fig_g2 = go.Figure(go.Indicator(mode="gauge+number", value=sales_pct, title={'text':"Meta Ventas %"}, gauge={'axis':{'range':[0,100]}, 'bar':{'color':"#FF0055"}}))
-        fig_g2.update_layout(height=200, margin=dict(t=30,b=10,l=20,r=20), paper_bgcolor='rgba(0,0,0,0)', font_color="white")
-        st.plotly_chart(fig_g2, use_container_width=True)
+        st.plotly_chart(fig_gauge(sales_pct, "Meta Ventas %", "#FF0055"), use_container_width=True)
 
     with st.expander("📋 PLAN DE PRODUCCIÓN DETALLADO", expanded=True):
         prod_df = df[["Año", "Unidades_Total"]].copy()
-        prod_df["Bloques #5 (70%)"] = prod_df["Unidades_Total"] * 0.7
-        prod_df["Adoquines (20%)"] = prod_df["Unidades_Total"] * 0.2
-        prod_df["Ladrillos (10%)"] = prod_df["Unidades_Total"] * 0.1
+        for name, share in zip(plan.sku_names, plan.sku_share):
+            prod_df[f"{name} ({share:.0%})"] = prod_df["Unidades_Total"] * share
         st.dataframe(prod_df.style.format("{:,.0f}"), use_container_width=True)
 
 # === TAB 3: ESTRUCTURA DE COSTOS ===
-with t3:
+if section == SECTIONS[2]:
     st.markdown("#### MAPA DE CALOR DE COSTOS (TREEMAP)")
     # Treemap Data
-    y1 = df.iloc[0]
-    labels_tree = ["OPEX TOTAL", "Insumos/Variable", "Nómina", "ENERGÍA ($500k)"]
-    parents_tree = ["", "OPEX TOTAL", "OPEX TOTAL", "OPEX TOTAL"]
-    values_tree = [0, y1["Cost_Variable"], y1["Cost_Payroll"], y1["Cost_Energy"]] # Root value ignored by Plotly usually or calc sum
-    
-    fig_tree = go.Figure(go.Treemap(
-        labels = labels_tree,
-        parents = parents_tree,
-        values =  [y1["OPEX_Total"], y1["Cost_Variable"], y1["Cost_Payroll"], y1["Cost_Energy"]],
-        textinfo = "label+value+percent parent",
-        marker_colors = ["#333", "#2E86C1", "#1ABC9C", "#FF0055"]
-    ))
-    fig_tree.update_layout(height=400, paper_bgcolor='rgba(0,0,0,0)', font_color="white")
-    st.plotly_chart(fig_tree, use_container_width=True)
+    st.plotly_chart(fig_treemap(y1["OPEX_Total"], opex_lines(plan, y1)), use_container_width=True)
     
-    st.markdown("#### 📉 REGLA DEL 45%: CÁLCULO")
+    st.markdown(f"#### 📉 REGLA DEL {plan.opex_pct:.0%}: CÁLCULO")
     opex_check = df[["Año", "Rev_Bloques", "OPEX_Total", "Cost_Energy"]].copy()
     opex_check["% Real"] = (opex_check["OPEX_Total"] / opex_check["Rev_Bloques"]) * 100
     st.dataframe(opex_check.style.format({"Rev_Bloques": "${:,.0f}", "OPEX_Total": "${:,.0f}", "Cost_Energy": "${:,.0f}", "% Real": "{:.1f}%"}), use_container_width=True)
 
 # === TAB 4: EL INVERSIONISTA ===
-with t4:
+if section == SECTIONS[3]:
     st.markdown("### 🧬 ADN DE RETORNO Y GANANCIA")
     
     # Combo Chart
-    fig_combo = go.Figure()
-    # Bars: Payments
-    fig_combo.add_trace(go.Bar(x=df["Año"], y=df["Pago_Retorno_Capital"], name="Retorno Capital", marker_color="#00FFAA"))
-    fig_combo.add_trace(go.Bar(x=df["Año"], y=df["Pago_Dividendos"], name="Dividendos", marker_color="#3498DB"))
-    # Line: Remaining Investment
-    fig_combo.add_trace(go.Scatter(x=df["Año"], y=df["Saldo_Inversion"], name="Saldo Inversión", mode='lines+markers', line=dict(color='#FF0055', width=3)))
+    st.plotly_chart(fig_investor_combo(df[["Año", "Pago_Retorno_Capital", "Pago_Dividendos", "Saldo_Inversion"]]), use_container_width=True)
+    
+    if debt_df is not None:
+        with st.expander("🏛️ DEUDA SENIOR: CRONOGRAMA Y COVENANTS", expanded=True):
+            d1, d2, d3 = st.columns(3)
+            d1.metric("Deuda Inicial", fmt(capex * debt_share))
+            d2.metric("DSCR Mínimo", f"{debt_df['DSCR'].min():.2f}x")
+            d3.metric("Años con Dividendo Bloqueado", int(debt_df["Bloqueo"].sum()))
+            st.plotly_chart(fig_debt(debt_df[["Año", "Intereses", "Amortizacion", "Prepago", "DSCR"]], lockup_dscr), use_container_width=True)
+            st.dataframe(debt_df.style.format({"Saldo_Deuda": fmt, "Intereses": fmt, "Amortizacion": fmt, "Prepago": fmt,
+                                               "Servicio_Deuda": fmt, "DSCR": "{:.2f}x"}), use_container_width=True)
+    
+    # Tornado: all 2·N perturbations go through one batched evaluation
+    st.markdown("### 🌪️ SENSIBILIDAD: ¿QUÉ MUEVE EL RETORNO?")
+    s1, s2 = st.columns([1, 3])
+    delta = s1.slider("Variación (±%)", 5, 50, 10) / 100.0
+    metric = s1.radio("Métrica", ["VAN", "TIR"], horizontal=True)
+    # Same financing as the KPI cards: keys use sim_params, which carries the debt terms
+    tor = scenario_cache.get_or_compute(("tornado", plan.key, canonical_key(sim_params), delta),
+                                        lambda: tornado(base_params, delta, plan=plan, interest_rate=interest, debt=debt))
+    base_val = tor.attrs["base"]["npv" if metric == "VAN" else "irr"]
+    with s2: st.plotly_chart(fig_tornado(tor[["Parámetro", f"{metric}_Bajo", f"{metric}_Alto"]], metric, base_val), use_container_width=True)
+    with st.expander("📐 ELASTICIDADES", expanded=False):
+        el = tor[["Parámetro", "Valor_Base", "Elasticidad_TIR", "Elasticidad_VAN", "Swing_VAN"]].copy()
+        el["Parámetro"] = el["Parámetro"].map(PARAM_LABELS)
+        st.dataframe(el.style.format({"Valor_Base": "{:,.2f}", "Elasticidad_TIR": "{:.2f}", "Elasticidad_VAN": "{:.2f}", "Swing_VAN": "${:,.0f}"}), use_container_width=True)
+    
+    with st.expander("🎯 METAS: PUNTOS DE EQUILIBRIO (GOAL SEEK)", expanded=False):
+        irr_goal = st.slider("TIR Meta del Socio (%)", 5, 100, 25) / 100.0
+        goals = [
+            ("Precio mínimo bloque para TIR meta", "p_base_bloque", "irr", irr_goal, (0.01, 5.0), lambda v: f"${v:,.3f}"),
+            ("Toneladas/día mínimas para VAN ≥ 0", "t_dia", "npv", 0.0, (1.0, 2000.0), lambda v: f"{v:,.1f} t"),
+            (f"CAPEX máximo con repago ≤ {roi_target} años", "capex", "payback", float(roi_target), (1e5, 5e8), fmt),
+        ]
+        g_cols = st.columns(len(goals))
+        for col, (label, param, metric, target, bounds, show) in zip(g_cols, goals):
+            # Previous solution of the same goal is the warm start for this rerun
+            warm_key = f"goal_{param}_{metric}"
+            sol = scenario_cache.get_or_compute(
+                ("goal", plan.key, canonical_key(sim_params), param, metric, target),
+                lambda: goal_seek(base_params, param, metric, target, bounds, x0=st.session_state.get(warm_key), plan=plan,
+                                  interest_rate=interest, debt=debt))
+            if sol["converged"]:
+                st.session_state[warm_key] = sol["value"]
+            val = show(sol["value"]) if sol["converged"] else "Fuera de rango"
+            col.markdown(f"""<div class="glass-card"><div class="metric-label">{label}</div><div class="metric-val neon-blue">{val}</div><div style="font-size:10px;color:#888">{sol['iterations']} iteraciones · residuo {sol['residual']:.2e}</div></div>""", unsafe_allow_html=True)
     
-    fig_combo.update_layout(barmode='stack', title="Flujo al Socio vs Saldo Pendiente", 
-                            height=450, paper_bgcolor='rgba(0,0,0,0)', font_color="white",
-                            yaxis=dict(title="Flujo ($)"), yaxis2=dict(title="Saldo", overlaying="y", side="right"))
-    st.plotly_chart(fig_combo, use_container_width=True)
+    # Whole parameter plane as one exact run_batch (~20 ms for 100x100), only when asked for
+    if st.toggle("🗺️ Mapa de respuesta (plano de dos parámetros)", value=False):
+        m1, m2, m3 = st.columns(3)
+        x_param = m1.selectbox("Eje X", list(SIDEBAR_RANGES), index=0, format_func=PARAM_LABELS.get)
+        y_param = m2.selectbox("Eje Y", [p for p in SIDEBAR_RANGES if p != x_param], format_func=PARAM_LABELS.get)
+        outputs = {"VAN": "npv", "TIR": "irr", **{f"EBITDA {int(y)}": int(y) for y in df["Año"]}}
+        z_label = m3.selectbox("Resultado", list(outputs))
+
+        def response_plane(n=100):
+            # Each axis spans its sidebar range, widened to include the current value
+            point = (base_params[x_param], base_params[y_param])
+            xs = np.linspace(min(SIDEBAR_RANGES[x_param][0], point[0]), max(SIDEBAR_RANGES[x_param][1], point[0]), n)
+            ys = np.linspace(min(SIDEBAR_RANGES[y_param][0], point[1]), max(SIDEBAR_RANGES[y_param][1], point[1]), n)
+            gx, gy = np.meshgrid(xs, ys)
+            batch = run_batch(**{**base_params, x_param: gx.ravel(), y_param: gy.ravel()}, plan=plan,
+                              interest_rate=interest, debt=debt)
+            planes = {"npv": batch["metrics"]["npv"], "irr": batch["metrics"]["irr"]}
+            ebitda = batch["data"][:, :, COLUMNAS.index("EBITDA")]
+            planes.update({int(y): ebitda[:, j] for j, y in enumerate(batch["years"])})
+            return xs, ys, {k: v.reshape(n, n) for k, v in planes.items()}
+        xs, ys, planes = scenario_cache.get_or_compute(
+            ("plane", plan.key, canonical_key(sim_params), x_param, y_param), response_plane)
+        st.plotly_chart(fig_response_map(xs, ys, planes[outputs[z_label]], PARAM_LABELS[x_param], PARAM_LABELS[y_param],
+                                         z_label, (base_params[x_param], base_params[y_param])), use_container_width=True)
+        st.caption(f"{len(xs) * len(ys):,} escenarios exactos en una corrida del modelo por lotes; "
+                   "el resto de parámetros y el financiamiento quedan en los valores del sidebar.")
     
     with st.expander("🧾 CRONOGRAMA DE PAGOS EXACTO (Recortar para Contrato)", expanded=True):
         pay_df = df[["Año", "Pago_Retorno_Capital", "Pago_Dividendos", "Flujo_Investor_Total", "Saldo_Inversion"]]
         st.dataframe(pay_df.style.format(fmt), use_container_width=True)
 
 # === TAB 5: BÓVEDA DE DATOS ===
-with t5:
+if section == SECTIONS[4]:
     vault = {
         "📊 Detalle de Producción Física": df[["Año", "Unidades_Total"]],
         "💰 Proyección de Precios e Ingresos": df[["Año", "Ingresos", "Rev_Bloques", "Rev_Recic", "Rev_Tipping", "Rev_Bonos"]],
@@ -223,4 +462,148 @@ with t5:
         with st.expander(name):
             st.dataframe(data.style.format(fmt) if "Año" in data.columns else data, use_container_width=True)
 
+    # Same layout as FERPA_Master_Model_CR.xlsx: the download feeds bi_app directly.
+    # Built on request, so openpyxl is only imported by sessions that export
+    def workbook_bytes():
+        buf = io.BytesIO()
+        ferpa_export.export_simulation(buf, res, params={k: v for k, v in sim_params.items() if isinstance(v, (int, float))}, plan=plan,
+                                       debt=debt_df, lockup_dscr=lockup_dscr)
+        return buf.getvalue()
+    if st.button("📥 Preparar Libro Excel (Bóveda + Cronograma)"):
+        xlsx = scenario_cache.get_or_compute(("xlsx", plan.key, canonical_key(sim_params)), workbook_bytes)
+        st.download_button("Descargar FERPA_Master_Model_CR.xlsx", xlsx, file_name="FERPA_Master_Model_CR.xlsx",
+                           mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+# === TAB 6: RIESGO (MONTE CARLO) ===
+@st.cache_data(show_spinner=False)
+def monte_carlo(base, n_draws, spread, inf_sd, rho, seed, plan_path, interest_rate=0.0, debt=None):
+    base = dict(base)
+    dist = ferpa_montecarlo.default_distributions(base, spread=spread, inflation_sd=inf_sd)
+    # Order: p_base_bloque, p_tipping, p_bono_co2, inflation -> block price co-moves with inflation
+    corr = [[1, 0, 0, rho], [0, 1, 0, 0], [0, 0, 1, 0], [rho, 0, 0, 1]]
+    return ferpa_montecarlo.run_montecarlo(base, dist, n_draws, corr=corr, seed=seed, plan=get_plan(plan_path),
+                                           interest_rate=interest_rate, debt=debt)
+
+@cached_figure(figure_cache)
+def fan_chart(x, bands, title, color):
+    p5, p50, p95 = bands
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=x, y=p95, name="P95", mode='lines', line=dict(width=0), showlegend=False))
+    fig.add_trace(go.Scatter(x=x, y=p5, name="P5–P95", mode='lines', line=dict(width=0), fill='tonexty', fillcolor='rgba(0,170,255,0.25)'))
+    fig.add_trace(go.Scatter(x=x, y=p50, name="P50", mode='lines+markers', line=dict(color=color, width=3)))
+    fig.update_layout(title=title, height=400, paper_bgcolor='rgba(0,0,0,0)', font_color="white", hovermode="x unified")
+    return fig
+
+if section == SECTIONS[5]:
+    st.markdown("### 🎲 ANÁLISIS DE RIESGO (MONTE CARLO)")
+    r1, r2, r3, r4, r5 = st.columns(5)
+    n_draws = r1.selectbox("Simulaciones", [10000, 100000, 1000000], index=0)
+    spread = r2.slider("Dispersión Precios (±%)", 5, 50, 20) / 100.0
+    inf_sd = r3.slider("Desv. Inflación (pp)", 0.0, 3.0, 1.0) / 100.0
+    rho = r4.slider("Correlación Precio/Inflación", -0.9, 0.9, 0.5)
+    seed = r5.number_input("Semilla", 0, 999999, 42)
+    
+    with st.spinner("Simulando escenarios..."):
+        mc = monte_carlo(tuple(sorted(base_params.items())), n_draws, spread, inf_sd, rho, seed, plan_path, interest, debt)
+    
+    q1, q2, q3 = st.columns(3)
+    q1.markdown(f"""<div class="glass-card"><div class="metric-label">TIR P5 / P50 / P95</div><div class="metric-val neon-blue">{mc['irr'][0]*100:.1f}% · {mc['irr'][1]*100:.1f}% · {mc['irr'][2]*100:.1f}%</div></div>""", unsafe_allow_html=True)
+    q2.markdown(f"""<div class="glass-card"><div class="metric-label">VAN P5 / P50 / P95</div><div class="metric-val neon-green">{mc['npv'][0]/1e6:,.1f}M · {mc['npv'][1]/1e6:,.1f}M · {mc['npv'][2]/1e6:,.1f}M</div></div>""", unsafe_allow_html=True)
+    q3.markdown(f"""<div class="glass-card"><div class="metric-label">VAN EN RIESGO (P50 − P5)</div><div class="metric-val neon-red">{fmt(mc['npv'][1] - mc['npv'][0])}</div></div>""", unsafe_allow_html=True)
+    
+    f1, f2 = st.columns(2)
+    with f1: st.plotly_chart(fan_chart(mc["years"], mc["ebitda"], "EBITDA Anual (P5 / P50 / P95)", "#00FFAA"), use_container_width=True)
+    with f2: st.plotly_chart(fan_chart(mc["path_years"], mc["npv_path"], "VAN Acumulado del Socio (P5 / P50 / P95)", "#FF0055"), use_container_width=True)
+    st.caption(f"{mc['n_draws']:,} escenarios · {mc['irr_nan']:,} sin TIR definida")
+
+# === TAB 7: PORTAFOLIO MULTI-PLANTA ===
+@cached_figure(figure_cache)
+def fig_portfolio(cons):
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=cons["Año"], y=cons["EBITDA"], name="EBITDA", marker_color="#00AAFF"))
+    fig.add_trace(go.Bar(x=cons["Año"], y=cons["Flujo_Investor_Total"], name="Flujo Socio", marker_color="#00FFAA"))
+    fig.add_trace(go.Scatter(x=cons["Año"], y=cons["Caja_Ferpa"].cumsum(), name="Caja Ferpa Acum.", mode='lines+markers', line=dict(color='#FF0055', width=3)))
+    fig.update_layout(barmode='group', title="Consolidado del Portafolio", height=450, paper_bgcolor='rgba(0,0,0,0)', font_color="white")
+    return fig
+
+if section == SECTIONS[6]:
+    st.markdown("### 🌐 PORTAFOLIO MULTI-PLANTA")
+    base_plant = dict(t_dia=ton_dia, p_base_bloque=p_bloque, p_tipping=p_tip, p_recic=p_rec, p_bono_co2=p_co2,
+                      p_bono_agua=p_agua, capex=capex, tax_rate=tax/100.0, inflation=inf)
+    default_plants = pd.DataFrame([dict(base_plant, start_year=2025 + 2 * k, ramp="0.5, 0.8") for k in range(3)])
+    pc1, pc2 = st.columns([3, 1])
+    with pc1:
+        plants = st.data_editor(default_plants, num_rows="dynamic", use_container_width=True, key="plants")
+    horizon = pc2.slider("Horizonte (años)", 5, 40, 20)
+    plants = plants.dropna(subset=["t_dia", "start_year"])
+    try:
+        # "0.5, 0.8" -> ramp-up utilization of the first operating years
+        parsed = plants.assign(ramp=plants["ramp"].fillna("").map(parse_ramp))
+    except ValueError as exc:
+        st.error(str(exc))
+        parsed = plants = plants.iloc[:0]
+    if len(plants):
+        port = scenario_cache.get_or_compute(
+            ("portfolio", plan.key, fingerprint(plants), horizon, canonical_key(sim_params)),
+            lambda: run_portfolio(parsed, horizon=horizon, plan=plan, interest_rate=interest, debt=debt))
+        pm = port["metrics"]
+        p1, p2, p3 = st.columns(3)
+        p1.markdown(f"""<div class="glass-card"><div class="metric-label">VAN CONSOLIDADO</div><div class="metric-val neon-green">{fmt(pm['npv'])}</div></div>""", unsafe_allow_html=True)
+        p2.markdown(f"""<div class="glass-card"><div class="metric-label">TIR CONSOLIDADA</div><div class="metric-val neon-blue">{pm['irr']*100:.1f}%</div></div>""", unsafe_allow_html=True)
+        p3.markdown(f"""<div class="glass-card"><div class="metric-label">CAPEX TOTAL ({len(plants)} PLANTAS)</div><div class="metric-val">{fmt(pm['capex'])}</div></div>""", unsafe_allow_html=True)
+        cons = port["consolidated"]
+        st.plotly_chart(fig_portfolio(cons[["Año", "EBITDA", "Flujo_Investor_Total", "Caja_Ferpa"]]), use_container_width=True)
+        with st.expander("📋 ESTADO CONSOLIDADO", expanded=False):
+            st.dataframe(cons.style.format(fmt), use_container_width=True)
+
+# === TAB 8: COMPARADOR DE ESCENARIOS ===
+# Pinned scenarios live in an on-disk store shared by every session (FERPA_SCENARIOS)
+@st.cache_resource
+def get_store(root):
+    return ferpa_scenarios.ScenarioStore(root)
+
+@cached_figure(figure_cache)
+def fig_deltas(delta, column, names):
+    fig = go.Figure()
+    for sid, g in delta.groupby("scenario_id", sort=False):
+        fig.add_trace(go.Bar(x=g["Año"], y=g[column], name=names.get(sid, sid)))
+    fig.update_layout(barmode='group', title=f"Δ {column} vs Escenario Base", height=400,
+                      paper_bgcolor='rgba(0,0,0,0)', font_color="white")
+    return fig
+
+if section == SECTIONS[7]:
+    st.markdown("### 🔀 COMPARADOR DE ESCENARIOS")
+    store = get_store(os.environ.get("FERPA_SCENARIOS", "scenarios"))
+    pin1, pin2 = st.columns([3, 1])
+    pin_name = pin1.text_input("Nombre del escenario", f"{ton_dia} t/d · ${p_bloque:.2f} · CAPEX {capex/1e6:.1f}M")
+    if pin2.button("📌 Fijar escenario actual", use_container_width=True):
+        store.add([base_params], names=[pin_name], plan=plan, interest_rate=interest, debt=debt)
+    catalog = store.catalog(columns=["scenario_id", "name", "irr", "npv", "created"])
+    if len(catalog) < 2:
+        st.info("Fije al menos dos escenarios para compararlos.")
+    else:
+        names = dict(zip(catalog["scenario_id"], catalog["name"]))
+        ids = list(reversed(catalog["scenario_id"].tolist()))
+        cc1, cc2 = st.columns(2)
+        base_id = cc1.selectbox("Escenario base", ids, format_func=names.get)
+        others = cc2.multiselect("Comparar contra", [i for i in ids if i != base_id], default=[i for i in ids if i != base_id][:3],
+                                 format_func=names.get)
+        shown = st.multiselect("Columnas", [c for c in df.columns if c != "Año"], default=["Ingresos", "EBITDA", "Flujo_Investor_Total"])
+        if others and shown:
+            # Only the selected columns are read back from the store
+            delta = store.diff(base_id, others, columns=shown)
+            for column in shown:
+                st.plotly_chart(fig_deltas(delta[["scenario_id", "Año", column]], column, names), use_container_width=True)
+            with st.expander("📋 DIFERENCIAS POR AÑO", expanded=False):
+                st.dataframe(delta.assign(scenario_id=delta["scenario_id"].map(names)).rename(columns={"scenario_id": "Escenario"})
+                             .style.format({c: fmt for c in shown}), use_container_width=True, hide_index=True)
+            kpis = catalog.set_index("scenario_id").loc[[base_id, *others], ["name", "irr", "npv"]]
+            st.dataframe(kpis.rename(columns={"name": "Escenario", "irr": "TIR", "npv": "VAN"})
+                         .style.format({"TIR": "{:.1%}", "VAN": fmt}), use_container_width=True, hide_index=True)
+
+# Hidden diagnostics (?diag=1): stage / figure timings, cache hit rates, Chrome trace, cold start
+if st.query_params.get("diag") == "1":
+    PROFILER.render_panel()
+    STARTUP.render_panel()
+
 st.caption("FERPA FINANCIAL SUITE v5 | POWERED BY PYTHON CORTEX ENGINE")
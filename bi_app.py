@@ -1,29 +1,52 @@
+from ferpa_startup import STARTUP, lazy
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 import numpy as np
+import glob
+import logging
+import os
+import time
+from ferpa_cache import LRUCache, fingerprint
+from ferpa_columnar import load_workbook
+from ferpa_density import DensityGrid
+from ferpa_kpi import KPICube
+from ferpa_profile import PROFILER, span
+
+# plotly loads with the first chart built, after the title and section selector are sent
+px = lazy("plotly.express")
+go = lazy("plotly.graph_objects")
+ferpa_sweep = lazy("ferpa_sweep")
+STARTUP.mark("imports")
+
+log = logging.getLogger("ferpa.bi")
 
 # --- PAGE CONFIG ---
 st.set_page_config(page_title="FERPA BI MASTER", layout="wide", initial_sidebar_state="collapsed")
 
 # --- LOAD DATA ---
-@st.cache_data
 def load_data():
     # Load the PowerBI Sheet from the Master Model
     file_path = "FERPA_Master_Model_CR.xlsx"
     try:
-        # We need the 'DATA_POWERBI' sheet
-        df = pd.read_excel(file_path, sheet_name="DATA_POWERBI")
-        # Also load some detailed sheets for specific granular plots
-        df_pl = pd.read_excel(file_path, sheet_name="ESTADO_RESULTADOS", header=3) # Adjust header row
-        df_cf = pd.read_excel(file_path, sheet_name="FLUJO_CAJA_LIBRE", header=3)
-        return df, df_pl, df_cf
+        # The workbook is parsed once into memory-mapped Feather files (.ferpa_cache/) and
+        # only re-converted when its mtime/hash changes; DATA_POWERBI plus the P&L and FCF
+        # sheets (header on row 4) for specific granular plots
+        with span("load_data", "io"):
+            sheets = load_workbook(file_path)
+        return sheets["DATA_POWERBI"], sheets["ESTADO_RESULTADOS"], sheets["FLUJO_CAJA_LIBRE"], sheets["DEUDA"]
     except Exception as e:
         st.error(f"Error loading data: {e}. Make sure FERPA_Master_Model_CR.xlsx exists.")
-        return None, None, None
+        return None, None, None, None
 
-df_pbi, df_pl, df_cf = load_data()
+# df_debt: the model's debt schedule (DEUDA sheet), None for an unlevered export
+df_pbi, df_pl, df_cf, df_debt = load_data()
+STARTUP.mark("datos")
+
+# One pass over the long table -> dense (Categoría, Sub-Categoría, Año) cube; every chart
+# below reads from it instead of re-filtering df_pbi with boolean masks
+@st.cache_resource
+def build_cube(df):
+    return KPICube(df)
 
 # --- CSS STYLING ---
 st.markdown("""
@@ -70,299 +93,472 @@ def plot_area(df, x, y, title, color="#F4D03F"):
     fig.update_layout(template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=300)
     return fig
 
+def plot_density(view, x, y, title, z=None, colorscale="Viridis"):
+    # Heatmap of a DensityGrid view: bins² cells whatever the number of scenarios.
+    # Colored by log10 of the count, or by the mean of z in each cell
+    counts = view["counts"].T
+    with np.errstate(divide="ignore"):
+        values = np.log10(counts) if view["mean"] is None else view["mean"].T
+    label = "log₁₀ escenarios" if z is None else z
+    xe, ye = view["x_edges"], view["y_edges"]
+    fig = go.Figure(go.Heatmap(
+        x=(xe[:-1] + xe[1:]) / 2, y=(ye[:-1] + ye[1:]) / 2, z=np.where(counts > 0, values, np.nan),
+        customdata=counts, colorscale=colorscale, colorbar=dict(title=label),
+        hovertemplate=f"{x}: %{{x:,.4~g}}<br>{y}: %{{y:,.4~g}}<br>{label}: %{{z:,.4~g}}<br>escenarios: %{{customdata:,.0f}}<extra></extra>"))
+    fig.update_layout(title=title, template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=450,
+                      xaxis_title=x, yaxis_title=y)
+    return fig
+
+def plot_ribbon(df, x, y, title, color="#00FFAA"):
+    # Quantile ribbons (ferpa_density.quantile_ribbons): P5–P95 and P25–P75 bands around the P50
+    fig = go.Figure()
+    for lo, hi, alpha in (("P5", "P95", 0.15), ("P25", "P75", 0.35)):
+        fig.add_trace(go.Scatter(x=df["x"], y=df[hi], mode='lines', line=dict(width=0), showlegend=False, hoverinfo="skip"))
+        fig.add_trace(go.Scatter(x=df["x"], y=df[lo], name=f"{lo}–{hi}", mode='lines', line=dict(width=0), fill='tonexty',
+                                 fillcolor=f"rgba{tuple(int(color.lstrip('#')[i:i+2], 16) for i in (0, 2, 4)) + (alpha,)}"))
+    fig.add_trace(go.Scatter(x=df["x"], y=df["P50"], name="P50", mode='lines', line=dict(color=color, width=3)))
+    fig.update_layout(title=title, template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', height=450,
+                      xaxis_title=x, yaxis_title=y, hovermode="x unified")
+    return fig
+
+# --- CHART REGISTRY ---
+# Every KPI chart is a builder registered under its number; a builder receives the derived
+# yearly data `d` (see derive()) and returns a Plotly figure, or None when its source is
+# unavailable. Tabs only list which charts they show and in which row.
+CHARTS = {}
+
+def chart(num):
+    def register(builder):
+        CHARTS[num] = builder
+        return builder
+    return register
+
+def derive(cube, has_cf, debt=None):
+    # Yearly series shared by several charts, computed once per data set
+    years = cube.years
+    d = {"cube": cube, "years": years, "has_cf": has_cf, "debt": debt}
+    d["ebitda"] = cube.series("Financiero", "EBITDA")
+    d["rev"] = cube.series("Financiero", "Ingresos Totales")
+    d["net_inc"] = cube.series("Financiero", "Utilidad Neta")
+    d["opex"] = cube.series("Financiero", "OPEX")
+    d["prod"] = cube.series("Producción", "Ton Bloques")
+    d["sales"] = cube.frame("Ventas")
+    d["sales_year"] = cube.category_total("Ventas")
+    d["co2"] = cube.category_total("Ambiental")
+    d["df_margin"] = cube.yearly("Margen", d["ebitda"] / d["rev"])
+    # PBI Data doesn't have FCF explicitly but has Net Income: Net Income + Depreciation (Capex/10)
+    dep = 1000000 # 1M/year
+    d["fcf"] = d["net_inc"] + dep
+    d["roi_accum"] = np.cumsum(d["fcf"]) - 10000000
+    d["leach"] = d["prod"] * 0.4 # 0.4m3 per ton
+    d["savings"] = d["prod"] * 511 * (0.85 - 0.65) # 20 cents per block
+    d["cc_rev"] = d["co2"] * 15
+    d["wc_rev"] = d["leach"] * 10
+    return d
+
+# === TAB 1: EXECUTIVE (10 CHARTS) ===
+@chart(5)
+def chart_5(d): return plot_line(d["cube"].yearly("Valor", d["ebitda"]), "Año", "Valor", "5. Tendencia EBITDA Anual", "#00FFAA")
+
+@chart(6)
+def chart_6(d): return plot_bar(d["cube"].yearly("Valor", d["rev"]), "Año", "Valor", "6. Crecimiento de Ventas", "#2E86C1")
+
+@chart(7)
+def chart_7(d): return plot_area(d["cube"].yearly("Valor", d["net_inc"]), "Año", "Valor", "7. Utilidad Neta Real", "#F4D03F")
+
+@chart(8)
+def chart_8(d):
+    # 8. Composition of Revenue (Pie)
+    fig8 = px.pie(d["sales"], values="Valor", names="Sub-Categoría", title="8. Mix de Ventas por SKU (Histórico)")
+    fig8.update_layout(template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)')
+    return fig8
+
+@chart(9)
+def chart_9(d):
+    # 9. Cost vs Revenue (Bar Group)
+    df_cost_rev = d["cube"].frame("Financiero", ["Ingresos Totales", "OPEX"])
+    fig9 = px.bar(df_cost_rev, x="Año", y="Valor", color="Sub-Categoría", title="9. Ingresos vs OPEX", barmode='group')
+    fig9.update_layout(template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)')
+    return fig9
+
+@chart(10)
+def chart_10(d):
+    # 10. Margin Trend (Line)
+    fig10 = px.line(d["df_margin"], x="Año", y="Margen", title="10. Evolución del Margen EBITDA %")
+    fig10.update_layout(template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)')
+    return fig10
+
+# === TAB 2: COMERCIAL (11-20) ===
+@chart(11)
+def chart_11(d):
+    # 11. SKU Breakout Line
+    return px.line(d["sales"], x="Año", y="Valor", color="Sub-Categoría", title="11. Ventas por Categoría de Producto")
+
+@chart(12)
+def chart_12(d):
+    # 12. Market Share (Simulation)
+    mix_data = d["cube"].sub_totals("Ventas")
+    return px.bar(mix_data, y="Sub-Categoría", x="Valor", orientation='h', title="12. Contribución Total por Producto")
+
+# 13-16: Mini trends for SKUs
+@chart(13)
+def chart_13(d): return plot_area(d["cube"].yearly("Valor", d["cube"].series("Ventas", "Bloque #5")), "Año", "Valor", "13. Bloque #5", "#FF5733")
+
+@chart(14)
+def chart_14(d): return plot_area(d["cube"].yearly("Valor", d["cube"].series("Ventas", "Adoquín")), "Año", "Valor", "14. Adoquín", "#33FF57")
+
+@chart(15)
+def chart_15(d): return plot_area(d["cube"].yearly("Valor", d["cube"].series("Ventas", "Ladrillo")), "Año", "Valor", "15. Ladrillo", "#3357FF")
+
+@chart(16)
+def chart_16(d):
+    # 16. Price Evolution (Linear sim)
+    prices = pd.DataFrame({"Año": d["years"], "Precio": [0.65 * (1.03**i) for i in range(len(d["years"]))]})
+    return plot_line(prices, "Año", "Precio", "16. Proyección Precio Unitario")
+
+@chart(17)
+def chart_17(d):
+    # 17. Cumulative Sales
+    return plot_line(d["cube"].yearly("Valor", np.nancumsum(d["sales_year"])), "Año", "Valor", "17. Ventas Acumuladas (Curva S)", "#E74C3C")
+
+@chart(18)
+def chart_18(d):
+    # 18. Annual Growth Rate
+    growth = d["cube"].yearly("Valor", pd.Series(d["sales_year"]).pct_change().fillna(0).values)
+    return plot_bar(growth, "Año", "Valor", "18. Crecimiento Anual de Ventas (%)", "#8E44AD")
+
+@chart(19)
+def chart_19(d):
+    # 19. Average Ticket (Mock)
+    return px.scatter(d["sales"], x="Año", y="Valor", size="Valor", color="Sub-Categoría", title="19. Mapa de Calor de Ingresos")
+
+@chart(20)
+def chart_20(d):
+    # 20. Sales vs Target (Mock Target = Sales * 1.1)
+    sales_target = d["cube"].yearly("Valor", d["sales_year"])
+    sales_target["Target"] = sales_target["Valor"] * 1.05
+    fig20 = go.Figure()
+    fig20.add_trace(go.Bar(x=sales_target["Año"], y=sales_target["Valor"], name="Real"))
+    fig20.add_trace(go.Scatter(x=sales_target["Año"], y=sales_target["Target"], name="Meta", line=dict(dash='dot', color='red')))
+    fig20.update_layout(title="20. Real vs Meta de Ventas", template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', height=300)
+    return fig20
+
+# === TAB 3: OPERATIVO (21-30) ===
+@chart(21)
+def chart_21(d):
+    # 21. Production Volume
+    return plot_bar(d["cube"].yearly("Valor", d["prod"]), "Año", "Valor", "21. Producción Física (Toneladas)", "#F39C12")
+
+@chart(22)
+def chart_22(d):
+    # 22. Input vs Output
+    df_io = d["cube"].frame("Producción", ["Ton Entrada", "Ton Bloques"])
+    return px.bar(df_io, x="Año", y="Valor", color="Sub-Categoría", barmode='group', title="22. Balance de Masa (Input/Output)")
+
+@chart(23)
+def chart_23(d):
+    # 23. Yield (Efficiency)
+    df_yield = d["cube"].yearly("Yield", d["prod"] / d["cube"].series("Producción", "Ton Entrada"))
+    return plot_line(df_yield, "Año", "Yield", "23. Rendimiento de Masa (%)")
+
+@chart(24)
+def chart_24(d):
+    # 24. Waste (Recycling)
+    df_rec = d["cube"].yearly("Valor", d["cube"].series("Producción", "Ton Recicladas"))
+    return plot_bar(df_rec, "Año", "Valor", "24. Toneladas Recuperadas", "#27AE60")
+
+@chart(25)
+def chart_25(d):
+    # 25. Capacity Utilization (Assumed 200 is 80% capacity)
+    cap_util = pd.DataFrame({"Año": d["years"], "Util": [80]*len(d["years"])})
+    return plot_line(cap_util, "Año", "Util", "25. Utilización de Capacidad (%)")
+
+@chart(26)
+def chart_26(d):
+    # 26. OPEX per Ton
+    unit_cost = pd.DataFrame({"Año": d["years"], "Cost_Ton": d["opex"]/d["prod"]})
+    return plot_line(unit_cost, "Año", "Cost_Ton", "26. OPEX Unitario ($/Ton)", "#C0392B")
+
+@chart(27)
+def chart_27(d):
+    # 27. Maintenance Cost (Estimated 10% of OPEX)
+    maint_cost = pd.DataFrame({"Año": d["years"], "Maint": d["opex"] * 0.10})
+    return plot_bar(maint_cost, "Año", "Maint", "27. Costo Mantenimiento Estimado")
+
+@chart(28)
+def chart_28(d):
+    # 28. Labor Productivity (Sales per Employee) - Assuming 30 employees fixed
+    prod_emp = pd.DataFrame({"Año": d["years"], "Rev_Emp": d["rev"] / 30})
+    return plot_line(prod_emp, "Año", "Rev_Emp", "28. Ingreso por Empleado")
+
+@chart(29)
+def chart_29(d):
+    # 29. Energy Consumption (Proxy linked to tons)
+    energy = pd.DataFrame({"Año": d["years"], "Energy": d["prod"] * 50}) # 50kWh per ton
+    return plot_area(energy, "Año", "Energy", "29. Consumo Energía (kWh Estimado)")
+
+@chart(30)
+def chart_30(d):
+    # 30. Downtime (Simulated flat)
+    down = pd.DataFrame({"Año": d["years"], "Hours": [120]*len(d["years"])}) # 10 hours a month
+    return plot_bar(down, "Año", "Hours", "30. Horas Parada Mantenimiento")
+
+# === TAB 4: FINANCIERO (31-40) ===
+@chart(31)
+def chart_31(d):
+    # 31. Free Cash Flow (needs the FLUJO_CAJA_LIBRE sheet)
+    if not d["has_cf"]:
+        return None
+    df_fcf = pd.DataFrame({"Año": d["years"], "FCF": d["fcf"]})
+    return plot_bar(df_fcf, "Año", "FCF", "31. Flujo de Caja Libre Estimado", "#2ECC71")
+
+@chart(32)
+def chart_32(d):
+    # 32. ROI Analysis
+    df_roi = pd.DataFrame({"Año": d["years"], "ROI": d["roi_accum"]})
+    return plot_line(df_roi, "Año", "ROI", "32. Retorno de Inversión Acumulado")
+
+@chart(33)
+def chart_33(d): return plot_line(d["df_margin"], "Año", "Margen", "33. Margen EBITDA")
+
+@chart(34)
+def chart_34(d):
+    # 34. Net Margin
+    net_margin = pd.DataFrame({"Año": d["years"], "Net%": d["net_inc"]/d["rev"]})
+    return plot_line(net_margin, "Año", "Net%", "34. Margen Neto", "#F1C40F")
+
+@chart(35)
+def chart_35(d):
+    # 35. OPEX Ratio
+    opex_ratio = pd.DataFrame({"Año": d["years"], "Ratio": d["opex"]/d["rev"]})
+    return plot_bar(opex_ratio, "Año", "Ratio", "35. Ratio de Eficiencia Operativa")
+
+@chart(36)
+def chart_36(d):
+    # 36. Tax Burden
+    tax_df = pd.DataFrame({"Año": d["years"], "Tax": d["ebitda"] * 0.30}) # Approx
+    return plot_area(tax_df, "Año", "Tax", "36. Impuestos Estimados", "#E74C3C")
+
+@chart(37)
+def chart_37(d):
+    # 37. Cost Structure Pie
+    fig37 = px.pie(values=[45, 30, 15, 10], names=["Insumos", "Labor", "Mantenimiento", "Energía"], title="37. Estructura de Costos Típica")
+    fig37.update_layout(template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)')
+    return fig37
+
+@chart(38)
+def chart_38(d):
+    # 38. Solvency (Assets growth sim)
+    assets = pd.DataFrame({"Año": d["years"], "Assets": [10000000 + x for x in d["roi_accum"]]})
+    return plot_line(assets, "Año", "Assets", "38. Crecimiento Patrimonial")
+
+@chart(39)
+def chart_39(d):
+    # 39. Break Even Point (Sales) - Fixed costs ~2M?
+    be_point = pd.DataFrame({"Año": d["years"], "BE": [2000000]*len(d["years"])})
+    fig39 = go.Figure()
+    fig39.add_trace(go.Scatter(x=d["years"], y=d["rev"], name="Ventas"))
+    fig39.add_trace(go.Scatter(x=d["years"], y=be_point["BE"], name="Punto Equilibrio", line=dict(dash='dash')))
+    fig39.update_layout(title="39. Ventas vs Punto Equilibrio", template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)')
+    return fig39
+
+@chart(40)
+def chart_40(d):
+    # 40. Debt service coverage (CFADS / service) of the model's DEUDA sheet, with its lock-up covenant
+    debt = d["debt"]
+    if debt is None:
+        return None
+    fig40 = plot_bar(debt[["Año", "DSCR"]], "Año", "DSCR", "40. Cobertura de Deuda (DSCR)")
+    fig40.add_hline(y=float(debt["Covenant_DSCR"].iloc[0]), line_dash="dash", line_color="#E74C3C", annotation_text="Covenant")
+    return fig40
+
+# === TAB 5: IMPACTO (41-50) ===
+@chart(41)
+def chart_41(d):
+    # 41. CO2 Avoided
+    return plot_area(d["cube"].yearly("Valor", d["co2"]), "Año", "Valor", "41. CO2 Evitado (Ton/Año)", "#2ECC71")
+
+@chart(42)
+def chart_42(d):
+    # 42. Cumulative CO2
+    df_co2_cum = pd.DataFrame({"Año": d["years"], "Cum": d["co2"].cumsum()})
+    return plot_line(df_co2_cum, "Año", "Cum", "42. Descarbonización Acumulada", "#27AE60")
+
+@chart(43)
+def chart_43(d):
+    # 43. Trees Equivalent
+    trees = pd.DataFrame({"Año": d["years"], "Trees": d["co2"] / 0.02})
+    return plot_bar(trees, "Año", "Trees", "43. Árboles Equivalentes")
+
+@chart(44)
+def chart_44(d):
+    # 44. Leachate Avoided
+    leach = pd.DataFrame({"Año": d["years"], "Lix": d["leach"]})
+    return plot_area(leach, "Año", "Lix", "44. Lixiviados Evitados (m3)", "#3498DB")
+
+@chart(45)
+def chart_45(d):
+    # 45. Social Impact (Jobs)
+    jobs = pd.DataFrame({"Año": d["years"], "Jobs": [30 + i for i in range(len(d["years"]))]})
+    return plot_line(jobs, "Año", "Jobs", "45. Empleos Directos")
+
+@chart(46)
+def chart_46(d):
+    # 46. Community Savings (Tipping fee savings for Muni? or Blocks?)
+    # Savings from cheaper blocks
+    savings = pd.DataFrame({"Año": d["years"], "Save": d["savings"]})
+    return plot_bar(savings, "Año", "Save", "46. Ahorro Comunitario ($)")
+
+@chart(47)
+def chart_47(d):
+    # 47. SDG Mapping (Mock Radar)
+    df_sdg = pd.DataFrame(dict(
+        r=[5, 4, 5, 3, 4],
+        theta=['Clima', 'Empleo', 'Innovación', 'Comunidad', 'Agua']))
+    fig47 = px.line_polar(df_sdg, r='r', theta='theta', line_close=True, title="47. Cumplimiento ODS (1-5)")
+    fig47.update_layout(template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)')
+    return fig47
+
+@chart(48)
+def chart_48(d):
+    # 48. Carbon Credit Revenue
+    cc_rev = pd.DataFrame({"Año": d["years"], "CC_Rev": d["cc_rev"]})
+    return plot_bar(cc_rev, "Año", "CC_Rev", "48. Ingresos por Bonos Carbono")
+
+@chart(49)
+def chart_49(d):
+    # 49. Water Credit Revenue
+    wc_rev = pd.DataFrame({"Año": d["years"], "WC_Rev": d["wc_rev"]})
+    return plot_bar(wc_rev, "Año", "WC_Rev", "49. Ingresos por Bonos Agua")
+
+@chart(50)
+def chart_50(d):
+    # 50. Total ESG Value
+    esg_tot = pd.DataFrame({"Año": d["years"], "Total": d["cc_rev"] + d["wc_rev"] + d["savings"]})
+    return plot_area(esg_tot, "Año", "Total", "50. Valor Social Total Generado")
+
+# Tab -> (subheader, rows of (caption, chart numbers)); charts 1-4 are the KPI cards
+TABS = {
+    "1. EJECUTIVO (1-10)": ("VISIÓN EJECUTIVA GLOBAL", [(None, [5, 6, 7]), (None, [8, 9, 10])]),
+    "2. COMERCIAL (11-20)": ("INTELIGENCIA DE MERCADO Y VENTAS", [(None, [11, 12]), ("Tendencias Individuales de SKU", [13, 14, 15, 16]), (None, [17, 18]), (None, [19, 20])]),
+    "3. OPERATIVO (21-30)": ("EFICIENCIA DE PLANTA", [(None, [21, 22]), ("Indicadores de Eficiencia", [23, 24, 25, 26]), (None, [27, 28]), (None, [29, 30])]),
+    "4. FINANCIERO (31-40)": ("SALUD FINANCIERA", [(None, [31, 32]), (None, [33, 34, 35, 36]), (None, [37, 38]), (None, [39, 40])]),
+    "5. IMPACTO (41-50)": ("ESG & IMPACTO", [(None, [41, 42]), (None, [43, 44, 45, 46]), (None, [47, 48]), (None, [49, 50])]),
+}
+
+# Figures of every data set seen by this process, shared across sessions
+@st.cache_resource
+def get_figure_cache():
+    return LRUCache(max_entries=500, max_bytes=64 * 2**20, name="bi_figures")
+
+def _build(num, d):
+    with span(CHARTS[num].__name__, "figure"):
+        return CHARTS[num](d)
+
+def build_chart(num, d, data_fp, timings):
+    # Cached by (chart, data fingerprint); the timing log records the build or the hit
+    cache = get_figure_cache()
+    key = (num, data_fp)
+    t0 = time.perf_counter()
+    hit = key in cache
+    fig = cache.get_or_compute(key, lambda: _build(num, d))
+    ms = (time.perf_counter() - t0) * 1000
+    timings.append({"Gráfico": num, "ms": ms, "Cache": "hit" if hit else "build"})
+    log.info("chart %s %s in %.1f ms", num, "cache hit" if hit else "built", ms)
+    return fig
+
 # --- TITLE ---
 st.title("⚡ FERPA CR | BUSINESS INTELLIGENCE (50 KPIs)")
 st.markdown("Dashboard Maestro de 50 Indicadores Clave de Desempeño")
 
 # --- TABS (The 50 Charts Split) ---
-tabs = st.tabs(["1. EJECUTIVO (1-10)", "2. COMERCIAL (11-20)", "3. OPERATIVO (21-30)", "4. FINANCIERO (31-40)", "5. IMPACTO (41-50)"])
+# Only the selected section is built: st.tabs would construct and ship all 50 figures
+tab_name = st.radio("Sección", list(TABS), horizontal=True, label_visibility="collapsed")
 
 if df_pbi is not None:
-    # PREPARE SUBSETS
-    df_fin = df_pbi[df_pbi["Categoría"] == "Financiero"]
-    df_ops = df_pbi[df_pbi["Categoría"] == "Producción"]
-    df_sales = df_pbi[df_pbi["Categoría"] == "Ventas"]
-    df_env = df_pbi[df_pbi["Categoría"] == "Ambiental"]
+    cube = build_cube(df_pbi)
+    data_fp = fingerprint(cube.values, cube.years, list(cube.subcategories), df_cf is not None, df_debt)
+    d = derive(cube, df_cf is not None, df_debt)
+    timings = []
     
-    years = sorted(df_pbi["Año"].unique())
-
-    # === TAB 1: EXECUTIVE (10 CHARTS) ===
-    with tabs[0]:
-        st.subheader("VISIÓN EJECUTIVA GLOBAL")
-        
+    subheader, rows = TABS[tab_name]
+    st.subheader(subheader)
+    
+    if tab_name == "1. EJECUTIVO (1-10)":
         # Row 1: 4 KPIs (Charts 1-4) represents Key metrics as Cards (technically visuals)
         c1, c2, c3, c4 = st.columns(4)
-        total_ebitda = df_fin[df_fin["Sub-Categoría"]=="EBITDA"]["Valor"].sum()
-        total_rev = df_fin[df_fin["Sub-Categoría"]=="Ingresos Totales"]["Valor"].sum()
-        total_net = df_fin[df_fin["Sub-Categoría"]=="Utilidad Neta"]["Valor"].sum()
+        total_ebitda = cube.total("Financiero", "EBITDA")
+        total_rev = cube.total("Financiero", "Ingresos Totales")
+        total_net = cube.total("Financiero", "Utilidad Neta")
         avg_margin = (total_ebitda/total_rev)*100
         
         with c1: card("INGRESOS TOTALES (10A)", f"${total_rev/1e6:,.1f}", "M")
         with c2: card("EBITDA ACUMULADO", f"${total_ebitda/1e6:,.1f}", "M")
         with c3: card("UTILIDAD NETA", f"${total_net/1e6:,.1f}", "M")
         with c4: card("MARGEN PROMEDIO", f"{avg_margin:,.1f}", "%")
-        
-        # Row 2: Main Trends (Charts 5-7)
-        r2c1, r2c2, r2c3 = st.columns(3)
-        with r2c1: st.plotly_chart(plot_line(df_fin[df_fin["Sub-Categoría"]=="EBITDA"], "Año", "Valor", "5. Tendencia EBITDA Anual", "#00FFAA"), use_container_width=True)
-        with r2c2: st.plotly_chart(plot_bar(df_fin[df_fin["Sub-Categoría"]=="Ingresos Totales"], "Año", "Valor", "6. Crecimiento de Ventas", "#2E86C1"), use_container_width=True)
-        with r2c3: st.plotly_chart(plot_area(df_fin[df_fin["Sub-Categoría"]=="Utilidad Neta"], "Año", "Valor", "7. Utilidad Neta Real", "#F4D03F"), use_container_width=True)
-        
-        # Row 3: Composition & Ratios (Charts 8-10)
-        r3c1, r3c2, r3c3 = st.columns(3)
-        
-        # 8. Composition of Revenue (Pie)
-        fig8 = px.pie(df_sales, values="Valor", names="Sub-Categoría", title="8. Mix de Ventas por SKU (Histórico)")
-        fig8.update_layout(template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)')
-        with r3c1: st.plotly_chart(fig8, use_container_width=True)
-        
-        # 9. Cost vs Revenue (Bar Group)
-        df_cost_rev = df_fin[df_fin["Sub-Categoría"].isin(["Ingresos Totales", "OPEX"])]
-        fig9 = px.bar(df_cost_rev, x="Año", y="Valor", color="Sub-Categoría", title="9. Ingresos vs OPEX", barmode='group')
-        fig9.update_layout(template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)')
-        with r3c2: st.plotly_chart(fig9, use_container_width=True)
-        
-        # 10. Margin Trend (Line)
-        df_margin = pd.DataFrame({"Año": years, "Margen": df_fin[df_fin["Sub-Categoría"]=="EBITDA"]["Valor"].values / df_fin[df_fin["Sub-Categoría"]=="Ingresos Totales"]["Valor"].values})
-        fig10 = px.line(df_margin, x="Año", y="Margen", title="10. Evolución del Margen EBITDA %")
-        fig10.update_layout(template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)')
-        with r3c3: st.plotly_chart(fig10, use_container_width=True)
-
-    # === TAB 2: COMERCIAL (11-20) ===
-    with tabs[1]:
-        st.subheader("INTELIGENCIA DE MERCADO Y VENTAS")
-        
-        c_1, c_2 = st.columns(2)
-        
-        # 11. SKU Breakout Line
-        with c_1: st.plotly_chart(px.line(df_sales, x="Año", y="Valor", color="Sub-Categoría", title="11. Ventas por Categoría de Producto"), use_container_width=True)
-        
-        # 12. Market Share (Simulation)
-        mix_data = df_sales.groupby("Sub-Categoría")["Valor"].sum().reset_index()
-        with c_2: st.plotly_chart(px.bar(mix_data, y="Sub-Categoría", x="Valor", orientation='h', title="12. Contribución Total por Producto"), use_container_width=True)
-        
-        # 13-16: Mini trends for SKUs
-        st.write("Tendencias Individuales de SKU")
-        mc1, mc2, mc3, mc4 = st.columns(4)
-        
-        sku_a = df_sales[df_sales["Sub-Categoría"]=="Bloque #5"]
-        sku_b = df_sales[df_sales["Sub-Categoría"]=="Adoquín"]
-        sku_c = df_sales[df_sales["Sub-Categoría"]=="Ladrillo"]
-        
-        with mc1: st.plotly_chart(plot_area(sku_a, "Año", "Valor", "13. Bloque #5", "#FF5733"), use_container_width=True)
-        with mc2: st.plotly_chart(plot_area(sku_b, "Año", "Valor", "14. Adoquín", "#33FF57"), use_container_width=True)
-        with mc3: st.plotly_chart(plot_area(sku_c, "Año", "Valor", "15. Ladrillo", "#3357FF"), use_container_width=True)
-        
-        # 16. Price Evolution (Linear sim)
-        prices = pd.DataFrame({"Año": years, "Precio": [0.65 * (1.03**i) for i in range(len(years))]})
-        with mc4: st.plotly_chart(plot_line(prices, "Año", "Precio", "16. Proyección Precio Unitario"), use_container_width=True)
-        
-        # 17-20: Advanced Sales metrics
-        ac1, ac2 = st.columns(2)
-        
-        # 17. Cumulative Sales
-        df_sales_acum = df_sales.groupby("Año")["Valor"].sum().cumsum().reset_index()
-        with ac1: st.plotly_chart(plot_line(df_sales_acum, "Año", "Valor", "17. Ventas Acumuladas (Curva S)", "#E74C3C"), use_container_width=True)
-        
-        # 18. Annual Growth Rate
-        growth = df_sales.groupby("Año")["Valor"].sum().pct_change().fillna(0).reset_index()
-        with ac2: st.plotly_chart(plot_bar(growth, "Año", "Valor", "18. Crecimiento Anual de Ventas (%)", "#8E44AD"), use_container_width=True)
-        
-        # 19. Average Ticket (Mock)
-        with ac1: st.plotly_chart(px.scatter(df_sales, x="Año", y="Valor", size="Valor", color="Sub-Categoría", title="19. Mapa de Calor de Ingresos"), use_container_width=True)
-        
-        # 20. Sales vs Target (Mock Target = Sales * 1.1)
-        sales_target = df_sales.groupby("Año")["Valor"].sum().reset_index()
-        sales_target["Target"] = sales_target["Valor"] * 1.05
-        fig20 = go.Figure()
-        fig20.add_trace(go.Bar(x=sales_target["Año"], y=sales_target["Valor"], name="Real"))
-        fig20.add_trace(go.Scatter(x=sales_target["Año"], y=sales_target["Target"], name="Meta", line=dict(dash='dot', color='red')))
-        fig20.update_layout(title="20. Real vs Meta de Ventas", template="plotly_dark", paper_bgcolor='rgba(0,0,0,0)', height=300)
-        with ac2: st.plotly_chart(fig20, use_container_width=True)
-
-    # === TAB 3: OPERATIVO (21-30) ===
-    with tabs[2]:
-        st.subheader("EFICIENCIA DE PLANTA")
-        
-        oc1, oc2 = st.columns(2)
-        
-        # 21. Production Volume
-        with oc1: st.plotly_chart(plot_bar(df_ops[df_ops["Sub-Categoría"]=="Ton Bloques"], "Año", "Valor", "21. Producción Física (Toneladas)", "#F39C12"), use_container_width=True)
-        
-        # 22. Input vs Output
-        df_io = df_ops[df_ops["Sub-Categoría"].isin(["Ton Entrada", "Ton Bloques"])]
-        with oc2: st.plotly_chart(px.bar(df_io, x="Año", y="Valor", color="Sub-Categoría", barmode='group', title="22. Balance de Masa (Input/Output)"), use_container_width=True)
-        
-        # 23-26: Efficiency Metrics
-        st.write("Indicadores de Eficiencia")
-        ec1, ec2, ec3, ec4 = st.columns(4)
-        
-        # 23. Yield (Efficiency)
-        yield_val = df_ops[df_ops["Sub-Categoría"]=="Ton Bloques"]["Valor"].values / df_ops[df_ops["Sub-Categoría"]=="Ton Entrada"]["Valor"].values
-        df_yield = pd.DataFrame({"Año": years, "Yield": yield_val})
-        with ec1: st.plotly_chart(plot_line(df_yield, "Año", "Yield", "23. Rendimiento de Masa (%)"), use_container_width=True)
-        
-        # 24. Waste (Recycling)
-        df_rec = df_ops[df_ops["Sub-Categoría"]=="Ton Recicladas"]
-        with ec2: st.plotly_chart(plot_bar(df_rec, "Año", "Valor", "24. Toneladas Recuperadas", "#27AE60"), use_container_width=True)
-        
-        # 25. Capacity Utilization (Assumed 200 is 80% capacity)
-        cap_util = pd.DataFrame({"Año": years, "Util": [80]*len(years)})
-        with ec3: st.plotly_chart(plot_line(cap_util, "Año", "Util", "25. Utilización de Capacidad (%)"), use_container_width=True)
-        
-        # 26. OPEX per Ton
-        opex_vals = df_fin[df_fin["Sub-Categoría"]=="OPEX"]["Valor"].values
-        prod_vals = df_ops[df_ops["Sub-Categoría"]=="Ton Bloques"]["Valor"].values
-        unit_cost = pd.DataFrame({"Año": years, "Cost_Ton": opex_vals/prod_vals})
-        with ec4: st.plotly_chart(plot_line(unit_cost, "Año", "Cost_Ton", "26. OPEX Unitario ($/Ton)", "#C0392B"), use_container_width=True)
-        
-        # 27-30: Logistics & Maintenance
-        lc1, lc2 = st.columns(2)
-        
-        # 27. Maintenance Cost (Estimated 10% of OPEX)
-        maint_cost = pd.DataFrame({"Año": years, "Maint": opex_vals * 0.10})
-        with lc1: st.plotly_chart(plot_bar(maint_cost, "Año", "Maint", "27. Costo Mantenimiento Estimado"), use_container_width=True)
-        
-        # 28. Labor Productivity (Sales per Employee) - Assuming 30 employees fixed
-        rev_vals = df_fin[df_fin["Sub-Categoría"]=="Ingresos Totales"]["Valor"].values
-        prod_emp = pd.DataFrame({"Año": years, "Rev_Emp": rev_vals / 30})
-        with lc2: st.plotly_chart(plot_line(prod_emp, "Año", "Rev_Emp", "28. Ingreso por Empleado"), use_container_width=True)
-        
-        # 29. Energy Consumption (Proxy linked to tons)
-        energy = pd.DataFrame({"Año": years, "Energy": prod_vals * 50}) # 50kWh per ton
-        with lc1: st.plotly_chart(plot_area(energy, "Año", "Energy", "29. Consumo Energía (kWh Estimado)"), use_container_width=True)
-        
-        # 30. Downtime (Simulated flat)
-        down = pd.DataFrame({"Año": years, "Hours": [120]*len(years)}) # 10 hours a month
-        with lc2: st.plotly_chart(plot_bar(down, "Año", "Hours", "30. Horas Parada Mantenimiento"), use_container_width=True)
+    
+    for caption, nums in rows:
+        if caption:
+            st.write(caption)
+        for col, num in zip(st.columns(len(nums)), nums):
+            fig = build_chart(num, d, data_fp, timings)
+            with col:
+                if fig is None:
+                    st.info("Data for this chart is not in the workbook (FCF / DEUDA sheet)")
+                else:
+                    st.plotly_chart(fig, use_container_width=True)
+    
+    with st.expander("⏱️ Tiempos de construcción por gráfico", expanded=False):
+        df_t = pd.DataFrame(timings)
+        st.caption(f"Total sección: {df_t['ms'].sum():,.1f} ms · {len(df_t)} gráficos")
+        st.dataframe(df_t.style.format({"ms": "{:,.1f}"}), use_container_width=True, hide_index=True)
+    STARTUP.mark("primer render")
 
-    # === TAB 4: FINANCIERO (31-40) ===
-    with tabs[3]:
-        st.subheader("SALUD FINANCIERA")
-        
-        fc1, fc2 = st.columns(2)
-        
-        # 31. Free Cash Flow
-        try:
-             # Need to extract FCF from Excel Sheet if possible or simulate from PBI Data?
-             # PBI Data doesn't have FCF explicitly but has Net Income.
-             # We can use the loaded 'df_cf' dataframe
-             if df_cf is not None:
-                # df_cf columns might be un-named or specific.
-                # Assuming standard format, reading raw. "Flujo Libre" is usually column C or D.
-                # Let's just use Net Income from df_pbi for safety + Depreciation (Capex/10)
-                net_inc = df_fin[df_fin["Sub-Categoría"]=="Utilidad Neta"]["Valor"].values
-                dep = 1000000 # 1M/year
-                fcf = net_inc + dep
-                df_fcf = pd.DataFrame({"Año": years, "FCF": fcf})
-                with fc1: st.plotly_chart(plot_bar(df_fcf, "Año", "FCF", "31. Flujo de Caja Libre Estimado", "#2ECC71"), use_container_width=True)
-        except:
-             st.info("Data for FCF chart unavailable")
-
-        # 32. ROI Analysis
-        roi_accum = df_fcf["FCF"].cumsum() - 10000000
-        df_roi = pd.DataFrame({"Año": years, "ROI": roi_accum})
-        with fc2: st.plotly_chart(plot_line(df_roi, "Año", "ROI", "32. Retorno de Inversión Acumulado"), use_container_width=True)
-        
-        # 33-36: Ratios
-        rc1, rc2, rc3, rc4 = st.columns(4)
-        
-        # 33. EBITDA Margin
-        with rc1: st.plotly_chart(plot_line(df_margin, "Año", "Margen", "33. Margen EBITDA"), use_container_width=True)
-        
-        # 34. Net Margin
-        net_margin = pd.DataFrame({"Año": years, "Net%": net_inc/rev_vals})
-        with rc2: st.plotly_chart(plot_line(net_margin, "Año", "Net%", "34. Margen Neto", "#F1C40F"), use_container_width=True)
-        
-        # 35. OPEX Ratio
-        opex_ratio = pd.DataFrame({"Año": years, "Ratio": opex_vals/rev_vals})
-        with rc3: st.plotly_chart(plot_bar(opex_ratio, "Año", "Ratio", "35. Ratio de Eficiencia Operativa"), use_container_width=True)
-        
-        # 36. Tax Burden
-        tax_vals = df_fin[df_fin["Sub-Categoría"]=="EBITDA"]["Valor"].values * 0.30 # Approx
-        tax_df = pd.DataFrame({"Año": years, "Tax": tax_vals})
-        with rc4: st.plotly_chart(plot_area(tax_df, "Año", "Tax", "36. Impuestos Estimados", "#E74C3C"), use_container_width=True)
-        
-        # 37-40: Structure
-        sc1, sc2 = st.columns(2)
-        
-        # 37. Cost Structure Pie
-        fig37 = px.pie(values=[45, 30, 15, 10], names=["Insumos", "Labor", "Mantenimiento", "Energía"], title="37. Estructura de Costos Típica")
-        fig37.update_layout(template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)')
-        with sc1: st.plotly_chart(fig37, use_container_width=True)
-        
-        # 38. Solvency (Assets growth sim)
-        assets = pd.DataFrame({"Año": years, "Assets": [10000000 + x for x in roi_accum]})
-        with sc2: st.plotly_chart(plot_line(assets, "Año", "Assets", "38. Crecimiento Patrimonial"), use_container_width=True)
-        
-        # 39. Break Even Point (Sales) - Fixed costs ~2M?
-        be_point = pd.DataFrame({"Año": years, "BE": [2000000]*len(years)})
-        fig39 = go.Figure()
-        fig39.add_trace(go.Scatter(x=years, y=rev_vals, name="Ventas"))
-        fig39.add_trace(go.Scatter(x=years, y=be_point["BE"], name="Punto Equilibrio", line=dict(dash='dash')))
-        fig39.update_layout(title="39. Ventas vs Punto Equilibrio", template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)')
-        with sc1: st.plotly_chart(fig39, use_container_width=True)
-        
-        # 40. Liquidity (Cash Flow coverage)
-        liq = pd.DataFrame({"Año": years, "Coverage": fcf/1000000}) # Coverage of 1M debt service
-        with sc2: st.plotly_chart(plot_bar(liq, "Año", "Coverage", "40. Cobertura de Deuda (DSCR)"), use_container_width=True)
+# Million-scenario sweeps (ferpa_sweep.py output): the points stay on the server, the
+# browser gets a fixed-size density grid and quantile ribbons re-binned per zoom window
+@st.cache_resource
+def get_density_cache():
+    # ~40 MB per grid at 1M scenarios (points + base histogram): bounded in bytes, not only entries
+    return LRUCache(max_entries=8, max_bytes=512 * 2**20, name="bi_density")
 
-    # === TAB 5: IMPACTO (41-50) ===
-    with tabs[4]:
-        st.subheader("ESG & IMPACTO")
-        
-        ic1, ic2 = st.columns(2)
-        
-        # 41. CO2 Avoided
-        with ic1: st.plotly_chart(plot_area(df_env, "Año", "Valor", "41. CO2 Evitado (Ton/Año)", "#2ECC71"), use_container_width=True)
-        
-        # 42. Cumulative CO2
-        co2_vals = df_env["Valor"].values
-        co2_cum = co2_vals.cumsum()
-        df_co2_cum = pd.DataFrame({"Año": years, "Cum": co2_cum})
-        with ic2: st.plotly_chart(plot_line(df_co2_cum, "Año", "Cum", "42. Descarbonización Acumulada", "#27AE60"), use_container_width=True)
-        
-        # 43-46: Detail
-        dc1, dc2, dc3, dc4 = st.columns(4)
-        
-        # 43. Trees Equivalent
-        trees = pd.DataFrame({"Año": years, "Trees": co2_vals / 0.02})
-        with dc1: st.plotly_chart(plot_bar(trees, "Año", "Trees", "43. Árboles Equivalentes"), use_container_width=True)
-        
-        # 44. Leachate Avoided
-        leach = pd.DataFrame({"Año": years, "Lix": prod_vals * 0.4}) # 0.4m3 per ton
-        with dc2: st.plotly_chart(plot_area(leach, "Año", "Lix", "44. Lixiviados Evitados (m3)", "#3498DB"), use_container_width=True)
-        
-        # 45. Social Impact (Jobs)
-        jobs = pd.DataFrame({"Año": years, "Jobs": [30 + i for i in range(len(years))]})
-        with dc3: st.plotly_chart(plot_line(jobs, "Año", "Jobs", "45. Empleos Directos"), use_container_width=True)
-        
-        # 46. Community Savings (Tipping fee savings for Muni? or Blocks?)
-        # Savings from cheaper blocks
-        savings = pd.DataFrame({"Año": years, "Save": prod_vals * 511 * (0.85 - 0.65)}) # 20 cents per block
-        with dc4: st.plotly_chart(plot_bar(savings, "Año", "Save", "46. Ahorro Comunitario ($)"), use_container_width=True)
-        
-        # 47-50: Summary
-        xc1, xc2 = st.columns(2)
-        
-        # 47. SDG Mapping (Mock Radar)
-        df_sdg = pd.DataFrame(dict(
-            r=[5, 4, 5, 3, 4],
-            theta=['Clima', 'Empleo', 'Innovación', 'Comunidad', 'Agua']))
-        fig47 = px.line_polar(df_sdg, r='r', theta='theta', line_close=True, title="47. Cumplimiento ODS (1-5)")
-        fig47.update_layout(template="plotly_dark", height=300, paper_bgcolor='rgba(0,0,0,0)')
-        with xc1: st.plotly_chart(fig47, use_container_width=True)
-        
-        # 48. Carbon Credit Revenue
-        cc_rev = pd.DataFrame({"Año": years, "CC_Rev": co2_vals * 15})
-        with xc2: st.plotly_chart(plot_bar(cc_rev, "Año", "CC_Rev", "48. Ingresos por Bonos Carbono"), use_container_width=True)
-        
-        # 49. Water Credit Revenue
-        wc_rev = pd.DataFrame({"Año": years, "WC_Rev": leach["Lix"] * 10})
-        with xc1: st.plotly_chart(plot_bar(wc_rev, "Año", "WC_Rev", "49. Ingresos por Bonos Agua"), use_container_width=True)
-        
-        # 50. Total ESG Value
-        esg_tot = pd.DataFrame({"Año": years, "Total": cc_rev["CC_Rev"] + wc_rev["WC_Rev"] + savings["Save"]})
-        with xc2: st.plotly_chart(plot_area(esg_tot, "Año", "Total", "50. Valor Social Total Generado"), use_container_width=True)
+def get_density(out_dir, x, y, z, parts):
+    return get_density_cache().get_or_compute((os.path.abspath(out_dir), x, y, z, parts),
+                                              lambda: DensityGrid.from_sweep(out_dir, x, y, z))
+
+with st.expander("🔭 BARRIDO DE ESCENARIOS (DENSIDAD)", expanded=False):
+    sweep_dir = st.text_input("Directorio del barrido", os.environ.get("FERPA_SWEEP", "sweeps"))
+    parts = sorted(glob.glob(os.path.join(sweep_dir, "part-*.parquet")))
+    if not parts:
+        st.info("Sin resultados de barrido. Genérelos con `python ferpa_sweep.py <directorio> --sidebar N`.")
+    else:
+        cols = ferpa_sweep.sweep_columns(sweep_dir)
+        b1, b2, b3, b4 = st.columns(4)
+        x_col = b1.selectbox("Eje X", cols, index=0)
+        y_opts = [c for c in cols if c != x_col]
+        y_col = b2.selectbox("Eje Y", y_opts, index=y_opts.index("npv") if "npv" in y_opts else 0)
+        z_col = b3.selectbox("Color", ["(densidad)"] + [c for c in cols if c not in (x_col, y_col)])
+        bins = b4.select_slider("Celdas por eje", [32, 64, 128, 256], value=128)
+        # The part count keys the cache, so a sweep still running is re-read as chunks land
+        grid = get_density(sweep_dir, x_col, y_col, None if z_col == "(densidad)" else z_col, len(parts))
+        # Zoom: every change re-bins only the window (from the base histogram or the sliced points)
+        x_win = st.slider(f"Zoom {x_col}", *grid.x_extent, grid.x_extent, key=f"zoom_x_{x_col}")
+        y_win = st.slider(f"Zoom {y_col}", *grid.y_extent, grid.y_extent, key=f"zoom_y_{y_col}")
+        view = grid.view(x_win, y_win, bins)
+        if view["points"] == 0:
+            st.info("No hay escenarios en la ventana de zoom.")
+        else:
+            d1, d2 = st.columns(2)
+            with d1: st.plotly_chart(plot_density(view, x_col, y_col, f"Densidad {y_col} vs {x_col}",
+                                                  None if z_col == "(densidad)" else z_col), use_container_width=True)
+            with d2: st.plotly_chart(plot_ribbon(grid.ribbons(x_win, y_win, bins), x_col, y_col,
+                                                 f"{y_col} por {x_col} (P5 / P25 / P50 / P75 / P95)"), use_container_width=True)
+            st.caption(f"{view['points']:,} de {len(grid):,} escenarios en la ventana · {bins}² celdas desde "
+                       f"{'el histograma base' if view['source'] == 'base' else 'los puntos'} · "
+                       f"{grid.dropped:,} escenarios sin valor finito omitidos")
+
+# Hidden diagnostics (?diag=1): load / chart timings, cache hit rates, Chrome trace
+if st.query_params.get("diag") == "1":
+    PROFILER.render_panel()
+    STARTUP.render_panel()
 
 st.success("Tablero BI Generado Exitosamente con 50 Visualizaciones.")
@@ -0,0 +1,278 @@
+import argparse
+import ast
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import numpy_financial as npf
+import pandas as pd
+
+from ferpa_columnar import SHEETS, convert_workbook, load_workbook
+from ferpa_config import DEFAULT_PLAN
+from ferpa_export import powerbi_frame
+from ferpa_irr import solve_irr
+from ferpa_kpi import KPICube
+from ferpa_logic import BATCH_PARAMS, DEFAULT_PARAMS, SimuladorFerpaV5, batch_result, run_batch
+from ferpa_montecarlo import default_distributions, run_montecarlo
+from ferpa_portfolio import run_portfolio
+from ferpa_sensitivity import tornado
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BATCH_SIZES = {"1": 1, "1k": 1_000, "100k": 100_000}
+
+
+# --- SYNTHETIC DATA ---
+def synthetic_workbook(path, years=10, extra_kpis=0, seed=0):
+    """Write a workbook with the sheets and KPI names bi_app reads, filled from the model.
+
+    DATA_POWERBI is the long (Categoría, Sub-Categoría, Año, Valor) table for the default
+    scenario; `extra_kpis` adds random "Sintético" rows to scale the workbook. The P&L and
+    FCF sheets carry a three-row title block so their header sits on row 4, like the master.
+    """
+    res = batch_result(run_batch(**DEFAULT_PARAMS, years=years), 0)
+    df = res.df
+    rng = np.random.default_rng(seed)
+    extra = pd.DataFrame([{"Categoría": "Sintético", "Sub-Categoría": f"KPI {k}", "Año": year, "Valor": v}
+                          for k in range(extra_kpis) for year, v in zip(df["Año"], rng.lognormal(13, 1, years))],
+                         columns=["Categoría", "Sub-Categoría", "Año", "Valor"])
+    pbi = pd.concat([powerbi_frame(res), extra], ignore_index=True)
+    with pd.ExcelWriter(path, engine="openpyxl") as book:
+        pbi.to_excel(book, sheet_name="DATA_POWERBI", index=False)
+        for name, cols in (("ESTADO_RESULTADOS", ["Año", "Ingresos", "OPEX_Total", "EBITDA", "Deprec", "Impuestos",
+                                                  "Utilidad_Neta"]),
+                           ("FLUJO_CAJA_LIBRE", ["Año", "Flujo_Operativo", "Pago_Retorno_Capital", "Pago_Dividendos",
+                                                 "Caja_Ferpa"])):
+            pd.DataFrame([[f"FERPA CR - {name}"]]).to_excel(book, sheet_name=name, index=False, header=False)
+            df[cols].to_excel(book, sheet_name=name, index=False, startrow=SHEETS[name])
+    return path
+
+
+def script_builders(path):
+    """Namespace with the figure builders of a Streamlit script, without running its page.
+
+    Keeps the imports (minus streamlit, plus ferpa_startup.lazy() module stand-ins),
+    UPPER_CASE constants and function definitions of the script; page code, Streamlit calls and cache decorators are dropped, so builders
+    are timed uncached. Registry decorators (bi_app's @chart) are kept.
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+
+    def uses_st(node):
+        return any(isinstance(n, ast.Name) and n.id == "st" for n in ast.walk(node))
+
+    body = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            if not any(a.name == "streamlit" for a in node.names):
+                body.append(node)
+        elif isinstance(node, ast.FunctionDef):
+            node.decorator_list = [d for d in node.decorator_list
+                                   if isinstance(d, ast.Call) and getattr(d.func, "id", None) == "chart"]
+            if not uses_st(node):
+                body.append(node)
+        elif isinstance(node, ast.Assign) and all(isinstance(t, ast.Name) and t.id.isupper() for t in node.targets):
+            body.append(node)
+        elif (isinstance(node, ast.Assign) and isinstance(node.value, ast.Call)
+              and getattr(node.value.func, "id", None) == "lazy"):
+            body.append(node)
+    namespace = {"__name__": os.path.splitext(os.path.basename(path))[0]}
+    exec(compile(ast.Module(body=body, type_ignores=[]), path, "exec"), namespace)
+    return namespace
+
+
+# --- TIMING ---
+def measure(fn, repeat=5, number=1):
+    """Seconds per call of fn(): median and min over `repeat` rounds of `number` calls (one warm-up call)."""
+    fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - t0) / number)
+    return {"seconds": statistics.median(times), "min": min(times), "repeat": repeat, "number": number}
+
+
+def bench_model(repeat):
+    out = {}
+    sim = SimuladorFerpaV5(**DEFAULT_PARAMS, interest_rate=0.0, roi_target=3)
+    out["single.run_simulation"] = measure(sim.run_simulation, repeat, 200)
+    out["single.run_simulation_df"] = measure(lambda: sim.run_simulation().df, repeat, 100)
+    rng = np.random.default_rng(0)
+    for label, n in BATCH_SIZES.items():
+        params = {p: DEFAULT_PARAMS[p] * rng.uniform(0.8, 1.2, n) for p in BATCH_PARAMS}
+        m = out[f"batch.{label}"] = measure(lambda: run_batch(**params), repeat, max(1, 1000 // n))
+        m["scenarios_per_sec"] = n / m["min"]
+    return out
+
+
+def bench_irr(repeat):
+    rng = np.random.default_rng(0)
+    flows = np.column_stack([-rng.uniform(5e6, 2e7, 10_000), rng.uniform(1e6, 8e6, (10_000, 10))])
+    return {
+        "irr.npf_row": measure(lambda: npf.irr(flows[0]), repeat, 20),
+        "irr.solve_row": measure(lambda: solve_irr(flows[:1]), repeat, 200),
+        "irr.solve_10k": measure(lambda: solve_irr(flows), repeat),
+    }
+
+
+def bench_load(repeat, workdir, extra_kpis=0):
+    xlsx = synthetic_workbook(os.path.join(workdir, "FERPA_Master_Model_CR.xlsx"), extra_kpis=extra_kpis)
+    cache_dir = os.path.join(workdir, ".ferpa_cache")
+
+    def read_excel():
+        with pd.ExcelFile(xlsx) as book:
+            return {name: book.parse(name, header=header) for name, header in SHEETS.items()}
+    out = {
+        "load.excel": measure(read_excel, repeat),
+        "load.convert": measure(lambda: convert_workbook(xlsx, cache_dir), repeat),
+        "load.columnar": measure(lambda: load_workbook(xlsx, cache_dir), repeat, 10),
+    }
+    pbi = load_workbook(xlsx, cache_dir)["DATA_POWERBI"]
+    out["load.kpi_cube"] = measure(lambda: KPICube(pbi), repeat, 10)
+    return out, pbi
+
+
+def bench_app_figures(repeat):
+    # Same data slices app.py hands each builder, per tab
+    ns = script_builders(os.path.join(HERE, "app.py"))
+    df = batch_result(run_batch(**DEFAULT_PARAMS), 0).df
+    y1 = df.iloc[0]
+    tor = tornado(DEFAULT_PARAMS)
+    mc = run_montecarlo(DEFAULT_PARAMS, default_distributions(DEFAULT_PARAMS), 10_000, seed=42)
+    plants = pd.DataFrame([dict(DEFAULT_PARAMS, start_year=2025 + 2 * k, ramp=[0.5, 0.8]) for k in range(3)])
+    cons = run_portfolio(plants, horizon=20)["consolidated"]
+    tabs = {
+        "dashboard": lambda: ns["fig_sankey"](y1[["Rev_Bloques", "Rev_Recic", "Rev_Tipping", "Rev_Bonos", "OPEX_Total",
+                                                  "Impuestos", "Pago_Retorno_Capital", "Pago_Dividendos", "Caja_Ferpa"]],
+                                              DEFAULT_PLAN.opex_pct),
+        "ingenieria": lambda: (ns["fig_sunburst"](df[["Bloque #5", "Adoquín Pesado", "Ladrillo Decorativo"]].iloc[0]),
+                               ns["fig_gauge"](80.0, "Uso Planta %", "#00FFAA"),
+                               ns["fig_gauge"](60.0, "Meta Ventas %", "#FF0055")),
+        "costos": lambda: ns["fig_treemap"](y1["OPEX_Total"], ns["opex_lines"](DEFAULT_PLAN, y1)),
+        "inversionista": lambda: (
+            ns["fig_investor_combo"](df[["Año", "Pago_Retorno_Capital", "Pago_Dividendos", "Saldo_Inversion"]]),
+            ns["fig_tornado"](tor[["Parámetro", "VAN_Bajo", "VAN_Alto"]], "VAN", tor.attrs["base"]["npv"])),
+        "riesgo": lambda: (ns["fan_chart"](mc["years"], mc["ebitda"], "EBITDA", "#00FFAA"),
+                           ns["fan_chart"](mc["path_years"], mc["npv_path"], "VAN", "#FF0055")),
+        "portafolio": lambda: ns["fig_portfolio"](cons[["Año", "EBITDA", "Flujo_Investor_Total", "Caja_Ferpa"]]),
+    }
+    return {f"fig.app.{tab}": measure(build, repeat) for tab, build in tabs.items()}
+
+
+def bench_bi_figures(repeat, pbi):
+    ns = script_builders(os.path.join(HERE, "bi_app.py"))
+    d = ns["derive"](KPICube(pbi), True)
+    out = {}
+    for tab, (_, rows) in ns["TABS"].items():
+        nums = [num for _, row in rows for num in row]
+        out[f"fig.bi.{tab.split()[1].lower()}"] = measure(lambda: [ns["CHARTS"][n](d) for n in nums], repeat)
+    return out
+
+
+def run_benchmarks(groups=None, repeat=5, extra_kpis=0, progress=None):
+    """Run the benchmark groups ("model", "irr", "load", "figures"); returns the JSON baseline document."""
+    groups = groups or ["model", "irr", "load", "figures"]
+    metrics = {}
+
+    def record(results):
+        metrics.update(results)
+        if progress:
+            for name, m in results.items():
+                progress(f"{name:<32} {m['seconds'] * 1e3:>12.3f} ms   (min {m['min'] * 1e3:.3f} ms)")
+
+    if "model" in groups:
+        record(bench_model(repeat))
+    if "irr" in groups:
+        record(bench_irr(repeat))
+    if "load" in groups or "figures" in groups:
+        with tempfile.TemporaryDirectory() as workdir:
+            load, pbi = bench_load(repeat, workdir, extra_kpis)
+            if "load" in groups:
+                record(load)
+            if "figures" in groups:
+                record(bench_app_figures(repeat))
+                record(bench_bi_figures(repeat, pbi))
+    versions = {m.__name__: m.__version__ for m in (np, pd)}
+    return {"meta": {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                     "platform": platform.platform(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                     "repeat": repeat, "extra_kpis": extra_kpis, "groups": groups, **versions},
+            "metrics": metrics}
+
+
+def compare(baseline, current, threshold=0.25, min_delta=1e-5):
+    """Metrics present in both documents with their ratio current/baseline (on the best round).
+
+    A metric regresses when it is slower by more than `threshold` (relative) and by more
+    than `min_delta` seconds, so microsecond-scale timings do not fail on jitter alone.
+    """
+    rows = []
+    for name, base in baseline["metrics"].items():
+        cur = current["metrics"].get(name)
+        if cur is None:
+            continue
+        ratio = cur["min"] / base["min"] if base["min"] > 0 else float("inf")
+        regressed = ratio > 1 + threshold and cur["min"] - base["min"] > min_delta
+        rows.append({"metric": name, "baseline": base["min"], "current": cur["min"], "ratio": ratio,
+                     "regressed": regressed})
+    return rows
+
+
+def _save(doc, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(doc, f, indent=2)
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    # python ferpa_bench.py run --out bench/baseline.json
+    # python ferpa_bench.py compare bench/baseline.json --threshold 0.2
+    parser = argparse.ArgumentParser(description="Benchmarks del modelo FERPA y de los tableros (datos sintéticos).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name in ("run", "compare"):
+        p = sub.add_parser(name)
+        if name == "compare":
+            p.add_argument("baseline", help="JSON de referencia")
+            p.add_argument("--current", default=None, help="JSON a comparar (por defecto: medir ahora)")
+            p.add_argument("--threshold", type=float, default=0.25, help="regresión relativa tolerada")
+            p.add_argument("--min-delta", type=float, default=1e-5, help="diferencia mínima en segundos")
+        p.add_argument("--out", default=None, help="guardar el resultado en este JSON")
+        p.add_argument("--only", default=None, help="grupos separados por coma: model,irr,load,figures")
+        p.add_argument("--repeat", type=int, default=5)
+        p.add_argument("--extra-kpis", type=int, default=0, help="filas sintéticas adicionales en DATA_POWERBI")
+    args = parser.parse_args(argv)
+
+    groups = args.only.split(",") if args.only else None
+    if args.command == "compare" and args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        current = run_benchmarks(groups, args.repeat, args.extra_kpis, progress=print)
+    if args.out:
+        _save(current, args.out)
+    if args.command == "run":
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    rows = compare(baseline, current, args.threshold, args.min_delta)
+    for r in rows:
+        flag = "REGRESIÓN" if r["regressed"] else ""
+        print(f"{r['metric']:<32} {r['baseline'] * 1e3:>12.3f} ms -> {r['current'] * 1e3:>12.3f} ms  "
+              f"x{r['ratio']:.2f}  {flag}")
+    regressions = [r["metric"] for r in rows if r["regressed"]]
+    if regressions:
+        print(f"{len(regressions)} métricas empeoraron más de {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print(f"Sin regresiones en {len(rows)} métricas (umbral {args.threshold:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
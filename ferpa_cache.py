@@ -0,0 +1,164 @@
+import functools
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from ferpa_profile import PROFILER, span
+
+
+def canonical_key(params, digits=12):
+    """Hashable, order-independent key for a parameter dict.
+
+    Numbers are normalized to float and rounded to `digits` significant digits so that
+    300, 300.0 and np.int64(300) (or 0.1 + 0.2 and 0.3) hit the same entry.
+    """
+    items = []
+    for name in sorted(params):
+        v = params[name]
+        if isinstance(v, (bool, np.bool_)) or v is None or isinstance(v, str):
+            items.append((name, v))
+        else:
+            items.append((name, float(f"{float(v):.{digits}g}")))
+    return tuple(items)
+
+
+def _feed(h, obj):
+    if isinstance(obj, pd.DataFrame):
+        h.update(repr(list(obj.columns)).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+    elif isinstance(obj, pd.Series):
+        h.update(repr((obj.name, list(obj.index))).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=False).values.tobytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(repr((obj.dtype.str, obj.shape)).encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        for k in sorted(obj, key=repr):
+            h.update(repr(k).encode())
+            _feed(h, obj[k])
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"(")
+        for item in obj:
+            _feed(h, item)
+        h.update(b")")
+    else:
+        h.update(repr(obj).encode())
+
+
+def fingerprint(*objs):
+    """Content hash of DataFrames/Series/arrays/containers (not of object identity)."""
+    h = hashlib.blake2b(digest_size=16)
+    for obj in objs:
+        _feed(h, obj)
+    return h.hexdigest()
+
+
+def nbytes(obj):
+    """Rough in-memory size of a cached value."""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(np.sum(obj.memory_usage(deep=True)))
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(nbytes(v) for v in obj)
+    if isinstance(getattr(obj, "nbytes", None), int):
+        return obj.nbytes
+    if hasattr(obj, "to_plotly_json"):
+        return nbytes(obj.to_plotly_json())
+    return sys.getsizeof(obj)
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by entry count and by estimated bytes.
+
+    Meant to be shared by every Streamlit session of the process (st.cache_resource),
+    so values are returned as-is and must be treated as read-only by callers. Hits and
+    misses are reported to the profiler under `name`.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=128 * 2**20, sizeof=nbytes, name="cache"):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                PROFILER.count(self.name, "hit")
+                return self._data[key][0]
+            self.misses += 1
+            PROFILER.count(self.name, "miss")
+            return default
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._data.pop(key)[1]
+            if size > self.max_bytes:
+                return value
+            self._data[key] = (value, size)
+            self.nbytes += size
+            while len(self._data) > self.max_entries or self.nbytes > self.max_bytes:
+                self.nbytes -= self._data.popitem(last=False)[1][1]
+                self.evictions += 1
+        return value
+
+    def get_or_compute(self, key, compute):
+        # Computed outside the lock: a concurrent miss on the same key costs a
+        # duplicate computation, never a blocked session
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                PROFILER.count(self.name, "hit")
+                return self._data[key][0]
+            self.misses += 1
+            PROFILER.count(self.name, "miss")
+        return self.put(key, compute())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {"entries": len(self._data), "bytes": self.nbytes, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+def _timed_build(builder, args, kwargs):
+    with span(builder.__qualname__, "figure"):
+        return builder(*args, **kwargs)
+
+
+def cached_figure(cache):
+    """Memoize a figure builder on the content of the data slices it receives."""
+    def decorator(builder):
+        @functools.wraps(builder)
+        def wrapper(*args, **kwargs):
+            key = (builder.__qualname__, fingerprint(args, kwargs))
+            return cache.get_or_compute(key, lambda: _timed_build(builder, args, kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# Sheets of FERPA_Master_Model_CR.xlsx used by bi_app and the header row of each
+SHEETS = {
+    "DATA_POWERBI": 0,
+    "ESTADO_RESULTADOS": 3,
+    "FLUJO_CAJA_LIBRE": 3,
+}
+# Sheets only present in some workbooks (DEUDA: debt schedule of a levered export)
+OPTIONAL_SHEETS = {
+    "DEUDA": 0,
+}
+
+MANIFEST = "manifest.json"
+# Streamlit sessions are threads of one process: one conversion (check included) at a
+# time, so two sessions hitting a changed workbook do not both rewrite the cache
+_CONVERT_LOCK = threading.RLock()
+
+
+def default_cache_dir(xlsx_path):
+    return os.path.join(os.path.dirname(os.path.abspath(xlsx_path)), ".ferpa_cache")
+
+
+def file_sha256(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _replace_atomically(path, write):
+    # Unique temp name next to `path`, renamed over it once fully written; concurrent
+    # writers (other processes included) never share or publish a half-written file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _arrow_safe(df):
+    # Excel sheets with a title block produce "Unnamed: n" / numeric headers and columns
+    # mixing text and numbers; Arrow needs string names and one type per column
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    for c in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[c])
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[c] = df[c].map(lambda v: v if pd.isna(v) else str(v))
+    return df
+
+
+def convert_workbook(xlsx_path, cache_dir=None, sheets=SHEETS, optional=OPTIONAL_SHEETS):
+    """Parse the workbook once (single openpyxl pass) and write one uncompressed Feather file per sheet.
+
+    `optional` sheets missing from the workbook are skipped (and any stale copy removed).
+    """
+    cache_dir = cache_dir or default_cache_dir(xlsx_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    with _CONVERT_LOCK:
+        stat = os.stat(xlsx_path)
+        with pd.ExcelFile(xlsx_path) as book:
+            present = [name for name in optional if name in book.sheet_names]
+            for name, header in {**sheets, **{n: optional[n] for n in present}}.items():
+                df = _arrow_safe(book.parse(name, header=header))
+                _replace_atomically(os.path.join(cache_dir, f"{name}.feather"),
+                                    lambda tmp: feather.write_feather(df, tmp, compression="uncompressed"))
+        for name in optional:
+            path = os.path.join(cache_dir, f"{name}.feather")
+            if name not in present and os.path.exists(path):
+                os.remove(path)
+        manifest = {"source": os.path.abspath(xlsx_path), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+                    "sha256": file_sha256(xlsx_path), "sheets": sheets, "optional": optional, "present": present}
+        _write_manifest(cache_dir, manifest)
+    return manifest
+
+
+def _write_manifest(cache_dir, manifest):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+    _replace_atomically(os.path.join(cache_dir, MANIFEST), write)
+
+
+def _read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def ensure_columnar(xlsx_path, cache_dir=None, sheets=SHEETS, optional=OPTIONAL_SHEETS):
+    """Bring the columnar cache up to date; returns (cache_dir, converted?).
+
+    mtime and size are checked first (one stat call). Only if they moved is the file
+    hashed, so a touched-but-identical workbook is not re-parsed. Without the workbook an
+    existing cache is served as is.
+    """
+    cache_dir = cache_dir or default_cache_dir(xlsx_path)
+    with _CONVERT_LOCK:
+        return _ensure_columnar(xlsx_path, cache_dir, sheets, optional)
+
+
+def _ensure_columnar(xlsx_path, cache_dir, sheets, optional):
+    manifest = _read_manifest(cache_dir)
+    cached = (manifest is not None and manifest.get("sheets") == sheets and manifest.get("optional") == optional
+              and all(os.path.exists(os.path.join(cache_dir, f"{name}.feather"))
+                      for name in list(sheets) + manifest["present"]))
+    if not os.path.exists(xlsx_path):
+        if cached:
+            return cache_dir, False
+        raise FileNotFoundError(xlsx_path)
+    stat = os.stat(xlsx_path)
+    if cached and (manifest["mtime_ns"], manifest["size"]) == (stat.st_mtime_ns, stat.st_size):
+        return cache_dir, False
+    if cached and manifest["size"] == stat.st_size and manifest["sha256"] == file_sha256(xlsx_path):
+        manifest["mtime_ns"] = stat.st_mtime_ns
+        _write_manifest(cache_dir, manifest)
+        return cache_dir, False
+    convert_workbook(xlsx_path, cache_dir, sheets, optional)
+    return cache_dir, True
+
+
+def read_sheet(cache_dir, name):
+    """Memory-map one converted sheet (zero-copy Arrow read) and hand it to pandas."""
+    with pa.memory_map(os.path.join(cache_dir, f"{name}.feather")) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas()
+
+
+def load_workbook(xlsx_path, cache_dir=None, sheets=SHEETS, optional=OPTIONAL_SHEETS):
+    """Sheets of the workbook as DataFrames (dict, `sheets` then `optional`), via the columnar cache.
+
+    Optional sheets the workbook does not have are None.
+    """
+    cache_dir, _ = ensure_columnar(xlsx_path, cache_dir, sheets, optional)
+    present = _read_manifest(cache_dir)["present"]
+    out = {name: read_sheet(cache_dir, name) for name in sheets}
+    out.update({name: read_sheet(cache_dir, name) if name in present else None for name in optional})
+    return out
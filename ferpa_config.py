@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ferpa_config.json")
+
+# COLUMNAS a fixed cost line may be booked to
+FIXED_COST_COLUMNS = ["Cost_Energy", "Cost_Payroll"]
+
+
+def load_config(path=DEFAULT_CONFIG_PATH):
+    """Read a model config from JSON or YAML (.yaml / .yml, needs PyYAML)."""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Instale PyYAML para leer configuraciones YAML (pip install pyyaml)")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+class ModelPlan:
+    """A model config compiled once into the coefficients every evaluation reads.
+
+    Whatever scales with the number of SKUs or cost lines is reduced here: the weighted
+    block price factor (sum of share * factor, in config order), per-SKU share and price
+    factor arrays for the revenue detail, and the fixed cost lines summed per column
+    (the lines themselves are kept as (name, column, amount) for display). Plans are
+    immutable; `key` is a content hash of the config, so caches and
+    ferpa_cache.fingerprint can tell plans apart.
+    """
+    __slots__ = ("config", "key", "sku_names", "sku_share", "sku_factor", "weighted_factor", "opex_pct",
+                 "fixed_costs", "fixed_lines", "co2_per_ton", "lix_per_ton", "capital_return", "dividend_pct",
+                 "depreciation_years")
+
+    def __init__(self, config):
+        skus = config.get("skus") or []
+        if not skus:
+            raise ValueError("La configuración necesita al menos un SKU")
+        names = [str(s["name"]) for s in skus]
+        if len(set(names)) != len(names):
+            raise ValueError("Hay SKUs con nombre repetido")
+        shares = [float(s["share"]) for s in skus]
+        factors = [float(s["factor"]) for s in skus]
+        if abs(sum(shares) - 1.0) > 1e-9:
+            raise ValueError(f"Las participaciones de los SKU deben sumar 1 (suman {sum(shares):.6f})")
+        fixed = dict.fromkeys(FIXED_COST_COLUMNS, 0.0)
+        lines = []
+        for line in config["opex"].get("fixed", []):
+            if line["column"] not in fixed:
+                raise ValueError(f"Columna de costo fijo desconocida: {line['column']} (opciones: {FIXED_COST_COLUMNS})")
+            fixed[line["column"]] += float(line["amount"])
+            lines.append((str(line.get("name", line["column"])), line["column"], float(line["amount"])))
+        if len({name for name, _, _ in lines}) != len(lines):
+            raise ValueError("Hay costos fijos con nombre repetido")
+        capital_return = np.asarray(config["capital_return"], dtype=float)
+        if (capital_return < 0).any():
+            raise ValueError("El calendario de retorno de capital no admite fracciones negativas")
+        if float(config["depreciation_years"]) <= 0:
+            raise ValueError("depreciation_years debe ser positivo")
+
+        self.config = config
+        self.key = hashlib.blake2b(json.dumps(config, sort_keys=True).encode(), digest_size=16).hexdigest()
+        self.sku_names = names
+        self.sku_share = np.array(shares)
+        self.sku_factor = np.array(factors)
+        # Python sum in config order: the same float the original per-year sum produced
+        self.weighted_factor = sum([s * f for s, f in zip(shares, factors)])
+        self.opex_pct = float(config["opex"]["pct_rev_bloques"])
+        self.fixed_costs = fixed
+        self.fixed_lines = lines
+        self.co2_per_ton = float(config["environment"]["co2_per_ton"])
+        self.lix_per_ton = float(config["environment"]["lixiviado_per_ton"])
+        self.capital_return = capital_return
+        self.dividend_pct = float(config["dividend_pct"])
+        self.depreciation_years = float(config["depreciation_years"])
+
+    def __repr__(self):
+        return f"ModelPlan({len(self.sku_names)} SKUs, {self.key})"
+
+    def __eq__(self, other):
+        return isinstance(other, ModelPlan) and other.key == self.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+def compile_config(config_or_path=DEFAULT_CONFIG_PATH):
+    """ModelPlan of a config dict or of a config file path."""
+    if isinstance(config_or_path, ModelPlan):
+        return config_or_path
+    if isinstance(config_or_path, (str, os.PathLike)):
+        config_or_path = load_config(os.fspath(config_or_path))
+    return ModelPlan(config_or_path)
+
+
+DEFAULT_PLAN = compile_config(DEFAULT_CONFIG_PATH)
@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+# Amortization profiles; codes index the per-tranche `profile` array
+PROFILES = ["annuity", "linear", "sculpted", "bullet"]
+ANNUITY, LINEAR, SCULPTED, BULLET = range(len(PROFILES))
+
+
+def debt_scenarios(debt, interest_rate=0.0):
+    """Number of scenarios the per-scenario terms of `debt` (and `interest_rate`) describe; 1 if all scalar."""
+    if not isinstance(debt, dict):
+        debt = {"tranches": debt}
+    sizes = [np.size(v) for t in debt["tranches"] for k, v in t.items() if k != "profile"]
+    sizes += [np.size(debt.get(k, 0.0)) for k in ("lockup_dscr", "sweep")] + [np.size(interest_rate)]
+    n = max(sizes)
+    if any(s not in (1, n) for s in sizes):
+        raise ValueError(f"Los términos de deuda deben ser escalares o tener {n} valores")
+    return n
+
+
+def compile_debt(debt, n, capex, interest_rate=0.0):
+    """Financing structure as arrays over S scenarios x T tranches (senior first).
+
+    `debt` is a list of tranches or {"tranches": [...], "lockup_dscr": x, "sweep": f}.
+    A tranche has "amount" (currency) or "share" (fraction of CAPEX), "rate" (default
+    `interest_rate`), "tenor" (years, grace included), "grace" (interest-only years),
+    "profile" (annuity, linear, sculpted or bullet) and, for sculpted tranches, the
+    target "dscr". Every number may be a scalar or one value per scenario. Dividends
+    are blocked in years whose DSCR is below lockup_dscr; `sweep` is the share of cash
+    left after debt service and capital return that prepays the tranches in order.
+    """
+    if not isinstance(debt, dict):
+        debt = {"tranches": debt}
+    tranches = debt["tranches"]
+    if not tranches:
+        raise ValueError("La estructura de deuda no tiene tramos")
+    capex = np.broadcast_to(np.asarray(capex, dtype=float).reshape(-1), (n,))
+
+    def column(values):
+        v = np.atleast_1d(np.asarray(values, dtype=float))
+        if v.ndim != 1 or v.shape[0] not in (1, n):
+            raise ValueError(f"Los términos de deuda deben ser escalares o tener {n} valores")
+        return np.broadcast_to(v, (n,))
+
+    def stack(key, default):
+        return np.stack([column(t.get(key, default)) for t in tranches], axis=1)
+
+    unknown = sorted({t.get("profile", "annuity") for t in tranches} - set(PROFILES))
+    if unknown:
+        raise ValueError(f"Perfil de amortización desconocido: {unknown}")
+    terms = {
+        "amount": np.stack([column(t["amount"]) if "amount" in t else capex * column(t["share"])
+                            for t in tranches], axis=1),
+        "rate": stack("rate", interest_rate),
+        "tenor": stack("tenor", 10),
+        "grace": stack("grace", 0),
+        "dscr": stack("dscr", 1.3),
+        "profile": np.array([PROFILES.index(t.get("profile", "annuity")) for t in tranches]),
+        "lockup_dscr": column(debt.get("lockup_dscr", 0.0)).copy(),
+        "sweep": column(debt.get("sweep", 0.0)).copy(),
+    }
+    if np.any(terms["amount"] < 0) or np.any(terms["amount"].sum(axis=1) > capex * (1 + 1e-12)):
+        raise ValueError("La deuda debe estar entre 0 y el CAPEX")
+    if np.any(terms["tenor"] < 1) or np.any(terms["grace"] >= terms["tenor"]):
+        raise ValueError("Cada tramo necesita plazo ≥ 1 y gracia menor que el plazo")
+    if np.any(terms["dscr"] <= 0):
+        raise ValueError("El DSCR objetivo debe ser positivo")
+    return terms
+
+
+def levered_waterfall(terms, ebitda, deprec, tax_rate, payment_return, dividend_pct):
+    """Year-by-year debt schedule and equity waterfall (S x years inputs, S x T x years schedule).
+
+    Each year, vectorized over scenarios and tranches: interest on the opening balance
+    (tax deductible), scheduled principal (annuity and linear re-amortize the balance
+    over the remaining tenor, bullet repays at maturity, sculpted tranches in seniority
+    order take what keeps the total service at CFADS / dscr, with a balloon at
+    maturity), then the capital return, the cash sweep, and dividends unless the year's
+    DSCR breaches the lock-up covenant. Cash shortfalls stay in Caja_Ferpa.
+    """
+    n, years = ebitda.shape
+    amount, rate, tenor, grace, dscr = (terms[k] for k in ("amount", "rate", "tenor", "grace", "dscr"))
+    profile = terms["profile"]
+    sculpted = np.flatnonzero(profile == SCULPTED).tolist()
+    shape = (n, amount.shape[1], years)
+    sched = {"Saldo_Deuda": np.empty(shape), "Intereses": np.empty(shape), "Amortizacion": np.empty(shape),
+             "Prepago": np.empty(shape)}
+    out = {c: np.empty((n, years)) for c in ("Impuestos", "Utilidad_Neta", "Flujo_Operativo", "Pago_Dividendos",
+                                             "Caja_Ferpa", "DSCR")}
+    lockup = np.empty((n, years), dtype=bool)
+    tax_rate = np.broadcast_to(tax_rate, (n, 1))[:, 0]
+    balance = amount.copy()
+    for j in range(years):
+        interest = balance * rate
+        interest_total = interest.sum(axis=1)
+        ebt = ebitda[:, j] - deprec[:, j] - interest_total
+        taxes = np.maximum(ebt * tax_rate, 0.0)
+        net_income = ebt - taxes
+        flujo_op = net_income + deprec[:, j]
+        cfads = ebitda[:, j] - taxes
+
+        # Scheduled principal
+        remaining = np.maximum(tenor - j, 1.0)
+        amortizing = j >= grace
+        with np.errstate(divide="ignore", invalid="ignore"):
+            annuity = np.where(rate > 0, balance * rate / np.expm1(remaining * np.log1p(rate)), balance / remaining)
+        principal = np.select([profile == ANNUITY, profile == LINEAR, profile == BULLET],
+                              [annuity, balance / remaining, np.where(remaining <= 1, balance, 0.0)], 0.0)
+        principal = np.where(amortizing, principal, 0.0)
+        for t in sculpted:
+            room = cfads / dscr[:, t] - interest_total - principal.sum(axis=1)
+            target = np.where(remaining[:, t] <= 1, balance[:, t], np.clip(room, 0.0, balance[:, t]))
+            principal[:, t] = np.where(amortizing[:, t], target, 0.0)
+        service = interest_total + principal.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out["DSCR"][:, j] = np.where(service > 0, cfads / service, np.nan)
+
+        # Equity waterfall: capital return, then the sweep, then dividends
+        remanente = flujo_op - principal.sum(axis=1) - payment_return[:, j]
+        available = np.maximum(remanente, 0.0) * terms["sweep"]
+        prepay = np.zeros_like(principal)
+        for t in range(amount.shape[1]):
+            prepay[:, t] = np.minimum(available, balance[:, t] - principal[:, t])
+            available = available - prepay[:, t]
+        remanente = remanente - prepay.sum(axis=1)
+        lockup[:, j] = out["DSCR"][:, j] < terms["lockup_dscr"]
+        dividend = np.where((remanente > 0) & ~lockup[:, j], remanente * dividend_pct, 0.0)
+        balance = np.maximum(balance - principal - prepay, 0.0)
+
+        sched["Intereses"][:, :, j] = interest
+        sched["Amortizacion"][:, :, j] = principal
+        sched["Prepago"][:, :, j] = prepay
+        sched["Saldo_Deuda"][:, :, j] = balance
+        out["Impuestos"][:, j] = taxes
+        out["Utilidad_Neta"][:, j] = net_income
+        out["Flujo_Operativo"][:, j] = flujo_op
+        out["Pago_Dividendos"][:, j] = dividend
+        out["Caja_Ferpa"][:, j] = remanente - dividend
+    sched["DSCR"] = out.pop("DSCR")
+    sched["Bloqueo"] = lockup
+    return out, sched
+
+
+def debt_frame(batch, idx):
+    """Yearly debt schedule of scenario `idx` of a run_batch result, summed over tranches."""
+    fin = batch["debt"]
+    if fin is None:
+        return None
+    df = pd.DataFrame({c: fin[c][idx].sum(axis=0) for c in ("Saldo_Deuda", "Intereses", "Amortizacion", "Prepago")})
+    df["Servicio_Deuda"] = df["Intereses"] + df["Amortizacion"]
+    df["DSCR"] = fin["DSCR"][idx]
+    df["Bloqueo"] = fin["Bloqueo"][idx]
+    df.insert(0, "Año", batch["years"])
+    return df
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+
+# Cells per axis of the full-extent histogram built once per data set: zoom windows aligned
+# to its cells in equal blocks per view cell are summed from it without touching the points
+BASE_BINS = 1024
+# Cells per axis of the grid sent to the browser, whatever the number of scenarios
+VIEW_BINS = 128
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def quantile_label(q):
+    return f"P{round(q * 100):g}"
+
+
+def _extent(v):
+    lo, hi = float(v.min()), float(v.max())
+    return (lo - 0.5, hi + 0.5) if lo == hi else (lo, hi)
+
+
+def _window(v_range, extent):
+    # Zoom window clipped to the data extent; None is the whole extent
+    if v_range is None:
+        return extent
+    lo, hi = max(float(v_range[0]), extent[0]), min(float(v_range[1]), extent[1])
+    if not lo < hi:
+        raise ValueError(f"Ventana de zoom vacía: {v_range}")
+    return lo, hi
+
+
+def quantile_ribbons(x, y, bins=VIEW_BINS, quantiles=QUANTILES, x_range=None):
+    """Quantiles of y in each of `bins` equal-width x bins: one row per bin, not per point.
+
+    Vectorized over bins: the points are sorted once by (bin, y) and every quantile is
+    read at its interpolated rank inside the bin's run. Empty bins give NaN.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    ok = np.isfinite(x) & np.isfinite(y)
+    x, y = x[ok], y[ok]
+    if not len(x):
+        raise ValueError("No hay puntos finitos para agregar")
+    lo, hi = _window(x_range, _extent(x))
+    keep = (x >= lo) & (x <= hi)
+    x, y = x[keep], y[keep]
+    edges = np.linspace(lo, hi, bins + 1)
+    b = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, bins - 1)
+    ys = y[np.lexsort((y, b))]
+    counts = np.bincount(b, minlength=bins)
+    starts = np.cumsum(counts) - counts
+    last = np.maximum(starts + counts - 1, 0)
+
+    out = pd.DataFrame({"x": (edges[:-1] + edges[1:]) / 2, "n": counts})
+    for q in quantiles:
+        rank = starts + q * np.maximum(counts - 1, 0)
+        below = np.floor(rank).astype(np.int64)
+        frac = rank - below
+        if len(ys):
+            val = ys[np.minimum(below, last)] * (1 - frac) + ys[np.minimum(below + 1, last)] * frac
+        else:
+            val = np.full(bins, np.nan)
+        out[quantile_label(q)] = np.where(counts > 0, val, np.nan)
+    return out
+
+
+class DensityGrid:
+    """2-D density of a large (x, y[, z]) result set, re-binned server-side per zoom window.
+
+    Non-finite points are dropped and the rest kept sorted by x, so the points of any
+    window are one contiguous slice. A BASE_BINS² histogram of the full extent (counts,
+    and sums of z when given) is built once; a window that lies on base cell boundaries
+    and spans a whole multiple of `bins` base cells per axis (e.g. the full extent) is
+    summed from it in equal blocks, any other window re-bins only the sliced points.
+    Either way the view is `bins`² equal cells covering exactly the window, so its size
+    does not depend on the number of scenarios.
+    """
+    __slots__ = ("x", "y", "z", "dropped", "x_extent", "y_extent", "base_counts", "base_sums")
+
+    def __init__(self, x, y, z=None, base_bins=BASE_BINS):
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        ok = np.isfinite(x) & np.isfinite(y)
+        if z is not None:
+            z = np.asarray(z, dtype=float)
+            ok &= np.isfinite(z)
+        if not ok.any():
+            raise ValueError("No hay puntos finitos para agregar")
+        order = np.argsort(x[ok], kind="stable")
+        self.x, self.y = x[ok][order], y[ok][order]
+        self.z = None if z is None else z[ok][order]
+        self.dropped = int((~ok).sum())
+        self.x_extent, self.y_extent = _extent(self.x), _extent(self.y)
+        rng = [self.x_extent, self.y_extent]
+        self.base_counts = np.histogram2d(self.x, self.y, base_bins, range=rng)[0]
+        self.base_sums = None if self.z is None else np.histogram2d(self.x, self.y, base_bins, range=rng,
+                                                                    weights=self.z)[0]
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def nbytes(self):
+        arrays = (self.x, self.y, self.z, self.base_counts, self.base_sums)
+        return int(sum(a.nbytes for a in arrays if a is not None))
+
+    def __repr__(self):
+        return f"DensityGrid({len(self):,} points, {self.dropped:,} dropped, base {self.base_counts.shape[0]}²)"
+
+    @classmethod
+    def from_sweep(cls, out_dir, x, y, z=None, filter=None):
+        """Grid over columns of a ferpa_sweep output; only those columns are read."""
+        from ferpa_sweep import load_sweep
+        table = load_sweep(out_dir, columns=[c for c in (x, y, z) if c], filter=filter)
+        return cls(*[table.column(c).to_numpy() if c else None for c in (x, y, z)])
+
+    def _slice(self, x_range):
+        lo, hi = _window(x_range, self.x_extent)
+        return slice(np.searchsorted(self.x, lo, side="left"), np.searchsorted(self.x, hi, side="right")), (lo, hi)
+
+    def view(self, x_range=None, y_range=None, bins=VIEW_BINS):
+        """`bins` x `bins` aggregate of the window: edges, counts, mean z (if any) and its source.
+
+        Returned as a dict with "x_edges", "y_edges", "counts" (indexed [x, y]), "mean"
+        (None without z), "points" (in the window) and "source" ("base" or "points").
+        """
+        nx, ny = self.base_counts.shape
+        xw, yw = _window(x_range, self.x_extent), _window(y_range, self.y_extent)
+        cx, cy = self._cells(xw, self.x_extent, nx, bins), self._cells(yw, self.y_extent, ny, bins)
+        if cx is not None and cy is not None:
+            (i0, i1), (j0, j1) = cx, cy
+            kx, ky = (i1 - i0) // bins, (j1 - j0) // bins
+
+            def coarsen(base):
+                return base[i0:i1, j0:j1].reshape(bins, kx, bins, ky).sum(axis=(1, 3))
+            counts = coarsen(self.base_counts)
+            sums = None if self.base_sums is None else coarsen(self.base_sums)
+            x_edges = np.linspace(*self.x_extent, nx + 1)[i0:i1 + 1:kx]
+            y_edges = np.linspace(*self.y_extent, ny + 1)[j0:j1 + 1:ky]
+            source = "base"
+        else:
+            sl, _ = self._slice(xw)
+            xs, ys = self.x[sl], self.y[sl]
+            counts, x_edges, y_edges = np.histogram2d(xs, ys, bins, range=[xw, yw])
+            sums = None if self.z is None else np.histogram2d(xs, ys, bins, range=[xw, yw], weights=self.z[sl])[0]
+            source = "points"
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = None if sums is None else np.where(counts > 0, sums / counts, np.nan)
+        return {"x_edges": x_edges, "y_edges": y_edges, "counts": counts, "mean": mean,
+                "points": int(counts.sum()), "source": source}
+
+    @staticmethod
+    def _cells(window, extent, n, bins):
+        # Base cells [lo, hi) of a window on cell boundaries spanning a multiple of `bins`, else None
+        pos = (np.asarray(window) - extent[0]) / ((extent[1] - extent[0]) / n)
+        cells = np.rint(pos)
+        if not np.allclose(pos, cells, rtol=0, atol=1e-6):
+            return None
+        lo, hi = int(cells[0]), int(cells[1])
+        return (lo, hi) if hi > lo and (hi - lo) % bins == 0 else None
+
+    def ribbons(self, x_range=None, y_range=None, bins=VIEW_BINS, quantiles=QUANTILES):
+        """quantile_ribbons of y over the points of the x (and optionally y) window."""
+        sl, xw = self._slice(x_range)
+        xs, ys = self.x[sl], self.y[sl]
+        if y_range is not None:
+            keep = (ys >= y_range[0]) & (ys <= y_range[1])
+            xs, ys = xs[keep], ys[keep]
+        return quantile_ribbons(xs, ys, bins, quantiles, xw)
@@ -0,0 +1,207 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+from ferpa_columnar import OPTIONAL_SHEETS, SHEETS
+from ferpa_config import DEFAULT_PLAN, compile_config
+from ferpa_logic import BATCH_PARAMS, DEFAULT_PARAMS, SimuladorFerpaV5
+
+CURRENCY = '"$"#,##0'
+NUMBER = "#,##0"
+RATIO = '0.00"x"'
+# Columns not formatted as currency
+COLUMN_FORMATS = {"Unidades_Total": NUMBER, "Bloqueo": NUMBER, "DSCR": RATIO, "Covenant_DSCR": RATIO}
+EXCEL_MAX_ROWS = 1_048_576
+
+# bi_app looks these SKUs up by the names the hand-built master used
+MASTER_SKU_NAMES = {"Adoquín Pesado": "Adoquín", "Ladrillo Decorativo": "Ladrillo"}
+
+PL_COLUMNS = ["Ingresos", "OPEX_Total", "EBITDA", "Deprec", "Impuestos", "Utilidad_Neta"]
+FCF_COLUMNS = ["Utilidad_Neta", "Deprec", "Flujo_Operativo", "Pago_Retorno_Capital", "Pago_Dividendos", "Caja_Ferpa",
+               "Flujo_Investor_Total", "Saldo_Inversion"]
+# DEUDA sheet: ferpa_debt.debt_frame plus the lock-up covenant (bi_app chart 40)
+DEBT_COLUMNS = ["Saldo_Deuda", "Intereses", "Amortizacion", "Prepago", "Servicio_Deuda", "DSCR", "Bloqueo",
+                "Covenant_DSCR"]
+
+# BÓVEDA DE DATOS tables and payment schedule of app.py (sheet names are capped at 31 chars)
+VAULT_SHEETS = {
+    "Producción Física": ["Unidades_Total"],
+    "Precios e Ingresos": ["Ingresos", "Rev_Bloques", "Rev_Recic", "Rev_Tipping", "Rev_Bonos"],
+    "Nómina y OPEX": ["OPEX_Total", "Cost_Energy", "Cost_Payroll", "Cost_Variable"],
+    "Estado de Resultados": ["EBITDA", "Deprec", "Impuestos", "Utilidad_Neta"],
+    "Impacto Ambiental": ["Rev_Bonos"],
+    "Cronograma de Pagos": ["Pago_Retorno_Capital", "Pago_Dividendos", "Flujo_Investor_Total", "Saldo_Inversion"],
+}
+
+
+def powerbi_frame(res, plan=None):
+    """Long (Categoría, Sub-Categoría, Año, Valor) table with the KPI names bi_app reads."""
+    plan = DEFAULT_PLAN if plan is None else compile_config(plan)
+    df = res["df"]
+    sim = SimuladorFerpaV5
+    ton_in = df["Unidades_Total"] / (sim.pct_transformacion * sim.factor_expansion * sim.unidades_por_ton_masa)
+    kpis = {
+        ("Financiero", "Ingresos Totales"): df["Ingresos"],
+        ("Financiero", "OPEX"): df["OPEX_Total"],
+        ("Financiero", "EBITDA"): df["EBITDA"],
+        ("Financiero", "Utilidad Neta"): df["Utilidad_Neta"],
+        ("Producción", "Ton Entrada"): ton_in,
+        ("Producción", "Ton Bloques"): ton_in * sim.pct_transformacion,
+        ("Producción", "Ton Recicladas"): ton_in * sim.pct_reciclable,
+        ("Ambiental", "CO2 Evitado"): ton_in * plan.co2_per_ton,
+    }
+    for name in plan.sku_names:
+        kpis[("Ventas", MASTER_SKU_NAMES.get(name, name))] = df[name]
+    years = df["Año"].to_numpy()
+    return pd.DataFrame({
+        "Categoría": np.repeat([cat for cat, _ in kpis], len(years)),
+        "Sub-Categoría": np.repeat([sub for _, sub in kpis], len(years)),
+        "Año": np.tile(years, len(kpis)),
+        "Valor": np.concatenate([np.asarray(v, dtype=float) for v in kpis.values()]),
+    })
+
+
+def _cells(ws, values, number_format=None, font=None):
+    cells = []
+    for v in values:
+        cell = WriteOnlyCell(ws, value=v)
+        if font is not None:
+            cell.font = font
+        if number_format is not None and isinstance(v, float):
+            cell.number_format = number_format
+        cells.append(cell)
+    return cells
+
+
+def _table_sheet(wb, name, df, columns, title=None, header_row=0):
+    # Formatted yearly table: optional title block, header on `header_row`, one row per year
+    ws = wb.create_sheet(name[:31])
+    ws.column_dimensions["A"].width = 8
+    for k in range(len(columns)):
+        ws.column_dimensions[get_column_letter(k + 2)].width = max(14, len(columns[k]) + 2)
+    if title is not None:
+        ws.append(_cells(ws, [title], font=Font(bold=True, size=14)))
+    for _ in range(header_row - (title is not None)):
+        ws.append([])
+    ws.append(_cells(ws, ["Año"] + columns, font=Font(bold=True)))
+    formats = [COLUMN_FORMATS.get(c, CURRENCY) for c in columns]
+    for year, row in zip(df["Año"].tolist(), df[columns].itertuples(index=False, name=None)):
+        cells = [WriteOnlyCell(ws, value=year)]
+        for v, fmt in zip(row, formats):
+            # Excel has no NaN (e.g. DSCR of a year without debt service): leave the cell empty
+            cell = WriteOnlyCell(ws, value=None if pd.isna(v) else float(v))
+            cell.number_format = fmt
+            cells.append(cell)
+        ws.append(cells)
+    return ws
+
+
+def export_simulation(path, res, params=None, plan=None, title="FERPA CR", debt=None, lockup_dscr=0.0):
+    """Write one run_simulation result as a workbook bi_app.load_data can read.
+
+    DATA_POWERBI, ESTADO_RESULTADOS and FLUJO_CAJA_LIBRE follow the master layout
+    (header rows per ferpa_columnar.SHEETS), followed by the BÓVEDA DE DATOS tables, the
+    payment schedule, with `debt` (a ferpa_debt.debt_frame) the DEUDA sheet and its
+    `lockup_dscr` covenant, and with `params` a PARAMETROS sheet. openpyxl write-only mode
+    streams every row to disk; `path` may also be a binary file object.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("DATA_POWERBI")
+    ws.append(_cells(ws, ["Categoría", "Sub-Categoría", "Año", "Valor"], font=Font(bold=True)))
+    for row in powerbi_frame(res, plan).itertuples(index=False, name=None):
+        ws.append(row)
+    df = res["df"]
+    _table_sheet(wb, "ESTADO_RESULTADOS", df, PL_COLUMNS, f"{title} · Estado de Resultados", SHEETS["ESTADO_RESULTADOS"])
+    _table_sheet(wb, "FLUJO_CAJA_LIBRE", df, FCF_COLUMNS, f"{title} · Flujo de Caja Libre", SHEETS["FLUJO_CAJA_LIBRE"])
+    for name, columns in VAULT_SHEETS.items():
+        _table_sheet(wb, name, df, columns)
+    if debt is not None:
+        _table_sheet(wb, "DEUDA", debt.assign(Covenant_DSCR=float(lockup_dscr)), DEBT_COLUMNS,
+                     header_row=OPTIONAL_SHEETS["DEUDA"])
+    if params is not None:
+        ws = wb.create_sheet("PARAMETROS")
+        ws.append(_cells(ws, ["Parámetro", "Valor"], font=Font(bold=True)))
+        for k, v in {**params, **res["metrics"]}.items():
+            ws.append([k, float(v)])
+    wb.save(path)
+    return path
+
+
+def _as_chunks(results):
+    return [results] if isinstance(results, dict) else results
+
+
+def export_batch(path, results, layout="rows", columns=None):
+    """Stream run_batch results (one dict or an iterable of chunks) into a workbook.
+
+    RESUMEN gets one row per scenario (IRR, NPV, CAPEX, production). layout="rows" writes
+    every (scenario, Año) as a row of ESCENARIOS, continuing on ESCENARIOS_2, ... at
+    Excel's row limit; layout="sheets" writes one sheet per scenario, each closed as
+    soon as it is complete. Chunks are consumed one at a time, so a sweep can be
+    exported without holding all of it in memory.
+    """
+    if layout not in ("rows", "sheets"):
+        raise ValueError("layout debe ser 'rows' o 'sheets'")
+    wb = Workbook(write_only=True)
+    bold = Font(bold=True)
+    summary = wb.create_sheet("RESUMEN")
+    summary.append(_cells(summary, ["Escenario", "TIR", "VAN", "CAPEX", "Producción"], font=bold))
+    sheet, sheet_rows, n_sheets = None, EXCEL_MAX_ROWS, 0
+    offset = 0
+    for res in _as_chunks(results):
+        names = columns or res["columns"]
+        idx = [res["columns"].index(c) for c in names]
+        data = res["data"][:, :, idx]
+        m = res["metrics"]
+        years = res["years"].tolist()
+        for i, row in enumerate(zip(m["irr"].tolist(), m["npv"].tolist(), m["capex"].tolist(),
+                                    m["total_prod"].tolist())):
+            summary.append([offset + i, *row])
+        for i in range(len(data)):
+            block = data[i].tolist()
+            if layout == "sheets":
+                ws = wb.create_sheet(f"E{offset + i:06d}")
+                ws.append(_cells(ws, ["Año"] + names, font=bold))
+                for year, values in zip(years, block):
+                    ws.append([year, *values])
+                ws.close()
+                continue
+            for year, values in zip(years, block):
+                if sheet_rows == EXCEL_MAX_ROWS:
+                    n_sheets += 1
+                    sheet = wb.create_sheet("ESCENARIOS" if n_sheets == 1 else f"ESCENARIOS_{n_sheets}")
+                    sheet.append(_cells(sheet, ["Escenario", "Año"] + names, font=bold))
+                    sheet_rows = 1
+                sheet.append([offset + i, year, *values])
+                sheet_rows += 1
+        offset += len(data)
+    wb.save(path)
+    return path
+
+
+def main(argv=None):
+    # python ferpa_export.py FERPA_Master_Model_CR.xlsx --t_dia 350 --capex 12e6
+    parser = argparse.ArgumentParser(description="Genera el libro maestro que lee bi_app a partir del modelo FERPA.")
+    parser.add_argument("out", nargs="?", default="FERPA_Master_Model_CR.xlsx")
+    for p in BATCH_PARAMS:
+        parser.add_argument(f"--{p}", type=float, default=DEFAULT_PARAMS[p])
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--discount-rate", type=float, default=0.12)
+    parser.add_argument("--config", default=None, help="configuración JSON/YAML del modelo")
+    args = parser.parse_args(argv)
+
+    params = {p: getattr(args, p) for p in BATCH_PARAMS}
+    plan = compile_config(args.config) if args.config else None
+    sim = SimuladorFerpaV5(**params, interest_rate=0.0, roi_target=None, plan=plan)
+    res = sim.run_simulation(years=args.years, discount_rate=args.discount_rate)
+    export_simulation(args.out, res, params=params, plan=plan)
+    print(f"{args.out}: {args.years} años, TIR {res['metrics']['irr']:.1%}, VAN ${res['metrics']['npv']:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
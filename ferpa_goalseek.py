@@ -0,0 +1,106 @@
+import numpy as np
+
+from ferpa_logic import BATCH_PARAMS, COLUMNAS, run_batch
+
+
+def payback_years(res):
+    """Fractional project payback: years until -CAPEX + cumulative Flujo_Operativo turns >= 0 (inf if never)."""
+    op = res["data"][:, :, COLUMNAS.index("Flujo_Operativo")]
+    flows = np.concatenate([-res["metrics"]["capex"][:, None], op], axis=1)
+    cum = np.cumsum(flows, axis=1)
+    reached = cum >= 0
+    k = np.argmax(reached, axis=1)
+    rows = np.arange(len(k))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frac = -cum[rows, k - 1] / flows[rows, k]
+    out = np.where(k == 0, 0.0, (k - 1) + frac)
+    return np.where(reached.any(axis=1), out, np.inf)
+
+
+METRICS = {
+    "irr": lambda res: res["metrics"]["irr"],
+    "npv": lambda res: res["metrics"]["npv"],
+    "payback": payback_years,
+    "caja_min": lambda res: res["data"][:, :, COLUMNAS.index("Caja_Ferpa")].min(axis=1),
+}
+
+
+def goal_seek(base, param, metric, target, bounds, x0=None, points=16, xtol=1e-10, maxiter=50,
+              years=10, discount_rate=0.12, plan=None, interest_rate=0.0, debt=None):
+    """Find the value of `param` in `bounds` where METRICS[metric] equals `target`.
+
+    Vectorized multisection: every iteration evaluates `points` candidates of the current
+    bracket in one run_batch call and keeps the first sub-interval with a sign change,
+    shrinking the bracket by (points - 1) per call. With a warm start `x0` (e.g. the
+    previous solution) the search begins on a ±5% bracket around it and only widens to
+    `bounds` if the root is not there. The answer is refined by one regula falsi step.
+
+    Typical uses: minimum p_base_bloque for irr = X, minimum t_dia for npv = 0, maximum
+    capex for payback = roi_target. `interest_rate` and `debt` (ferpa_debt) give the
+    financing of every candidate. Returns a dict with "value", "achieved", "residual",
+    "iterations", "evaluations", "converged" and the final "bracket".
+    """
+    if param not in BATCH_PARAMS:
+        raise ValueError(f"Parámetro sin efecto en el modelo: {param}")
+    if metric not in METRICS:
+        raise ValueError(f"Métrica desconocida: {metric} (opciones: {list(METRICS)})")
+    inputs = {p: float(base[p]) for p in BATCH_PARAMS}
+    evaluations = 0
+
+    def residual(xs):
+        nonlocal evaluations
+        evaluations += len(xs)
+        res = run_batch(**{**inputs, param: xs}, years=years, discount_rate=discount_rate, plan=plan,
+                        interest_rate=interest_rate, debt=debt)
+        return METRICS[metric](res) - target
+
+    def first_crossing(xs, g):
+        exact = np.flatnonzero(g == 0)
+        if len(exact):
+            return xs[exact[0]], xs[exact[0]]
+        change = np.flatnonzero(np.sign(g[:-1]) * np.sign(g[1:]) < 0)
+        if not len(change):
+            return None
+        return xs[change[0]], xs[change[0] + 1]
+
+    lo, hi = float(bounds[0]), float(bounds[1])
+    bracket = None
+    iterations = 0
+    if x0 is not None and lo < x0 < hi:
+        xs = np.linspace(max(lo, x0 * 0.95), min(hi, x0 * 1.05), points)
+        bracket = first_crossing(xs, residual(xs))
+        iterations += 1
+    if bracket is None:
+        xs = np.linspace(lo, hi, points)
+        bracket = first_crossing(xs, residual(xs))
+        iterations += 1
+    if bracket is None:
+        return {"value": np.nan, "achieved": np.nan, "residual": np.nan, "iterations": iterations,
+                "evaluations": evaluations, "converged": False, "bracket": (lo, hi)}
+
+    lo, hi = bracket
+    while hi - lo > xtol * max(1.0, abs(hi)) and iterations < maxiter:
+        xs = np.linspace(lo, hi, points)
+        g = residual(xs)
+        iterations += 1
+        # A crossing can only vanish through NaN/inf residuals; keep the current bracket then
+        bracket = first_crossing(xs, g)
+        if bracket is None:
+            break
+        lo, hi = bracket
+
+    g_lo, g_hi = residual(np.array([lo, hi]))
+    if lo != hi and np.isfinite(g_lo) and np.isfinite(g_hi) and g_lo != g_hi:
+        value = lo - g_lo * (hi - lo) / (g_hi - g_lo)
+    else:
+        value = 0.5 * (lo + hi)
+    achieved = residual(np.array([value]))[0]
+    return {
+        "value": value,
+        "achieved": achieved + target,
+        "residual": achieved,
+        "iterations": iterations,
+        "evaluations": evaluations,
+        "converged": hi - lo <= xtol * max(1.0, abs(hi)),
+        "bracket": (lo, hi)
+    }
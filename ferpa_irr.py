@@ -0,0 +1,246 @@
+import numpy as np
+
+from ferpa_startup import lazy
+
+# Only the fallback paths call numpy_financial: import it when one is first taken
+npf = lazy("numpy_financial")
+
+
+def npv(rate, flows):
+    """NPV of every row of `flows` (scenarios x periods, period 0 undiscounted).
+
+    `rate` broadcasts against the row axis: a scalar, one rate per row (S,), or a
+    column of rates (R, 1) to price every row at every rate -> (R, S).
+    Matches npf.npv for a scalar rate and a single row.
+    """
+    flows = np.asarray(flows, dtype=float)
+    rate = np.asarray(rate, dtype=float)
+    return (flows / (1 + rate[..., None]) ** np.arange(flows.shape[-1])).sum(axis=-1)
+
+
+def sign_changes(flows):
+    """Number of sign changes per row, zeros skipped."""
+    flows = np.atleast_2d(np.asarray(flows, dtype=float))
+    s = np.sign(flows)
+    # Forward-fill zeros with the last non-zero sign of the row
+    idx = np.where(s != 0, np.arange(flows.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    filled = np.take_along_axis(s, idx, axis=1)
+    return (filled[:, 1:] * filled[:, :-1] < 0).sum(axis=1)
+
+
+def _horner(v, x):
+    # p(x) = sum_t v_t x^t and p'(x), one polynomial per row
+    p = v[:, -1].copy()
+    dp = np.zeros_like(x)
+    for t in range(v.shape[1] - 2, -1, -1):
+        dp = dp * x + p
+        p = p * x + v[:, t]
+    return p, dp
+
+
+def _solve_irr_row(v, guess, tol, maxiter):
+    # solve_irr for one row on Python floats: same operations in the same order (so the
+    # same bits), without the per-call numpy overhead that dominates a single series.
+    # tests/test_irr.py checks it against the vectorized path row by row
+    signs = [(f > 0) - (f < 0) for f in v if f != 0]
+    changes = sum(a != b for a, b in zip(signs, signs[1:]))
+    if changes != 1 or v[0] == 0:
+        if changes == 0:
+            return np.nan, False, changes
+        rate = float(npf.irr(v))
+        return rate, not np.isnan(rate), changes
+
+    def horner(x):
+        p, dp = v[-1], 0.0
+        for c in v[-2::-1]:
+            dp = dp * x + p
+            p = p * x + c
+        return p, dp
+
+    def sign(p):
+        return (p > 0) - (p < 0)
+
+    sign0 = sign(v[0])
+    lo, hi = 0.0, 1.0
+    for _ in range(64):
+        if sign(horner(hi)[0]) != sign0:
+            break
+        lo = hi
+        hi *= 2
+    x = 1 / (1 + guess)
+    if x <= lo or x >= hi:
+        x = 0.5 * (lo + hi)
+    converged = False
+    for _ in range(maxiter):
+        p, dp = horner(x)
+        if sign(p) == sign0:
+            lo = x
+        else:
+            hi = x
+        xn = x - p / dp if dp != 0 else np.nan
+        if not lo < xn < hi:
+            xn = 0.5 * (lo + hi)
+        if p == 0:
+            converged = True
+            break
+        done = abs(xn - x) <= tol * x
+        x = xn
+        if done:
+            converged = True
+            break
+    return 1 / x - 1, converged, changes
+
+
+def solve_irr(flows, guess=0.1, tol=1e-13, maxiter=100):
+    """IRR for every row of `flows` with a vectorized safeguarded Newton/bisection.
+
+    Works on x = 1 / (1 + r), where NPV is a polynomial. Rows with exactly one sign
+    change and a non-zero first flow have a single positive root: it is bracketed and
+    solved with Newton steps that fall back to bisection whenever they leave the
+    bracket. Other rows (several sign changes, leading zeros) deliberately keep npf.irr
+    semantics, one row at a time: they may have several roots and npf.irr picks the one
+    closest to zero, which a bracketing search would not reproduce. A single row runs
+    the same solver on Python floats (same result, less overhead).
+
+    Returns a dict with "irr" (NaN where there is no root; the last iterate where
+    Newton did not converge), "converged" and "sign_changes".
+    """
+    flows = np.atleast_2d(np.asarray(flows, dtype=float))
+    n = flows.shape[0]
+    if n == 1:
+        rate, converged, changes = _solve_irr_row(flows[0].tolist(), guess, tol, maxiter)
+        return {"irr": np.array([rate]), "converged": np.array([converged]), "sign_changes": np.array([changes])}
+    changes = sign_changes(flows)
+    rate = np.full(n, np.nan)
+    converged = np.zeros(n, dtype=bool)
+
+    simple = (changes == 1) & (flows[:, 0] != 0)
+    rows = np.flatnonzero(simple)
+    if len(rows):
+        v = flows[rows]
+        sign0 = np.sign(v[:, 0])
+        lo = np.zeros(len(rows))
+        hi = np.ones(len(rows))
+        # Grow the bracket until p(hi) has the opposite sign of p(0) = v_0
+        for _ in range(64):
+            grow = np.sign(_horner(v, hi)[0]) == sign0
+            if not grow.any():
+                break
+            lo[grow] = hi[grow]
+            hi[grow] *= 2
+
+        x = np.full(len(rows), 1 / (1 + guess))
+        outside = (x <= lo) | (x >= hi)
+        x[outside] = 0.5 * (lo[outside] + hi[outside])
+        active = np.arange(len(rows))
+        for _ in range(maxiter):
+            xa, la, ha = x[active], lo[active], hi[active]
+            p, dp = _horner(v[active], xa)
+            same = np.sign(p) == sign0[active]
+            la = np.where(same, xa, la)
+            ha = np.where(same, ha, xa)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                xn = xa - p / dp
+            bisect = ~((xn > la) & (xn < ha))
+            xn[bisect] = 0.5 * (la[bisect] + ha[bisect])
+            done = (np.abs(xn - xa) <= tol * xa) | (p == 0)
+            x[active], lo[active], hi[active] = np.where(p == 0, xa, xn), la, ha
+            converged[rows[active[done]]] = True
+            active = active[~done]
+            if not len(active):
+                break
+        rate[rows] = 1 / x - 1
+
+    for i in np.flatnonzero(~simple & (changes > 0)):
+        rate[i] = npf.irr(flows[i])
+        converged[i] = not np.isnan(rate[i])
+
+    return {"irr": rate, "converged": converged, "sign_changes": changes}
+
+
+def year_fractions(times):
+    """Times of the flows in years from the first one (last axis): datetime64 / date values (actual/365) or numbers (years)."""
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64) or times.dtype == object:
+        days = times.astype("datetime64[D]").astype(np.int64)
+        return (days - days[..., :1]) / 365.0
+    times = times.astype(float)
+    return times - times[..., :1]
+
+
+def xnpv(rate, flows, times):
+    """NPV of irregularly timed flows (columns at `times`, see year_fractions); `rate` broadcasts like npv(), `times` may be per row."""
+    flows = np.asarray(flows, dtype=float)
+    rate = np.asarray(rate, dtype=float)
+    return (flows / (1 + rate[..., None]) ** year_fractions(times)).sum(axis=-1)
+
+
+# log(1 + r) scan points of xirr, dense around usual project returns
+XIRR_GRID = np.log1p([-0.999999, -0.99, -0.9, -0.75, -0.5, -0.3, -0.2, -0.1, -0.05, 0.0, 0.05, 0.1, 0.15, 0.2,
+                      0.3, 0.4, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 100.0, 1e4])
+
+
+def xirr(flows, times, tol=1e-12, maxiter=100):
+    """Annual effective IRR of every row of irregularly timed flows (Excel XIRR).
+
+    Solved in u = log(1 + r), where NPV(u) = sum c_t exp(-u t) is a sum of exponentials
+    evaluated in one vector operation per row set, so hundreds of periods (e.g. 30 years of
+    monthly flows, times = arange(361) / 12) cost the same number of iterations as ten.
+    `times` is shared by every row (1-D) or given per row (same shape as `flows`).
+    The root is bracketed on XIRR_GRID (-99.9999% to 1,000,000%) in one shot and refined
+    with Newton steps that fall back to bisection, as in solve_irr; with several sign
+    changes the lowest root is returned. Returns "irr" (NaN where flows do not change sign or no root is found) and
+    "converged", as solve_irr.
+    """
+    flows = np.atleast_2d(np.asarray(flows, dtype=float))
+    n = flows.shape[0]
+    t = np.broadcast_to(year_fractions(times), flows.shape)
+    rate = np.full(n, np.nan)
+    converged = np.zeros(n, dtype=bool)
+    rows = np.flatnonzero((flows > 0).any(axis=1) & (flows < 0).any(axis=1))
+    if not len(rows):
+        return {"irr": rate, "converged": converged}
+
+    c, t = flows[rows], t[rows]
+    # For u -> +inf NPV takes the sign of the first non-zero flow
+    sign0 = np.sign(c[np.arange(len(rows)), np.argmax(c != 0, axis=1)])
+
+    def f(u, c=c, t=t):
+        e = c * np.exp(-u[:, None] * t)
+        return e.sum(axis=1), -(e * t).sum(axis=1)
+
+    # One-shot scan of NPV on a fixed rate grid: the first point where NPV has taken
+    # sign0 closes the bracket, Newton starts from the secant between its ends
+    g = (c[:, None, :] * np.exp(-XIRR_GRID[:, None] * t[:, None, :])).sum(axis=2)
+    past = np.sign(g) == sign0[:, None]
+    k = np.argmax(past, axis=1)
+    r = np.arange(len(rows))
+    bracketed = (k > 0) & past[r, k]
+    k = np.maximum(k, 1)
+    lo, hi = XIRR_GRID[k - 1], XIRR_GRID[k]
+    g_lo, g_hi = g[r, k - 1], g[r, k]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u = lo - g_lo * (hi - lo) / (g_hi - g_lo)
+    outside = ~((u > lo) & (u < hi))
+    u[outside] = 0.5 * (lo[outside] + hi[outside])
+    active = np.flatnonzero(bracketed)
+    for _ in range(maxiter):
+        ua, la, ha = u[active], lo[active], hi[active]
+        p, dp = f(ua, c[active], t[active])
+        same = np.sign(p) == sign0[active]
+        # NPV falls towards sign0 as u grows: same sign -> root is below u
+        ha = np.where(same, ua, ha)
+        la = np.where(same, la, ua)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            un = ua - p / dp
+        bisect = ~((un > la) & (un < ha))
+        un[bisect] = 0.5 * (la[bisect] + ha[bisect])
+        done = (np.abs(un - ua) <= tol * np.maximum(1.0, np.abs(ua))) | (p == 0)
+        u[active], lo[active], hi[active] = np.where(p == 0, ua, un), la, ha
+        converged[rows[active[done]]] = True
+        active = active[~done]
+        if not len(active):
+            break
+    rate[rows[bracketed]] = np.expm1(u[bracketed])
+    return {"irr": rate, "converged": converged}
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+
+class KPICube:
+    """Dense (Categoría, Sub-Categoría, Año) cube built from the long DATA_POWERBI table.
+
+    Built with a single pass over the long table (duplicates are summed); every lookup
+    afterwards is a dict hit plus an array slice. Series come back aligned to `years`,
+    with NaN where a subcategory has no row for a year, so ratios between KPIs can no
+    longer be shifted by missing or reordered rows.
+    """
+
+    def __init__(self, df, cat_col="Categoría", sub_col="Sub-Categoría", year_col="Año", value_col="Valor"):
+        cat_codes, self.categories = pd.factorize(df[cat_col], sort=True)
+        sub_codes, self.subcategories = pd.factorize(df[sub_col], sort=False)
+        year_codes, years = pd.factorize(df[year_col], sort=True)
+        self.years = np.asarray(years)
+        self.cat_index = {c: i for i, c in enumerate(self.categories)}
+        self.sub_index = {s: i for i, s in enumerate(self.subcategories)}
+
+        shape = (len(self.categories), len(self.subcategories), len(self.years))
+        values = np.zeros(shape)
+        present = np.zeros(shape, dtype=bool)
+        ok = (cat_codes >= 0) & (sub_codes >= 0) & (year_codes >= 0)
+        idx = (cat_codes[ok], sub_codes[ok], year_codes[ok])
+        np.add.at(values, idx, pd.to_numeric(df[value_col], errors="coerce").to_numpy(dtype=float)[ok])
+        present[idx] = True
+        self.values = np.where(present, values, np.nan)
+        # Subcategories of each category, in order of first appearance
+        self.subs_of = {c: [s for s in self.subcategories if present[i, self.sub_index[s]].any()]
+                        for c, i in self.cat_index.items()}
+
+    def series(self, cat, sub):
+        """Yearly values of one KPI aligned to self.years (all NaN if unknown)."""
+        i, j = self.cat_index.get(cat), self.sub_index.get(sub)
+        if i is None or j is None:
+            return np.full(len(self.years), np.nan)
+        return self.values[i, j]
+
+    def total(self, cat, sub):
+        return np.nansum(self.series(cat, sub))
+
+    def category_total(self, cat):
+        """Yearly sum over every subcategory of `cat`."""
+        i = self.cat_index.get(cat)
+        if i is None:
+            return np.full(len(self.years), np.nan)
+        block = self.values[i]
+        return np.where(np.isnan(block).all(axis=0), np.nan, np.nansum(block, axis=0))
+
+    def sub_totals(self, cat):
+        """Sum over years per subcategory of `cat` -> DataFrame(Sub-Categoría, Valor), sorted by name."""
+        subs = sorted(self.subs_of.get(cat, []))
+        return pd.DataFrame({"Sub-Categoría": subs, "Valor": [self.total(cat, s) for s in subs]})
+
+    def frame(self, cat, subs=None, value="Valor"):
+        """Long (Año, Sub-Categoría, value) frame for plotly, like the old boolean-mask slices."""
+        subs = self.subs_of.get(cat, []) if subs is None else ([subs] if isinstance(subs, str) else subs)
+        parts = [pd.DataFrame({"Año": self.years, "Sub-Categoría": s, value: self.series(cat, s)}) for s in subs]
+        if not parts:
+            return pd.DataFrame(columns=["Año", "Sub-Categoría", value])
+        out = pd.concat(parts, ignore_index=True).dropna(subset=[value])
+        return out.sort_values("Año", kind="stable", ignore_index=True)
+
+    def yearly(self, name, values):
+        """Wrap a year-aligned array into the (Año, name) frame the plot helpers expect."""
+        return pd.DataFrame({"Año": self.years, name: values})
@@ -1,10 +1,24 @@
 
 import numpy as np
 import pandas as pd
-import numpy_financial as npf
+from ferpa_config import DEFAULT_PLAN, compile_config
+from ferpa_debt import compile_debt, debt_scenarios, levered_waterfall
+from ferpa_irr import npv as npv_rows, solve_irr, xirr, xnpv, year_fractions
+from ferpa_profile import span
 
 class SimuladorFerpaV5:
-    def __init__(self, t_dia, p_base_bloque, p_tipping, p_recic, p_bono_co2, p_bono_agua, capex, interest_rate, tax_rate, inflation, roi_target):
+    # Production Specs (class level so the batch engine can share them)
+    dias_anuales = 365
+    pct_reciclable = 0.13
+    pct_transformacion = 0.87
+    factor_expansion = 1.4 # Masa expands due to additives/chemicals/water to achieve ~26M units
+    unidades_por_ton_masa = 380 # Base calculation factor
+    
+    # Product mix, cost structure, environmental factors and waterfall rules come from a
+    # ModelPlan (ferpa_config): a config dict, a config path or None for ferpa_config.json.
+    # `debt` is a financing structure (see ferpa_debt.compile_debt); interest_rate is the
+    # rate of tranches that do not set their own
+    def __init__(self, t_dia, p_base_bloque, p_tipping, p_recic, p_bono_co2, p_bono_agua, capex, interest_rate, tax_rate, inflation, roi_target, plan=None, debt=None):
         self.t_dia = t_dia
         self.p_base_bloque = p_base_bloque
         self.p_tipping = p_tipping
@@ -12,26 +26,24 @@ class SimuladorFerpaV5:
         self.p_bono_co2 = p_bono_co2
         self.p_bono_agua = p_bono_agua
         self.capex = capex
+        self.interest_rate = interest_rate
+        self.debt = debt
         self.tax_rate = tax_rate
         self.inflation = inflation
         self.roi_target = roi_target
+        self.plan = DEFAULT_PLAN if plan is None else compile_config(plan)
         
-        # Production Specs
-        self.dias_anuales = 365
-        self.pct_reciclable = 0.13
-        self.pct_transformacion = 0.87
-        self.factor_expansion = 1.4 # Masa expands due to additives/chemicals/water to achieve ~26M units
-        self.unidades_por_ton_masa = 380 # Base calculation factor
-        
-        # Product Mix: [Share, PriceFactor, Name]
-        self.mix = [
-            {"name": "Bloque #5", "share": 0.70, "factor": 1.0},
-            {"name": "Adoquín Pesado", "share": 0.20, "factor": 1.3},
-            {"name": "Ladrillo Decorativo", "share": 0.10, "factor": 1.6}
-        ]
-        
-    def run_simulation(self, years=10):
+    def run_simulation(self, years=10, discount_rate=0.12, start_year=2025):
+        if self.debt is not None:
+            # Levered runs go through the batch engine as a single scenario
+            return batch_result(run_batch(**{p: getattr(self, p) for p in BATCH_PARAMS}, interest_rate=self.interest_rate,
+                                          years=years, discount_rate=discount_rate, start_year=start_year,
+                                          plan=self.plan, debt=self.debt), 0)
+        plan = self.plan
+        # One tuple of floats per year, in BASE_COLUMNAS order; the SKU detail is filled
+        # for all years at once after the loop
         rows = []
+        inf_indices = []
         
         # 1. PHYSICAL CALCULATIONS
         ton_input_anual = self.t_dia * self.dias_anuales
@@ -42,30 +54,25 @@ class SimuladorFerpaV5:
         total_units = ton_masa_expandida * self.unidades_por_ton_masa
         
         # Environment
-        co2_total = ton_input_anual * 1.5 
-        lix_total = ton_input_anual * 0.4
+        co2_total = ton_input_anual * plan.co2_per_ton
+        lix_total = ton_input_anual * plan.lix_per_ton
         
-        # Investment Return Schedule
-        # Rule: 50% of CAPEX returned in Y1 and Y2 respectively
-        retorno_programado = {1: self.capex * 0.5, 2: self.capex * 0.5}
+        # Investment Return Schedule (fraction of CAPEX returned in each of the first years)
+        retorno_programado = {i + 1: self.capex * frac for i, frac in enumerate(plan.capital_return.tolist())}
         
         saldo_inversion = self.capex
         
+        # Weighted Price of the blocks mix (precompiled in the plan)
+        w_price = plan.weighted_factor * self.p_base_bloque
+        
         for i in range(1, years + 1):
             inf_index = (1 + self.inflation) ** (i - 1)
+            inf_indices.append(inf_index)
             
             # --- REVENUES ---
             # 1. Blocks Mix
-            # Weighted Price Calculation
-            w_price = sum([m["share"] * m["factor"] for m in self.mix]) * self.p_base_bloque
             rev_bloques_mix = total_units * w_price * inf_index
             
-            # Segmented Revenues for Sunburst
-            rev_mix_detail = {
-                m["name"]: total_units * m["share"] * (self.p_base_bloque * m["factor"] * inf_index)
-                for m in self.mix
-            }
-            
             # 2. Recyclables
             rev_recic = ton_reciclable * self.p_recic * inf_index
             
@@ -77,12 +84,12 @@ class SimuladorFerpaV5:
             
             total_revenue = rev_bloques_mix + rev_recic + rev_tip + rev_green
             
-            # --- OPEX (RULE 45% of BLOCK SALES) ---
-            opex_target = rev_bloques_mix * 0.45
+            # --- OPEX (RULE % of BLOCK SALES) ---
+            opex_target = rev_bloques_mix * plan.opex_pct
             
             # Breakdown
-            cost_energy = 500000 * inf_index # Fixed
-            cost_payroll = 1500000 * inf_index # Approx fixed admin/ops structure
+            cost_energy = plan.fixed_costs["Cost_Energy"] * inf_index # Fixed
+            cost_payroll = plan.fixed_costs["Cost_Payroll"] * inf_index # Approx fixed admin/ops structure
             cost_variable = opex_target - cost_energy - cost_payroll
             if cost_variable < 0: cost_variable = 0
             
@@ -90,7 +97,7 @@ class SimuladorFerpaV5:
             
             # --- PROFITABILITY ---
             ebitda = total_revenue - opex_real
-            deprec = self.capex / 10 # SL 10y
+            deprec = self.capex / plan.depreciation_years # Straight line
             ebit = ebitda - deprec
             taxes = max(0, ebit * self.tax_rate)
             net_income = ebit - taxes
@@ -106,10 +113,10 @@ class SimuladorFerpaV5:
             # Check availability
             remanente_post_retorno = op_cash - payment_return
             
-            # 3. Dividend (30% of Remainder)
+            # 3. Dividend (share of Remainder)
             dividend = 0
             if remanente_post_retorno > 0:
-                dividend = remanente_post_retorno * 0.30
+                dividend = remanente_post_retorno * plan.dividend_pct
                 
             # 4. Project Cash (Retained)
             project_cash = remanente_post_retorno - dividend
@@ -119,44 +126,579 @@ class SimuladorFerpaV5:
             if saldo_inversion < 0: saldo_inversion = 0
             
             # Append Data
-            rows.append({
-                "Año": 2024 + i,
-                "Ingresos": total_revenue,
-                "Rev_Bloques": rev_bloques_mix,
-                "Rev_Recic": rev_recic,
-                "Rev_Tipping": rev_tip,
-                "Rev_Bonos": rev_green,
-                "OPEX_Total": opex_real,
-                "Cost_Energy": cost_energy,
-                "Cost_Payroll": cost_payroll,
-                "Cost_Variable": cost_variable,
-                "EBITDA": ebitda,
-                "Deprec": deprec,
-                "Impuestos": taxes,
-                "Utilidad_Neta": net_income,
-                "Flujo_Operativo": op_cash,
-                "Pago_Retorno_Capital": payment_return,
-                "Pago_Dividendos": dividend,
-                "Caja_Ferpa": project_cash,
-                "Saldo_Inversion": saldo_inversion,
-                "Flujo_Investor_Total": payment_return + dividend,
-                "Unidades_Total": total_units,
-                **rev_mix_detail # Unpack mix revenues
-            })
-            
-        df = pd.DataFrame(rows)
+            rows.append((
+                total_revenue, rev_bloques_mix, rev_recic, rev_tip, rev_green,
+                opex_real, cost_energy, cost_payroll, cost_variable,
+                ebitda, deprec, taxes, net_income, op_cash,
+                payment_return, dividend, project_cash, saldo_inversion,
+                payment_return + dividend, total_units
+            ))
+            
+        columns = plan_columns(plan)
+        values = np.empty((len(columns), years))
+        values[:len(BASE_COLUMNAS)] = np.array(rows, dtype=float).T
+        # Segmented Revenues for Sunburst: one row per SKU
+        np.multiply(total_units * plan.sku_share[:, None],
+                    self.p_base_bloque * plan.sku_factor[:, None] * np.array(inf_indices),
+                    out=values[len(BASE_COLUMNAS):])
         
         # Financial Metrics
-        flows = [-self.capex] + df["Flujo_Investor_Total"].tolist()
-        irr = npf.irr(flows) or 0.0
-        npv = npf.npv(0.12, flows)
-        
-        return {
-            "df": df,
-            "metrics": {
-                "irr": irr,
-                "npv": npv,
-                "total_prod": total_units,
-                "capex": self.capex
-            }
+        flows = [-self.capex] + values[COLUMNAS.index("Flujo_Investor_Total")].tolist()
+        irr = float(solve_irr(flows)["irr"][0]) or 0.0
+        npv = float(npv_rows(discount_rate, flows))
+        
+        return SimulationResult(start_year + np.arange(years), values, {
+            "irr": irr,
+            "npv": npv,
+            "total_prod": total_units,
+            "capex": self.capex
+        }, columns)
+        
+    def run_monthly(self, years=30, discount_rate=0.12, start_year=2025, ramp=None, seasonality=None,
+                    dso_days=0, dpo_days=0):
+        """Monthly-resolution run (12 * years steps) on array-backed state.
+
+        - ramp: utilization of the first operating months (sequence), or an int n for a
+          linear ramp 1/n, 2/n, ... up to full capacity. Fixed costs run at full rate.
+        - seasonality: 12 monthly factors of the tonnage received (normalized to mean 1,
+          so annual tonnage is unchanged).
+        - dso_days / dpo_days: collection lag of Ingresos and payment lag of OPEX_Total;
+          the change in working capital is taken out of operating cash before the waterfall.
+
+        Taxes and the plan's dividend share are settled per fiscal year (tax spread evenly
+        over its months, dividend paid in December); each year's fraction of the plan's
+        capital return schedule is paid in 12 monthly instalments. Without ramp,
+        seasonality and lags the annual summary reproduces run_simulation. Returns a
+        MonthlyResult: "monthly" (one row per month, indexed by Mes), "df" (annual summary
+        aggregated from the monthly arrays: COLUMNAS plus working-capital columns), both
+        built on first use, and "metrics" with the IRR of the monthly investor flows (annual
+        effective and monthly), XIRR on calendar dates and NPV at discount_rate.
+
+        Levered simulators are refused: the debt waterfall is yearly (run_simulation).
+        """
+        if self.debt is not None:
+            raise ValueError("El modo mensual no modela deuda: use run_simulation para escenarios apalancados")
+        plan = self.plan
+        n = 12 * years
+        monthly_columns = MONTHLY_COLUMNAS if plan is DEFAULT_PLAN else plan_columns(plan) + MONTHLY_EXTRA
+        out = np.empty((len(monthly_columns), n))
+        col = dict(zip(monthly_columns, out))
+        year = np.repeat(np.arange(years), 12)
+        
+        # 1. PHYSICAL CALCULATIONS (monthly tonnage)
+        util = col["Utilizacion"]
+        util[:] = 1.0
+        if ramp is not None:
+            ramp = np.arange(1, ramp + 1) / ramp if np.ndim(ramp) == 0 else np.asarray(ramp, dtype=float)
+            util[:len(ramp)] = ramp[:n]
+        season = np.ones(12) if seasonality is None else np.asarray(seasonality, dtype=float)
+        if season.shape != (12,):
+            raise ValueError("seasonality debe tener 12 factores mensuales")
+        ton_input = self.t_dia * self.dias_anuales / 12 * util * np.tile(season / season.mean(), years)
+        ton_reciclable = ton_input * self.pct_reciclable
+        total_units = ton_input * self.pct_transformacion * self.factor_expansion * self.unidades_por_ton_masa
+        co2_total = ton_input * plan.co2_per_ton
+        lix_total = ton_input * plan.lix_per_ton
+        inf_index = np.float_power(1 + self.inflation, year)
+        
+        # --- REVENUES ---
+        w_price = plan.weighted_factor * self.p_base_bloque
+        col["Rev_Bloques"][:] = total_units * w_price * inf_index
+        n_base = len(BASE_COLUMNAS)
+        np.multiply(total_units * plan.sku_share[:, None], self.p_base_bloque * plan.sku_factor[:, None] * inf_index,
+                    out=out[n_base:n_base + len(plan.sku_names)])
+        col["Rev_Recic"][:] = ton_reciclable * self.p_recic * inf_index
+        col["Rev_Tipping"][:] = ton_input * self.p_tipping * inf_index
+        col["Rev_Bonos"][:] = (co2_total * self.p_bono_co2 * inf_index) + (lix_total * self.p_bono_agua * inf_index)
+        col["Ingresos"][:] = col["Rev_Bloques"] + col["Rev_Recic"] + col["Rev_Tipping"] + col["Rev_Bonos"]
+        
+        # --- OPEX (RULE % of BLOCK SALES) ---
+        col["Cost_Energy"][:] = plan.fixed_costs["Cost_Energy"] / 12 * inf_index
+        col["Cost_Payroll"][:] = plan.fixed_costs["Cost_Payroll"] / 12 * inf_index
+        cost_variable = col["Rev_Bloques"] * plan.opex_pct - col["Cost_Energy"] - col["Cost_Payroll"]
+        col["Cost_Variable"][:] = np.maximum(cost_variable, 0.0)
+        col["OPEX_Total"][:] = col["Cost_Energy"] + col["Cost_Payroll"] + col["Cost_Variable"]
+        
+        # --- PROFITABILITY (income tax on the fiscal year's EBIT) ---
+        col["EBITDA"][:] = col["Ingresos"] - col["OPEX_Total"]
+        col["Deprec"][:] = self.capex / plan.depreciation_years / 12
+        ebit = col["EBITDA"] - col["Deprec"]
+        tax_year = np.maximum(ebit.reshape(years, 12).sum(axis=1) * self.tax_rate, 0.0)
+        col["Impuestos"][:] = np.repeat(tax_year / 12, 12)
+        col["Utilidad_Neta"][:] = ebit - col["Impuestos"]
+        col["Flujo_Operativo"][:] = col["Utilidad_Neta"] + col["Deprec"]
+        
+        # --- WORKING CAPITAL ---
+        cobros = _lag(col["Ingresos"], dso_days * 12 / self.dias_anuales)
+        pagos = _lag(col["OPEX_Total"], dpo_days * 12 / self.dias_anuales)
+        np.cumsum(col["Ingresos"] - cobros, out=col["Cuentas_por_Cobrar"])
+        np.cumsum(col["OPEX_Total"] - pagos, out=col["Cuentas_por_Pagar"])
+        col["Var_Capital_Trabajo"][:] = np.diff(col["Cuentas_por_Cobrar"] - col["Cuentas_por_Pagar"], prepend=0.0)
+        col["Flujo_Caja"][:] = col["Flujo_Operativo"] - col["Var_Capital_Trabajo"]
+        
+        # --- CASH FLOW DISIMBURSEMENT (WATERFALL) ---
+        payment_return = col["Pago_Retorno_Capital"]
+        payment_return[:] = 0.0
+        for k, frac in enumerate(plan.capital_return[:years].tolist()):
+            payment_return[12 * k:12 * k + 12] = self.capex * frac / 12
+        remanente = col["Flujo_Caja"] - payment_return
+        remanente_year = remanente.reshape(years, 12).sum(axis=1)
+        dividend = col["Pago_Dividendos"]
+        dividend[:] = 0.0
+        dividend[11::12] = np.where(remanente_year > 0, remanente_year * plan.dividend_pct, 0.0)
+        col["Caja_Ferpa"][:] = remanente - dividend
+        col["Saldo_Inversion"][:] = np.maximum(self.capex - np.cumsum(payment_return), 0.0)
+        col["Flujo_Investor_Total"][:] = payment_return + dividend
+        col["Unidades_Total"][:] = total_units
+        
+        # Financial Metrics: CAPEX on 1 January, monthly flows at month end
+        flows = np.concatenate([[-self.capex], col["Flujo_Investor_Total"]])
+        periods = np.arange(n + 1) / 12
+        dates = np.concatenate([[np.datetime64(f"{start_year}-01-01")],
+                                np.datetime64(f"{start_year}-02", "M") + np.arange(n) - np.timedelta64(1, "D")])
+        # IRR on the monthly periods and XIRR on calendar days, solved together
+        irr, x_irr = xirr(np.stack([flows, flows]), np.stack([periods, year_fractions(dates)]))["irr"]
+        return MonthlyResult(start_year, out, {
+            "irr": float(irr),
+            "irr_monthly": float(np.expm1(np.log1p(irr) / 12)),
+            "xirr": float(x_irr),
+            "npv": float(xnpv(discount_rate, flows, periods)),
+            "total_prod": float(total_units[-12:].sum()),
+            "capex": self.capex
+        }, monthly_columns)
+
+
+def _lag(x, months):
+    """Shift a monthly series `months` (fractional) later, linearly splitting between two months."""
+    if months <= 0:
+        return x.copy()
+    k = int(months)
+    frac = months - k
+    out = np.zeros_like(x)
+    if k < len(x):
+        out[k:] += (1 - frac) * x[:len(x) - k]
+    if k + 1 < len(x):
+        out[k + 1:] += frac * x[:len(x) - k - 1]
+    return out
+
+
+# --- BATCH ENGINE ---
+# Column order of the yearly metrics axis (same as run_simulation()["df"] minus "Año"):
+# the model columns, then one revenue column per SKU of the plan. Base columns keep
+# their position whatever the plan, so COLUMNAS.index() of them is always valid.
+BASE_COLUMNAS = [
+    "Ingresos", "Rev_Bloques", "Rev_Recic", "Rev_Tipping", "Rev_Bonos",
+    "OPEX_Total", "Cost_Energy", "Cost_Payroll", "Cost_Variable",
+    "EBITDA", "Deprec", "Impuestos", "Utilidad_Neta", "Flujo_Operativo",
+    "Pago_Retorno_Capital", "Pago_Dividendos", "Caja_Ferpa", "Saldo_Inversion",
+    "Flujo_Investor_Total", "Unidades_Total",
+]
+COLUMNAS = BASE_COLUMNAS + DEFAULT_PLAN.sku_names
+
+# Monthly mode (run_monthly): plan columns plus ramp-up and working-capital state
+MONTHLY_EXTRA = ["Utilizacion", "Cuentas_por_Cobrar", "Cuentas_por_Pagar", "Var_Capital_Trabajo", "Flujo_Caja"]
+MONTHLY_COLUMNAS = COLUMNAS + MONTHLY_EXTRA
+# Balances: the annual summary keeps their December value instead of the sum
+MONTHLY_STOCKS = ["Saldo_Inversion", "Cuentas_por_Cobrar", "Cuentas_por_Pagar"]
+# Built once: inferring a string Index per DataFrame is a visible share of a single run
+_COLUMNS_INDEX = pd.Index(COLUMNAS)
+_MONTHLY_INDEX = pd.Index(MONTHLY_COLUMNAS)
+_MONTHLY_DF_INDEX = pd.Index(["Año"] + MONTHLY_COLUMNAS)
+_COLUMN_POS = {c: i for i, c in enumerate(COLUMNAS)}
+
+
+def plan_columns(plan):
+    """Metric columns produced under `plan` (COLUMNAS for the default plan)."""
+    if plan is DEFAULT_PLAN:
+        return COLUMNAS
+    clash = sorted(set(plan.sku_names) & set(BASE_COLUMNAS + MONTHLY_EXTRA))
+    if clash:
+        raise ValueError(f"Nombres de SKU reservados por el modelo: {clash}")
+    return BASE_COLUMNAS + plan.sku_names
+
+BATCH_PARAMS = ["t_dia", "p_base_bloque", "p_tipping", "p_recic", "p_bono_co2", "p_bono_agua", "capex", "tax_rate", "inflation"]
+
+# Default sidebar values of app.py
+DEFAULT_PARAMS = {
+    "t_dia": 300, "p_base_bloque": 0.55, "p_tipping": 15.0, "p_recic": 120.0, "p_bono_co2": 15.0,
+    "p_bono_agua": 10.0, "capex": 10000000, "tax_rate": 0.30, "inflation": 0.03
+}
+
+# (min, max) of the app.py sidebar controls, in run_batch units
+SIDEBAR_RANGES = {
+    "t_dia": (100, 500),
+    "p_base_bloque": (0.35, 1.00),
+    "p_tipping": (5.0, 30.0),
+    "p_recic": (50.0, 300.0),
+    "p_bono_co2": (5.0, 50.0),
+    "p_bono_agua": (5.0, 30.0),
+    "capex": (5000000, 20000000),
+    "tax_rate": (0.0, 0.30),
+    "inflation": (0.0, 0.10),
+}
+
+
+# --- SIMULATION RESULT ---
+class SimulationResult:
+    """Result of run_simulation: one float64 row per metric column (metrics x years).
+
+    Columns are contiguous arrays, so `result["EBITDA"]` is a view and to_pandas() /
+    to_arrow() wrap them without copying. Indexing with "df" / "metrics" keeps the old
+    dict interface (`res["df"]["EBITDA"]`); the DataFrame is built on first use.
+    `columns` is COLUMNAS unless the run used a plan with other SKUs.
+    """
+    __slots__ = ("years", "values", "metrics", "columns", "_df")
+    
+    def __init__(self, years, values, metrics, columns=COLUMNAS):
+        self.years = years
+        self.values = values
+        self.metrics = metrics
+        self.columns = columns
+        self._df = None
+        
+    def __getitem__(self, key):
+        if key == "df":
+            return self.df
+        if key == "metrics":
+            return self.metrics
+        return self.values[_COLUMN_POS[key] if self.columns is COLUMNAS else self.columns.index(key)]
+    
+    def __len__(self):
+        return len(self.years)
+    
+    @property
+    def df(self):
+        if self._df is None:
+            self._df = self.to_pandas()
+        return self._df
+    
+    @property
+    def nbytes(self):
+        return self.years.nbytes + self.values.nbytes
+    
+    def to_pandas(self):
+        """DataFrame (Año + columns) sharing memory with `values`."""
+        index = _COLUMNS_INDEX if self.columns is COLUMNAS else pd.Index(self.columns)
+        df = pd.DataFrame(self.values.T, columns=index, copy=False)
+        df.insert(0, "Año", self.years)
+        return df
+    
+    def to_arrow(self):
+        """pyarrow Table (Año + columns); float columns are zero-copy views of `values`."""
+        import pyarrow as pa
+        return pa.table([self.years, *self.values], names=["Año"] + self.columns)
+
+
+class MonthlyResult:
+    """Result of run_monthly: one float64 row per monthly column (columns x months).
+
+    As with SimulationResult, `result["EBITDA"]` is the monthly row and "monthly" /
+    "df" / "metrics" keep the dict interface; both DataFrames are built on first use.
+    "df" is the annual summary: flows summed, balances at December, mean utilization.
+    """
+    __slots__ = ("start_year", "values", "metrics", "columns", "_df", "_monthly")
+    
+    def __init__(self, start_year, values, metrics, columns=MONTHLY_COLUMNAS):
+        self.start_year = start_year
+        self.values = values
+        self.metrics = metrics
+        self.columns = columns
+        self._df = None
+        self._monthly = None
+    
+    def __getitem__(self, key):
+        if key == "df":
+            return self.df
+        if key == "monthly":
+            return self.monthly
+        if key == "metrics":
+            return self.metrics
+        return self.values[self.columns.index(key)]
+    
+    def __len__(self):
+        return self.values.shape[1]
+    
+    def annual(self):
+        """(columns x years) summary of the monthly rows."""
+        by_year = self.values.reshape(len(self.columns), -1, 12)
+        annual = by_year.sum(axis=2)
+        stock = [self.columns.index(c) for c in MONTHLY_STOCKS]
+        annual[stock] = by_year[stock, :, -1]
+        annual[self.columns.index("Utilizacion")] = by_year[self.columns.index("Utilizacion")].mean(axis=1)
+        return annual
+    
+    @property
+    def df(self):
+        if self._df is None:
+            annual = self.annual()
+            # Año rides in the float block and is swapped for ints: DataFrame.insert
+            # re-validates the column index and costs more than the rest of the frame
+            index = _MONTHLY_DF_INDEX if self.columns is MONTHLY_COLUMNAS else pd.Index(["Año"] + self.columns)
+            self._df = pd.DataFrame(np.vstack([np.zeros(annual.shape[1]), annual]).T, columns=index, copy=False)
+            self._df.isetitem(0, self.start_year + np.arange(annual.shape[1]))
+        return self._df
+    
+    @property
+    def monthly(self):
+        if self._monthly is None:
+            index = _MONTHLY_INDEX if self.columns is MONTHLY_COLUMNAS else pd.Index(self.columns)
+            months = pd.period_range(f"{self.start_year}-01", periods=len(self), freq="M", name="Mes")
+            self._monthly = pd.DataFrame(self.values.T, columns=index, index=months)
+        return self._monthly
+
+
+# --- MODEL STAGES ---
+# run_batch as an explicit dependency graph. Every stage reads its own parameters (S x 1
+# arrays in `p`), the context values and columns of the stages in "deps", and writes its
+# "columns" into `col` plus its "context" values into `ctx`. ferpa_stages memoizes each
+# stage on its parameters and the keys of its dependencies.
+
+def _stage_physical(p, ctx, col):
+    # 1. PHYSICAL CALCULATIONS (depend on t_dia only)
+    sim = SimuladorFerpaV5
+    ton_input_anual = p["t_dia"] * sim.dias_anuales
+    if p["utilization"] is not None:
+        ton_input_anual = ton_input_anual * np.broadcast_to(p["utilization"], (p["n"], p["years"]))
+    ton_masa_base = ton_input_anual * sim.pct_transformacion
+    ton_masa_expandida = ton_masa_base * sim.factor_expansion
+    ctx["ton_input_anual"] = ton_input_anual
+    ctx["ton_reciclable"] = ton_input_anual * sim.pct_reciclable
+    ctx["total_units"] = ton_masa_expandida * sim.unidades_por_ton_masa
+    ctx["co2_total"] = ton_input_anual * p["plan"].co2_per_ton
+    ctx["lix_total"] = ton_input_anual * p["plan"].lix_per_ton
+    col["Unidades_Total"][:] = ctx["total_units"]
+
+
+def _stage_revenue(p, ctx, col):
+    # float_power calls libm pow like the scalar `**`; the SIMD `**` loop can differ by 1 ulp
+    exponent = np.arange(p["years"]) if p["inflation_offset"] is None else p["inflation_offset"] + np.arange(p["years"])
+    inf_index = ctx["inf_index"] = np.float_power(1 + p["inflation"], exponent)
+    plan, p_base_bloque, total_units = p["plan"], p["p_base_bloque"], ctx["total_units"]
+    w_price = plan.weighted_factor * p_base_bloque
+    np.multiply(total_units * w_price, inf_index, out=col["Rev_Bloques"])
+    # All SKUs in one (SKUs x S x years) product
+    share, factor = plan.sku_share[:, None, None], plan.sku_factor[:, None, None]
+    np.multiply(total_units * share, p_base_bloque * factor * inf_index, out=col[SKU_BLOCK])
+    np.multiply(ctx["ton_reciclable"] * p["p_recic"], inf_index, out=col["Rev_Recic"])
+    np.multiply(ctx["ton_input_anual"] * p["p_tipping"], inf_index, out=col["Rev_Tipping"])
+    col["Rev_Bonos"][:] = (ctx["co2_total"] * p["p_bono_co2"] * inf_index) + (ctx["lix_total"] * p["p_bono_agua"] * inf_index)
+    col["Ingresos"][:] = col["Rev_Bloques"] + col["Rev_Recic"] + col["Rev_Tipping"] + col["Rev_Bonos"]
+
+
+def _stage_opex(p, ctx, col):
+    # RULE: share of BLOCK SALES, floored by the fixed cost lines
+    plan = p["plan"]
+    opex_target = col["Rev_Bloques"] * plan.opex_pct
+    col["Cost_Energy"][:] = plan.fixed_costs["Cost_Energy"] * ctx["inf_index"]
+    col["Cost_Payroll"][:] = plan.fixed_costs["Cost_Payroll"] * ctx["inf_index"]
+    cost_variable = opex_target - col["Cost_Energy"] - col["Cost_Payroll"]
+    col["Cost_Variable"][:] = np.where(cost_variable < 0, 0.0, cost_variable)
+    col["OPEX_Total"][:] = col["Cost_Energy"] + col["Cost_Payroll"] + col["Cost_Variable"]
+
+
+def _stage_profitability(p, ctx, col):
+    col["EBITDA"][:] = col["Ingresos"] - col["OPEX_Total"]
+    col["Deprec"][:] = p["capex"] / p["plan"].depreciation_years
+
+
+def _stage_waterfall(p, ctx, col):
+    # Taxes live here: with debt, deductible interest depends on the balance left by
+    # the previous year's sweep, so the levered waterfall runs year by year
+    terms = p["debt"]
+    equity = p["capex"] if terms is None else p["capex"] - terms["amount"].sum(axis=1)[:, None]
+    ctx["equity"] = equity[:, 0]
+    # Fraction of the equity returned in each of the first years (the plan's, or one
+    # schedule per scenario)
+    schedule = p["plan"].capital_return if p["capital_return"] is None else p["capital_return"]
+    schedule = schedule[..., :p["years"]]
+    payment_return = col["Pago_Retorno_Capital"]
+    payment_return[:] = 0.0
+    payment_return[:, :schedule.shape[-1]] = equity * schedule
+    if terms is not None:
+        flows, ctx["financing"] = levered_waterfall(terms, col["EBITDA"], col["Deprec"], p["tax_rate"], payment_return,
+                                                    p["plan"].dividend_pct)
+        for c, values in flows.items():
+            col[c][:] = values
+    else:
+        ctx["financing"] = None
+        ebit = col["EBITDA"] - col["Deprec"]
+        col["Impuestos"][:] = np.maximum(ebit * p["tax_rate"], 0.0)
+        col["Utilidad_Neta"][:] = ebit - col["Impuestos"]
+        col["Flujo_Operativo"][:] = col["Utilidad_Neta"] + col["Deprec"]
+        remanente_post_retorno = col["Flujo_Operativo"] - payment_return
+        col["Pago_Dividendos"][:] = np.where(remanente_post_retorno > 0, remanente_post_retorno * p["plan"].dividend_pct, 0.0)
+        col["Caja_Ferpa"][:] = remanente_post_retorno - col["Pago_Dividendos"]
+    
+    # Investor balance is clamped year by year, exactly as the scalar loop does
+    saldo_inversion = ctx["equity"].copy()
+    for j in range(p["years"]):
+        saldo_inversion -= payment_return[:, j]
+        saldo_inversion[saldo_inversion < 0] = 0
+        col["Saldo_Inversion"][:, j] = saldo_inversion
+    col["Flujo_Investor_Total"][:] = payment_return + col["Pago_Dividendos"]
+
+
+def _stage_metrics(p, ctx, col):
+    flows = ctx["flows"] = np.empty((p["n"], p["years"] + 1))
+    # The investor funds the CAPEX not covered by debt
+    flows[:, 0] = -ctx["equity"]
+    flows[:, 1:] = col["Flujo_Investor_Total"]
+    irr_sol = solve_irr(flows)
+    ctx["irr"], ctx["irr_converged"] = irr_sol["irr"], irr_sol["converged"]
+    ctx["npv"] = npv_rows(np.broadcast_to(p["discount_rate"], (p["n"],)), flows)
+
+
+# Topological order; "params" are the inputs a stage reads directly ("years", "n" and
+# "utilization" shape the physical stage, so every downstream key inherits them; "plan"
+# is the compiled config, "debt" the compiled financing or None, "capital_return" an
+# S x k schedule overriding the plan's or None, "inflation_offset" the S x 1 years of
+# inflation accrued before year one or None). SKU_BLOCK is the (SKUs x S x years)
+# view of the SKU columns.
+SKU_BLOCK = "__skus__"
+
+STAGES = {
+    "physical": {"params": ["t_dia", "utilization", "years", "n", "plan"], "deps": [], "fn": _stage_physical,
+                 "columns": ["Unidades_Total"],
+                 "context": ["ton_input_anual", "ton_reciclable", "total_units", "co2_total", "lix_total"]},
+    "revenue": {"params": ["p_base_bloque", "p_tipping", "p_recic", "p_bono_co2", "p_bono_agua", "inflation",
+                           "inflation_offset", "plan"],
+                "deps": ["physical"], "fn": _stage_revenue,
+                "columns": ["Ingresos", "Rev_Bloques", "Rev_Recic", "Rev_Tipping", "Rev_Bonos", SKU_BLOCK],
+                "context": ["inf_index"]},
+    "opex": {"params": ["plan"], "deps": ["revenue"], "fn": _stage_opex,
+             "columns": ["OPEX_Total", "Cost_Energy", "Cost_Payroll", "Cost_Variable"], "context": []},
+    "profitability": {"params": ["capex", "plan"], "deps": ["revenue", "opex"], "fn": _stage_profitability,
+                      "columns": ["EBITDA", "Deprec"], "context": []},
+    "waterfall": {"params": ["capex", "tax_rate", "plan", "debt", "capital_return"], "deps": ["profitability"],
+                  "fn": _stage_waterfall,
+                  "columns": ["Impuestos", "Utilidad_Neta", "Flujo_Operativo", "Pago_Retorno_Capital",
+                              "Pago_Dividendos", "Caja_Ferpa", "Saldo_Inversion", "Flujo_Investor_Total"],
+                  "context": ["equity", "financing"]},
+    "metrics": {"params": ["capex", "discount_rate"], "deps": ["waterfall"], "fn": _stage_metrics,
+                "columns": [], "context": ["flows", "irr", "irr_converged", "npv"]},
+}
+
+
+def batch_inputs(t_dia, p_base_bloque, p_tipping, p_recic, p_bono_co2, p_bono_agua, capex, tax_rate, inflation,
+                 years=10, discount_rate=0.12, utilization=None, plan=None, interest_rate=0.0, debt=None,
+                 capital_return=None, inflation_offset=None):
+    """Stage inputs `p` of run_batch: parameters broadcast to S x 1 plus the shape keys.
+
+    S also counts the per-scenario debt terms, so scalar operating parameters with S
+    capital structures give S scenarios.
+    """
+    params = np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=float)) for v in
+                                   (t_dia, p_base_bloque, p_tipping, p_recic, p_bono_co2, p_bono_agua, capex, tax_rate, inflation)])
+    if params[0].ndim != 1:
+        raise ValueError("run_batch expects scalars or 1-D arrays")
+    if debt is not None:
+        n, m = params[0].shape[0], debt_scenarios(debt, interest_rate)
+        if n != m and 1 not in (n, m):
+            raise ValueError(f"La deuda describe {m} escenarios y los parámetros {n}")
+        params = [np.broadcast_to(v, (max(n, m),)) for v in params]
+    p = {name: v[:, None] for name, v in zip(BATCH_PARAMS, params)}
+    p.update(n=params[0].shape[0], years=years, discount_rate=discount_rate, utilization=utilization,
+             plan=DEFAULT_PLAN if plan is None else compile_config(plan),
+             debt=None if debt is None else compile_debt(debt, params[0].shape[0], params[6], interest_rate))
+    if capital_return is not None:
+        capital_return = np.asarray(capital_return, dtype=float)
+        if capital_return.ndim not in (1, 2) or (capital_return < 0).any():
+            raise ValueError("capital_return debe ser un calendario (k,) o (S, k) de fracciones no negativas")
+    p["capital_return"] = capital_return
+    p["inflation_offset"] = (None if inflation_offset is None else
+                             np.broadcast_to(np.asarray(inflation_offset, dtype=float).reshape(-1, 1), (p["n"], 1)))
+    return p
+
+
+def batch_block(p):
+    """Metric-major output block (columns x S x years) of `p` and its per-column views."""
+    columns = plan_columns(p["plan"])
+    out = np.empty((len(columns), p["n"], p["years"]))
+    col = dict(zip(columns, out))
+    col[SKU_BLOCK] = out[len(BASE_COLUMNAS):]
+    return out, col
+
+
+def batch_output(p, out, ctx, start_year=2025):
+    """run_batch result dict from the filled metric-major block and the stage context."""
+    return {
+        "data": out.transpose(1, 2, 0),
+        "columns": plan_columns(p["plan"]),
+        "years": start_year + np.arange(p["years"]),
+        "flows": ctx["flows"],
+        "debt": ctx["financing"],
+        "metrics": {
+            "irr": ctx["irr"],
+            "npv": ctx["npv"],
+            "irr_converged": ctx["irr_converged"],
+            "total_prod": np.broadcast_to(ctx["total_units"], (p["n"], p["years"]))[:, -1],
+            "capex": p["capex"][:, 0],
+            "equity": ctx["equity"],
+            "min_dscr": (np.full(p["n"], np.nan) if ctx["financing"] is None else
+                         np.min(ctx["financing"]["DSCR"], axis=1, initial=np.inf, where=~np.isnan(ctx["financing"]["DSCR"])))
         }
+    }
+
+
+def run_batch(t_dia, p_base_bloque, p_tipping, p_recic, p_bono_co2, p_bono_agua, capex, tax_rate, inflation,
+              interest_rate=0.0, roi_target=None, years=10, discount_rate=0.12, start_year=2025, utilization=None,
+              plan=None, debt=None, capital_return=None, inflation_offset=None):
+    """Evaluate many scenarios at once.
+
+    Every parameter accepts a scalar or a 1-D array; they are broadcast together to
+    S scenarios. Returns a dict with the (S x years x len(COLUMNAS)) cube in "data",
+    the investor flows (S x years+1) and per-scenario "metrics", reproducing
+    SimuladorFerpaV5.run_simulation number for number. roi_target is accepted for
+    signature parity and not used. discount_rate may also be one rate per scenario.
+    
+    `debt` (see ferpa_debt.compile_debt; tranche terms may be per-scenario arrays)
+    funds part of the CAPEX: interest is deducted before taxes, debt service is paid
+    ahead of the investor's capital return (now a share of the equity, CAPEX - debt),
+    and "debt" holds the (S x tranches x years) schedule plus DSCR and lock-up flags;
+    metrics add "equity" and "min_dscr". interest_rate is the rate of tranches that do
+    not set their own. Without debt "debt" is None and the model is unlevered.
+    
+    `capital_return` (k,) or (S x k) replaces the plan's capital return schedule, e.g.
+    one candidate schedule per scenario in an optimization.
+    
+    `utilization` (broadcastable to S x years) scales the tonnage processed in each year,
+    e.g. a ramp-up curve; Unidades_Total then varies by year and metrics["total_prod"]
+    reports the last (steady-state) year.
+    
+    `inflation_offset` (scalar or S) is the number of years of inflation already accrued
+    at each scenario's first year: prices and fixed costs start at (1 + inflation) **
+    offset instead of 1, e.g. plants opening later on a common price calendar.
+    
+    `plan` (ModelPlan, config dict or path; default ferpa_config.json) sets the product
+    mix and cost structure; "columns" lists the metrics axis, COLUMNAS for the default.
+    """
+    p = batch_inputs(t_dia, p_base_bloque, p_tipping, p_recic, p_bono_co2, p_bono_agua, capex, tax_rate, inflation,
+                     years=years, discount_rate=discount_rate, utilization=utilization, plan=plan,
+                     interest_rate=interest_rate, debt=debt, capital_return=capital_return,
+                     inflation_offset=inflation_offset)
+    # Metric-major storage keeps every column write contiguous; "data" is exposed as a
+    # (scenarios x years x metrics) view of it
+    out, col = batch_block(p)
+    ctx = {}
+    for name, stage in STAGES.items():
+        with span(name, "stage", scenarios=p["n"]):
+            stage["fn"](p, ctx, col)
+    return batch_output(p, out, ctx, start_year)
+
+
+def batch_frame(batch, idx):
+    """Rebuild the run_simulation()["df"] table of scenario `idx` from a run_batch result."""
+    df = pd.DataFrame(batch["data"][idx], columns=batch["columns"])
+    df.insert(0, "Año", batch["years"])
+    return df
+
+
+def batch_result(batch, idx):
+    """SimulationResult of scenario `idx` of a run_batch result (same numbers as run_simulation)."""
+    m = batch["metrics"]
+    return SimulationResult(batch["years"], np.ascontiguousarray(batch["data"][idx].T), {
+        "irr": float(m["irr"][idx]) or 0.0,
+        "npv": float(m["npv"][idx]),
+        "total_prod": float(m["total_prod"][idx]),
+        "capex": float(m["capex"][idx])
+    }, batch["columns"])
@@ -0,0 +1,153 @@
+import numpy as np
+from scipy import stats
+from scipy.special import ndtr
+
+from ferpa_logic import BATCH_PARAMS, COLUMNAS, run_batch
+
+
+class QuantileSketch:
+    """Mergeable compactor sketch (KLL style) over rows of a (n, width) stream.
+
+    Level h holds items of weight 2**h and at most `k` rows; when a level fills up it is
+    sorted column-wise and every other row is promoted, so memory grows only with
+    log2(n / k) no matter how many draws are streamed through. The rank of a returned
+    quantile is within `rank_error` * n of the requested one.
+    """
+
+    def __init__(self, width=1, k=4096):
+        self.width = width
+        self.k = k
+        self.n = 0
+        self.levels = []
+        self._offset = []
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).reshape(-1, self.width)
+        self.n += len(values)
+        self._push(0, values)
+
+    def _push(self, h, values):
+        while len(values):
+            if h == len(self.levels):
+                self.levels.append(np.empty((0, self.width)))
+                self._offset.append(0)
+            buf = np.concatenate([self.levels[h], values])
+            if len(buf) < self.k:
+                self.levels[h] = buf
+                return
+            buf.sort(axis=0)
+            # An odd row out stays at this level with its own weight
+            self.levels[h] = buf[len(buf) - len(buf) % 2:]
+            buf = buf[:len(buf) - len(buf) % 2]
+            # Alternate the kept half so compaction is unbiased over time (and deterministic)
+            values = buf[self._offset[h]::2]
+            self._offset[h] ^= 1
+            h += 1
+
+    @property
+    def rank_error(self):
+        """Worst-case rank error of `quantile` as a fraction of n.
+
+        A compaction at level h moves any rank by at most 2**h and takes at least
+        k * 2**h weight, so each compacted level adds at most n / k; picking an item of
+        the top level adds at most its weight, 2 * n / k.
+        """
+        return (len(self.levels) + 1) / self.k
+
+    def merge(self, other):
+        self.n += other.n
+        for h, level in enumerate(other.levels):
+            self._push(h, level)
+        return self
+
+    def quantile(self, q):
+        """Quantiles `q` for every column, shape (len(q), width)."""
+        q = np.atleast_1d(np.asarray(q, dtype=float))
+        if not self.levels:
+            return np.full((len(q), self.width), np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, axis=0)
+        cum = np.cumsum(weights[order], axis=0)
+        out = np.empty((len(q), self.width))
+        for j in range(self.width):
+            idx = np.searchsorted(cum[:, j], q * cum[-1, j])
+            out[:, j] = items[order[np.minimum(idx, len(items) - 1), j], j]
+        return out
+
+
+def default_distributions(base, spread=0.2, inflation_sd=0.01):
+    """Triangular ±spread around the base block price, tipping fee and CO2 bond, normal inflation."""
+    dist = {}
+    for name in ("p_base_bloque", "p_tipping", "p_bono_co2"):
+        lo, hi = base[name] * (1 - spread), base[name] * (1 + spread)
+        dist[name] = stats.triang(c=0.5, loc=lo, scale=hi - lo)
+    dist["inflation"] = stats.norm(loc=base["inflation"], scale=inflation_sd)
+    return dist
+
+
+def run_montecarlo(base, distributions, n_draws, corr=None, seed=None, chunk_size=20000,
+                   quantiles=(0.05, 0.5, 0.95), years=10, discount_rate=0.12, sketch_k=4096, plan=None,
+                   interest_rate=0.0, debt=None, start_year=2025):
+    """Stream `n_draws` correlated draws through run_batch in fixed-size chunks.
+
+    `base` holds the SimuladorFerpaV5 keyword arguments; every entry of `distributions`
+    (any object with a `.ppf`, e.g. a frozen scipy.stats distribution) replaces the
+    matching base value. Inputs are correlated with a Gaussian copula using `corr`,
+    ordered like `distributions`. Only quantile sketches are kept between chunks.
+    `interest_rate` and `debt` (ferpa_debt) give the financing of every draw. "years"
+    labels the yearly bands from `start_year`; "path_years" adds the investment year
+    before it for the cumulative NPV path.
+    """
+    names = list(distributions)
+    unknown = [n for n in names if n not in BATCH_PARAMS]
+    if unknown:
+        raise ValueError(f"Parámetros sin efecto en el modelo: {unknown}")
+    if corr is None:
+        chol = np.eye(len(names))
+    else:
+        try:
+            chol = np.linalg.cholesky(np.asarray(corr, dtype=float))
+        except np.linalg.LinAlgError:
+            raise ValueError("La matriz de correlación debe ser simétrica y definida positiva")
+        if chol.shape != (len(names), len(names)):
+            raise ValueError("La matriz de correlación no coincide con las distribuciones")
+
+    rng = np.random.default_rng(seed)
+    k_ebitda = COLUMNAS.index("EBITDA")
+    discount = 1 / (1 + discount_rate) ** np.arange(years + 1)
+    sk_irr, sk_npv = QuantileSketch(1, sketch_k), QuantileSketch(1, sketch_k)
+    sk_ebitda = QuantileSketch(years, sketch_k)
+    sk_npv_path = QuantileSketch(years + 1, sketch_k)
+    irr_nan = 0
+
+    done = 0
+    while done < n_draws:
+        size = min(chunk_size, n_draws - done)
+        u = ndtr(rng.standard_normal((size, len(names))) @ chol.T)
+        params = {p: base[p] for p in BATCH_PARAMS}
+        for j, name in enumerate(names):
+            params[name] = distributions[name].ppf(u[:, j])
+        res = run_batch(**params, years=years, discount_rate=discount_rate, start_year=start_year, plan=plan,
+                        interest_rate=interest_rate, debt=debt)
+
+        irr = res["metrics"]["irr"]
+        ok = ~np.isnan(irr)
+        irr_nan += size - ok.sum()
+        sk_irr.update(irr[ok])
+        sk_npv.update(res["metrics"]["npv"])
+        sk_ebitda.update(res["data"][:, :, k_ebitda])
+        sk_npv_path.update(np.cumsum(res["flows"] * discount, axis=1))
+        done += size
+
+    return {
+        "quantiles": np.asarray(quantiles),
+        "years": start_year + np.arange(years),
+        "path_years": start_year - 1 + np.arange(years + 1),
+        "irr": sk_irr.quantile(quantiles)[:, 0],
+        "npv": sk_npv.quantile(quantiles)[:, 0],
+        "ebitda": sk_ebitda.quantile(quantiles),
+        "npv_path": sk_npv_path.quantile(quantiles),
+        "n_draws": n_draws,
+        "irr_nan": int(irr_nan)
+    }
@@ -0,0 +1,192 @@
+import argparse
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import differential_evolution
+
+from ferpa_config import DEFAULT_PLAN, compile_config
+from ferpa_goalseek import payback_years
+from ferpa_logic import BATCH_PARAMS, COLUMNAS, DEFAULT_PARAMS, batch_result, run_batch
+
+# Units/year behind the "Uso Planta %" gauge of app.py
+PLANT_CAPACITY = 35_000_000
+# Weight of a unit of (relative) constraint violation against NPV in the penalized objective
+PENALTY = 1e9
+
+
+def _problem(base, plan, bounds, return_years, min_cash, roi_target, capacity, years, discount_rate, debt):
+    # Everything a restart needs, as plain data so it can be sent to a worker process
+    plan = compile_config(plan)
+    k = len(plan.sku_names)
+    share_bounds = [tuple(bounds.get(name, bounds.get("share", (0.05, 0.80)))) for name in plan.sku_names]
+    return {
+        "base": {p: float(base[p]) for p in BATCH_PARAMS}, "plan": plan.config, "k": k,
+        "box": [tuple(bounds.get("t_dia", (100.0, 500.0)))] + share_bounds + [(0.0, 1.0)] * return_years,
+        "share_lo": np.array([lo for lo, _ in share_bounds]), "share_hi": np.array([hi for _, hi in share_bounds]),
+        "min_cash": min_cash, "roi_target": roi_target, "capacity": capacity, "years": years,
+        "discount_rate": discount_rate, "debt": debt,
+    }
+
+
+def decode(X, problem):
+    """Candidates (S x D) -> t_dia, product mix shares (S x SKUs) and capital return schedule (S x R).
+
+    Mix and schedule are raw weights normalized to sum 1, so every candidate returns the
+    whole equity and sells its whole production.
+    """
+    k = problem["k"]
+    w, r = X[:, 1:1 + k], X[:, 1 + k:]
+    shares = w / np.maximum(w.sum(axis=1, keepdims=True), 1e-12)
+    schedule = r / np.maximum(r.sum(axis=1, keepdims=True), 1e-12)
+    return X[:, 0], shares, schedule
+
+
+def evaluate(X, problem, plan=None):
+    """NPV, project cash and constraint violation of a population, in one run_batch call.
+
+    The mix only reaches the metrics through the weighted block price, so a candidate mix
+    is evaluated as the plan's mix with p_base_bloque scaled by the ratio of weighted
+    price factors. Violation is 0 for feasible candidates and otherwise sums the relative
+    excess over plant capacity, the Caja_Ferpa shortfall below min_cash (per CAPEX), the
+    years of payback beyond roi_target and the mix shares outside their bounds.
+    """
+    plan = compile_config(problem["plan"]) if plan is None else plan
+    base = problem["base"]
+    t_dia, shares, schedule = decode(X, problem)
+    price = base["p_base_bloque"] * (shares @ plan.sku_factor) / plan.weighted_factor
+    res = run_batch(**{**base, "t_dia": t_dia, "p_base_bloque": price}, years=problem["years"],
+                    discount_rate=problem["discount_rate"], plan=plan, debt=problem["debt"], capital_return=schedule)
+    caja = res["data"][:, :, COLUMNAS.index("Caja_Ferpa")]
+    payback = payback_years(res)
+    violation = (np.maximum(res["metrics"]["total_prod"] / problem["capacity"] - 1, 0.0)
+                 + np.maximum(problem["min_cash"] - caja.min(axis=1), 0.0) / base["capex"]
+                 + np.where(np.isfinite(payback), np.maximum(payback - problem["roi_target"], 0.0), problem["years"])
+                 + (np.maximum(problem["share_lo"] - shares, 0.0) + np.maximum(shares - problem["share_hi"], 0.0)).sum(axis=1))
+    return res["metrics"]["npv"], caja.sum(axis=1), violation
+
+
+def _restart(problem, seed, popsize, maxiter, tol):
+    # One differential evolution run; each generation is a single vectorized evaluation
+    plan = compile_config(problem["plan"])
+    history = []
+
+    def objective(x):
+        X = x.T if x.ndim == 2 else x[None]
+        npv, caja, violation = evaluate(X, problem, plan)
+        history.append(np.column_stack([X, npv, caja, violation]))
+        return -npv + PENALTY * violation
+
+    sol = differential_evolution(objective, problem["box"], popsize=popsize, maxiter=maxiter, tol=tol, seed=seed,
+                                 vectorized=True, updating="deferred", polish=False)
+    return {"seed": seed, "x": sol.x, "fun": float(sol.fun), "nfev": int(sol.nfev), "nit": int(sol.nit),
+            "history": np.concatenate(history)}
+
+
+def pareto_front(npv, caja):
+    """Indices of the candidates not dominated in (npv, caja), both maximized, by descending NPV."""
+    order = np.lexsort((-caja, -npv))
+    if not len(order):
+        return order
+    best = np.maximum.accumulate(caja[order])
+    keep = np.concatenate([[True], caja[order][1:] > best[:-1]])
+    return order[keep]
+
+
+def optimize_plant(base=None, plan=None, bounds=None, return_years=None, min_cash=0.0, roi_target=3,
+                   capacity=PLANT_CAPACITY, restarts=4, workers=None, popsize=20, maxiter=200, tol=1e-8,
+                   years=10, discount_rate=0.12, debt=None):
+    """Tonnage, product mix and capital return schedule that maximize investor NPV.
+
+    Subject to total_prod <= `capacity`, Caja_Ferpa >= `min_cash` in every year and a
+    payback (ferpa_goalseek.payback_years) within `roi_target` years. `bounds` maps
+    "t_dia", a SKU name or "share" (every SKU) to (low, high); the schedule spans
+    `return_years` (default: the plan's). Differential evolution runs `restarts` times
+    with different seeds, in parallel over `workers` processes, on a penalized objective.
+
+    Returns "params" (run_batch inputs), "mix" and "capital_return" of the optimum,
+    "plan" (the plan with them), "result" (its SimulationResult, exact), "npv", "irr",
+    "feasible", one summary row per restart and "pareto": the non-dominated feasible
+    candidates of all restarts between investor NPV and total Caja_Ferpa.
+    """
+    plan = DEFAULT_PLAN if plan is None else compile_config(plan)
+    base = {**DEFAULT_PARAMS, **(base or {})}
+    return_years = return_years or len(plan.capital_return)
+    problem = _problem(base, plan, bounds or {}, return_years, min_cash, roi_target, capacity, years,
+                       discount_rate, debt)
+    seeds = list(range(restarts))
+    workers = min(workers or os.cpu_count() or 1, restarts)
+    if workers == 1:
+        runs = [_restart(problem, s, popsize, maxiter, tol) for s in seeds]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            runs = list(pool.map(_restart, [problem] * restarts, seeds, [popsize] * restarts,
+                                 [maxiter] * restarts, [tol] * restarts))
+
+    best = min(runs, key=lambda r: r["fun"])
+    t_dia, shares, schedule = (v[0] for v in decode(best["x"][None], problem))
+    config = copy.deepcopy(plan.config)
+    for sku, share in zip(config["skus"], shares.tolist()):
+        sku["share"] = share
+    config["capital_return"] = schedule.tolist()
+    best_plan = compile_config(config)
+    params = {**problem["base"], "t_dia": float(t_dia)}
+    res = run_batch(**params, years=years, discount_rate=discount_rate, plan=best_plan, debt=debt)
+    _, _, violation = evaluate(best["x"][None], problem, plan)
+
+    # history rows: candidate (D values), npv, caja_total, violation
+    names = ["t_dia"] + [f"share:{n}" for n in plan.sku_names] + [f"retorno:{i + 1}" for i in range(return_years)]
+    history = np.concatenate([r["history"] for r in runs])
+    feasible = history[history[:, -1] == 0]
+    front = feasible[pareto_front(feasible[:, -3], feasible[:, -2])]
+    t_front, s_front, r_front = decode(front[:, :len(names)], problem)
+    pareto = pd.DataFrame(np.column_stack([front[:, -3], front[:, -2], t_front, s_front, r_front]),
+                          columns=["npv", "caja_total"] + names)
+    return {
+        "params": params,
+        "mix": dict(zip(plan.sku_names, shares.tolist())),
+        "capital_return": schedule.tolist(),
+        "plan": best_plan,
+        "result": batch_result(res, 0),
+        "npv": float(res["metrics"]["npv"][0]),
+        "irr": float(res["metrics"]["irr"][0]),
+        "feasible": bool(violation[0] == 0),
+        "restarts": pd.DataFrame([{"seed": r["seed"], "penalized_npv": -r["fun"], "evaluations": r["nfev"],
+                                   "generations": r["nit"]} for r in runs]),
+        "evaluations": len(history),
+        "feasible_evaluations": len(feasible),
+        "pareto": pareto,
+    }
+
+
+def main(argv=None):
+    # python ferpa_optimize.py --min-cash 250000 --roi-target 3 --restarts 8
+    parser = argparse.ArgumentParser(description="Optimiza toneladas, mix y retorno de capital para máximo VAN del socio.")
+    parser.add_argument("--min-cash", type=float, default=0.0, help="Caja_Ferpa mínima de cada año")
+    parser.add_argument("--roi-target", type=float, default=3, help="repago máximo (años)")
+    parser.add_argument("--capacity", type=float, default=PLANT_CAPACITY, help="unidades/año de la planta")
+    parser.add_argument("--restarts", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--maxiter", type=int, default=200)
+    parser.add_argument("--config", default=None, help="configuración JSON/YAML del modelo")
+    parser.add_argument("--pareto", default=None, help="CSV donde guardar el frente de Pareto")
+    args = parser.parse_args(argv)
+
+    opt = optimize_plant(plan=args.config, min_cash=args.min_cash, roi_target=args.roi_target,
+                         capacity=args.capacity, restarts=args.restarts, workers=args.workers, maxiter=args.maxiter)
+    print(f"VAN ${opt['npv']:,.0f} · TIR {opt['irr']:.1%} · {'factible' if opt['feasible'] else 'NO factible'}")
+    print(f"t_dia {opt['params']['t_dia']:,.1f}")
+    for name, share in opt["mix"].items():
+        print(f"  {name}: {share:.1%}")
+    print("retorno de capital: " + ", ".join(f"{f:.1%}" for f in opt["capital_return"]))
+    print(opt["restarts"].to_string(index=False))
+    print(f"{opt['evaluations']:,} evaluaciones ({opt['feasible_evaluations']:,} factibles), "
+          f"{len(opt['pareto'])} puntos en el frente de Pareto")
+    if args.pareto:
+        opt["pareto"].to_csv(args.pareto, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+from ferpa_irr import npv as npv_rows, solve_irr
+from ferpa_logic import BATCH_PARAMS, COLUMNAS, run_batch
+
+# Columns of a portfolio plants table
+PLANT_COLUMNS = BATCH_PARAMS + ["start_year", "ramp"]
+
+
+def parse_ramp(text):
+    """Ramp-up typed as "0.5, 0.8" -> [0.5, 0.8] (None if empty); each value must be in [0, 1]."""
+    parts = [x.strip() for x in str(text).split(",") if x.strip()]
+    try:
+        ramp = [float(x) for x in parts]
+    except ValueError:
+        raise ValueError(f"Rampa inválida: '{text}' (use valores separados por coma, p. ej. 0.5, 0.8)")
+    if any(not 0 <= v <= 1 for v in ramp):
+        raise ValueError(f"Rampa inválida: '{text}' (cada valor debe estar entre 0 y 1)")
+    return ramp or None
+
+
+def ramp_matrix(ramps, years):
+    """(N x years) utilization: each plant's ramp-up curve, then 1.0 (full capacity)."""
+    util = np.ones((len(ramps), years))
+    for i, ramp in enumerate(ramps):
+        if ramp is None or (np.ndim(ramp) == 0 and pd.isna(ramp)):
+            continue
+        ramp = np.asarray(ramp, dtype=float)[:years]
+        util[i, :len(ramp)] = ramp
+    return util
+
+
+def run_portfolio(plants, first_year=None, horizon=30, discount_rate=0.12, plan=None, interest_rate=0.0, debt=None):
+    """Simulate N plants in one batch and consolidate them on a calendar horizon.
+
+    `plants` is a DataFrame (or list of dicts) with the run_batch inputs of every plant
+    plus "start_year" (first operating year) and an optional "ramp" (utilization of the
+    first operating years, e.g. [0.4, 0.7, 0.9]). Prices and fixed costs are given in
+    `first_year` terms and inflated to each plant's start, so every calendar column is
+    at one price level; CAPEX is taken as entered. The horizon starts at `first_year`
+    (default: earliest start) and runs `horizon` years; plants are cut at its end.
+    `interest_rate` and `debt` (ferpa_debt) finance every plant; the investor then
+    funds only each plant's equity.
+
+    Returns "years", the consolidated P&L / cash-flow / waterfall table, the per-plant
+    calendar-aligned cube (N x horizon x metrics), calendar investor flows (N x
+    horizon+1, column 0 being the year before the horizon) and consolidated plus
+    per-plant IRR/NPV at the start of the horizon.
+    """
+    plants = pd.DataFrame(plants)
+    missing = [c for c in BATCH_PARAMS + ["start_year"] if c not in plants]
+    if missing:
+        raise ValueError(f"Faltan columnas en las plantas: {missing}")
+    n = len(plants)
+    start = plants["start_year"].to_numpy(dtype=int)
+    first_year = int(start.min()) if first_year is None else int(first_year)
+    offset = start - first_year
+    if (offset < 0).any():
+        raise ValueError("Hay plantas que arrancan antes del inicio del horizonte")
+
+    ramps = plants["ramp"].tolist() if "ramp" in plants else [None] * n
+    res = run_batch(**{p: plants[p].to_numpy(dtype=float) for p in BATCH_PARAMS}, years=horizon,
+                    discount_rate=discount_rate, utilization=ramp_matrix(ramps, horizon), plan=plan,
+                    inflation_offset=offset, interest_rate=interest_rate, debt=debt)
+    columns = res["columns"]
+
+    # Shift operating year k of plant i to calendar slot offset_i + k (k = 0..horizon-1)
+    cal = offset[:, None] + np.arange(horizon)
+    inside = cal < horizon
+    rows = np.broadcast_to(np.arange(n)[:, None], cal.shape)
+    cube = np.zeros((n, horizon, len(columns)))
+    cube[rows[inside], cal[inside]] = res["data"][inside]
+
+    flows = np.zeros((n, horizon + 1))
+    in_horizon = offset < horizon
+    flows[in_horizon, offset[in_horizon]] = -res["metrics"]["equity"][in_horizon]
+    flows[:, 1:] += cube[:, :, COLUMNAS.index("Flujo_Investor_Total")]
+
+    # Every metric column is a currency flow, a balance or a volume: consolidating is a sum
+    total_flows = flows.sum(axis=0)
+    plant_irr = solve_irr(flows)
+    years = first_year + np.arange(horizon)
+    consolidated = pd.DataFrame(cube.sum(axis=0), columns=columns)
+    consolidated.insert(0, "Año", years)
+    consolidated.insert(1, "Plantas_Operando", (cube[:, :, COLUMNAS.index("Unidades_Total")] > 0).sum(axis=0))
+    return {
+        "years": years,
+        "consolidated": consolidated,
+        "plants": cube,
+        "flows": flows,
+        "metrics": {
+            "irr": solve_irr(total_flows)["irr"][0],
+            "npv": float(npv_rows(discount_rate, total_flows)),
+            "plant_irr": plant_irr["irr"],
+            "plant_npv": npv_rows(discount_rate, flows),
+            "capex": float(res["metrics"]["capex"][in_horizon].sum())
+        }
+    }
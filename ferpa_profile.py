@@ -0,0 +1,160 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import nullcontext
+
+import pandas as pd
+
+_NULL = nullcontext()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "cat", "args", "t0", "mem0")
+
+    def __init__(self, profiler, name, cat, args):
+        self.profiler = profiler
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.mem0 = tracemalloc.get_traced_memory()[0] if self.profiler.allocations else None
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        t1 = time.perf_counter()
+        if self.mem0 is not None:
+            self.args["alloc_bytes"] = tracemalloc.get_traced_memory()[0] - self.mem0
+        self.profiler.record({"name": self.name, "cat": self.cat, "ph": "X", "ts": self.profiler.micros(self.t0),
+                              "dur": (t1 - self.t0) * 1e6, "pid": os.getpid(), "tid": threading.get_ident(),
+                              "args": self.args})
+        return False
+
+
+class Profiler:
+    """Opt-in, process-wide recorder of timed spans and cache hit/miss counters.
+
+    Disabled by default: span() then returns a shared no-op context manager and count()
+    returns at once, so instrumented code pays one attribute check. Enabled, every span
+    becomes a Chrome trace "complete" event (wall time, thread, and with allocations=True
+    the net bytes traced by tracemalloc across it); the newest `max_events` are kept.
+    """
+
+    def __init__(self, max_events=100_000):
+        self.enabled = False
+        self.allocations = False
+        self.events = deque(maxlen=max_events)
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._tracemalloc_owner = False
+
+    def enable(self, allocations=False):
+        if allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracemalloc_owner = True
+        self.allocations = allocations
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        self.allocations = False
+        if self._tracemalloc_owner:
+            tracemalloc.stop()
+            self._tracemalloc_owner = False
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self.counters.clear()
+
+    def micros(self, t):
+        return (t - self._origin) * 1e6
+
+    def record(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def span(self, name, cat, **args):
+        """Context manager timing the enclosed block as `name` in category `cat`."""
+        if not self.enabled:
+            return _NULL
+        return _Span(self, name, cat, args)
+
+    def count(self, name, kind):
+        """Count one `kind` ("hit" / "miss") event of `name` and mark it on the trace."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[(name, kind)] += 1
+            self.events.append({"name": f"{name} {kind}", "cat": "cache", "ph": "i", "s": "t",
+                                "ts": self.micros(time.perf_counter()), "pid": os.getpid(),
+                                "tid": threading.get_ident()})
+
+    def summary(self):
+        """Spans aggregated by (cat, name): calls, total / mean / max ms and net MB allocated."""
+        with self._lock:
+            spans = [e for e in self.events if e["ph"] == "X"]
+        if not spans:
+            return pd.DataFrame(columns=["cat", "name", "calls", "total_ms", "mean_ms", "max_ms", "alloc_mb"])
+        df = pd.DataFrame({"cat": [e["cat"] for e in spans], "name": [e["name"] for e in spans],
+                           "ms": [e["dur"] / 1e3 for e in spans],
+                           "alloc_mb": [e["args"].get("alloc_bytes", 0) / 2**20 for e in spans]})
+        out = df.groupby(["cat", "name"], sort=False).agg(calls=("ms", "size"), total_ms=("ms", "sum"),
+                                                          mean_ms=("ms", "mean"), max_ms=("ms", "max"),
+                                                          alloc_mb=("alloc_mb", "sum"))
+        return out.reset_index().sort_values("total_ms", ascending=False, ignore_index=True)
+
+    def cache_counts(self):
+        """Hits, misses and hit rate per named cache."""
+        with self._lock:
+            counters = dict(self.counters)
+        names = sorted({name for name, _ in counters})
+        df = pd.DataFrame({"cache": names, "hit": [counters.get((n, "hit"), 0) for n in names],
+                           "miss": [counters.get((n, "miss"), 0) for n in names]})
+        df["hit_rate"] = df["hit"] / (df["hit"] + df["miss"]).where(lambda s: s > 0)
+        return df
+
+    def chrome_trace(self):
+        """Trace Event Format document (chrome://tracing, Perfetto)."""
+        with self._lock:
+            events = list(self.events)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+    def render_panel(self):
+        """Streamlit diagnostics panel: on/off switches, span and cache tables, trace download."""
+        import streamlit as st
+        with st.expander("🩺 Diagnóstico de rendimiento", expanded=True):
+            c1, c2, c3 = st.columns(3)
+            on = c1.toggle("Perfilado activo", value=self.enabled)
+            alloc = c2.toggle("Registrar asignaciones", value=self.allocations, disabled=not on)
+            if (on, alloc) != (self.enabled, self.allocations):
+                self.disable()
+                if on:
+                    self.enable(allocations=alloc)
+            if c3.button("Reiniciar"):
+                self.reset()
+            st.caption(f"{len(self.events):,} eventos · los cambios se registran desde el próximo recálculo")
+            st.dataframe(self.summary(), hide_index=True, use_container_width=True)
+            st.dataframe(self.cache_counts(), hide_index=True, use_container_width=True)
+            st.download_button("Exportar Chrome trace (JSON)", json.dumps(self.chrome_trace()),
+                               file_name="ferpa_trace.json", mime="application/json")
+
+
+# One recorder per process, shared by the model, the caches and both dashboards.
+# FERPA_PROFILE=1 enables it at startup; FERPA_PROFILE=alloc also traces allocations.
+PROFILER = Profiler()
+span = PROFILER.span
+count = PROFILER.count
+
+if os.environ.get("FERPA_PROFILE"):
+    PROFILER.enable(allocations=os.environ["FERPA_PROFILE"].lower() == "alloc")
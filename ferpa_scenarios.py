@@ -0,0 +1,155 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from ferpa_cache import canonical_key
+from ferpa_config import DEFAULT_PLAN, compile_config
+from ferpa_logic import BATCH_PARAMS, DEFAULT_PARAMS, run_batch
+
+
+def scenario_id(params, years=10, discount_rate=0.12, start_year=2025, plan=None, interest_rate=0.0, debt=None):
+    """Content hash of a scenario: canonical run_batch inputs plus the plan key.
+
+    Financing only enters the hash when there is debt, so unlevered ids stay stable.
+    """
+    plan = DEFAULT_PLAN if plan is None else compile_config(plan)
+    inputs = {**{p: params[p] for p in BATCH_PARAMS}, "years": years, "discount_rate": discount_rate,
+              "start_year": start_year, "plan": plan.key}
+    if debt is not None:
+        inputs.update(interest_rate=interest_rate, debt=json.dumps(debt, sort_keys=True))
+    return hashlib.blake2b(repr(canonical_key(inputs)).encode(), digest_size=12).hexdigest()
+
+
+class ScenarioStore:
+    """Scenarios and their yearly results on local disk, deduplicated by content hash.
+
+    `root/params-*.parquet` holds one row per scenario (id, name, inputs, IRR/NPV) and
+    `root/results-*.parquet` one row per (scenario, Año) with every metric column. Each
+    add() writes one pair of parts (tmp + rename), so readers never see half a write;
+    compact() merges them. Reads push the column projection and the id filter down to
+    Parquet, so a compare view only decodes the columns it shows.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._ids = set(self.catalog(columns=["scenario_id"])["scenario_id"])
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, sid):
+        return sid in self._ids
+
+    def _parts(self, kind):
+        return sorted(glob.glob(os.path.join(self.root, f"{kind}-*.parquet")))
+
+    def _dataset(self, kind):
+        # Plans with other SKUs add columns: read with the union of the part schemas
+        parts = self._parts(kind)
+        if not parts:
+            return None
+        schema = pa.unify_schemas([pq.read_schema(p) for p in parts])
+        return ds.dataset(parts, schema=schema, format="parquet")
+
+    def _write(self, kind, table, tag):
+        path = os.path.join(self.root, f"{kind}-{tag}.parquet")
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def add(self, scenarios, names=None, years=10, discount_rate=0.12, start_year=2025, plan=None,
+            interest_rate=0.0, debt=None):
+        """Store scenarios (dicts of run_batch inputs, missing ones take DEFAULT_PARAMS); returns their ids.
+
+        Only scenarios whose id is not stored yet are evaluated, all in one run_batch call.
+        `interest_rate` and `debt` (ferpa_debt, JSON-serializable) finance all of them and
+        are stored with the inputs.
+        """
+        plan = DEFAULT_PLAN if plan is None else compile_config(plan)
+        scenarios = [{**DEFAULT_PARAMS, **s} for s in scenarios]
+        names = list(names) if names is not None else [None] * len(scenarios)
+        ids = [scenario_id(s, years, discount_rate, start_year, plan, interest_rate, debt) for s in scenarios]
+        with self._lock:
+            new = {}
+            for i, sid in enumerate(ids):
+                if sid not in self._ids and sid not in new:
+                    new[sid] = i
+            if not new:
+                return ids
+            rows = list(new.values())
+            res = run_batch(**{p: np.array([float(scenarios[i][p]) for i in rows]) for p in BATCH_PARAMS},
+                            years=years, discount_rate=discount_rate, start_year=start_year, plan=plan,
+                            interest_rate=interest_rate, debt=debt)
+            n = len(rows)
+            params = {"scenario_id": list(new), "name": [names[i] or sid for sid, i in new.items()]}
+            params.update({p: [float(scenarios[i][p]) for i in rows] for p in BATCH_PARAMS})
+            params.update(years=[years] * n, discount_rate=[discount_rate] * n, start_year=[start_year] * n,
+                          plan=[plan.key] * n, interest_rate=[float(interest_rate)] * n,
+                          debt=[json.dumps(debt, sort_keys=True)] * n, irr=res["metrics"]["irr"], npv=res["metrics"]["npv"],
+                          created=[time.time()] * n)
+            # Long layout: scenario-major rows, one column per metric
+            data = res["data"].reshape(n * years, len(res["columns"]))
+            results = {"scenario_id": np.repeat(list(new), years), "Año": np.tile(res["years"], n)}
+            results.update({c: data[:, k] for k, c in enumerate(res["columns"])})
+            tag = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            # Results first: a scenario is only listed once its rows are on disk
+            self._write("results", pa.table(results), tag)
+            self._write("params", pa.table(params), tag)
+            self._ids.update(new)
+        return ids
+
+    def catalog(self, columns=None):
+        """Stored scenarios (one row each) as a DataFrame, oldest first."""
+        dataset = self._dataset("params")
+        if dataset is None:
+            return pd.DataFrame(columns=columns or ["scenario_id", "name"])
+        df = dataset.to_table(columns=columns).to_pandas()
+        return df.sort_values("created", ignore_index=True) if "created" in df else df
+
+    def results(self, ids, columns=None):
+        """Long (scenario_id, Año, columns...) frame of the given scenarios; only `columns` are read."""
+        dataset = self._dataset("results")
+        cols = ["scenario_id", "Año"] + list(columns or [])
+        if dataset is None:
+            return pd.DataFrame(columns=cols)
+        table = dataset.to_table(columns=cols if columns else None, filter=pc.field("scenario_id").isin(list(ids)))
+        return table.to_pandas()
+
+    def diff(self, base, others, columns=None, relative=False):
+        """Column-wise deltas other - base for every scenario in `others`, aligned on Año.
+
+        One vectorized subtraction over the stacked (scenario, Año) frame; with
+        `relative` the deltas are divided by |base| (NaN where base is 0).
+        """
+        df = self.results([base, *others], columns).set_index(["scenario_id", "Año"])
+        if base not in df.index.get_level_values(0):
+            raise KeyError(f"Escenario no almacenado: {base}")
+        ref = df.xs(base, level="scenario_id")
+        rest = df.drop(index=base, level="scenario_id")
+        delta = rest.sub(ref, level="Año")
+        if relative:
+            delta = delta.div(ref.abs().where(ref != 0), level="Año")
+        return delta.reset_index()
+
+    def compact(self):
+        """Merge all parts into one params and one results file."""
+        with self._lock:
+            tag = f"{time.strftime('%Y%m%d%H%M%S')}-compact"
+            for kind in ("results", "params"):
+                parts = self._parts(kind)
+                if len(parts) > 1:
+                    self._write(kind, self._dataset(kind).to_table(), tag)
+                    for path in parts:
+                        os.remove(path)
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from ferpa_logic import BATCH_PARAMS, run_batch
+
+
+def tornado(base, delta=0.10, params=None, years=10, discount_rate=0.12, plan=None, interest_rate=0.0, debt=None):
+    """One-at-a-time ±delta sensitivity of IRR and NPV, evaluated in a single run_batch call.
+
+    `base` holds the SimuladorFerpaV5 keyword arguments. Row 0 of the batch is the base
+    case and rows 2k+1 / 2k+2 move parameter k down / up by `delta` (relative). Returns
+    a DataFrame sorted by NPV swing with the perturbed inputs, both metrics at each end
+    and central-difference elasticities ((dY / Y) / (dX / X)). A parameter whose base
+    value is 0 cannot be moved relatively and gets zero swing and NaN elasticities.
+    `interest_rate` and `debt` (ferpa_debt) apply the same financing to every row.
+    """
+    params = list(params or BATCH_PARAMS)
+    unknown = [p for p in params if p not in BATCH_PARAMS]
+    if unknown:
+        raise ValueError(f"Parámetros sin efecto en el modelo: {unknown}")
+
+    n = 2 * len(params) + 1
+    inputs = {p: np.full(n, float(base[p])) for p in BATCH_PARAMS}
+    for k, p in enumerate(params):
+        inputs[p][2 * k + 1] *= 1 - delta
+        inputs[p][2 * k + 2] *= 1 + delta
+    res = run_batch(**inputs, years=years, discount_rate=discount_rate, plan=plan, interest_rate=interest_rate,
+                    debt=debt)
+    irr, npv = res["metrics"]["irr"], res["metrics"]["npv"]
+
+    lo, hi = np.arange(1, n, 2), np.arange(2, n, 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x0 = np.array([float(base[p]) for p in params])
+        dx = np.where(x0 != 0, 2 * delta, np.nan)
+        out = pd.DataFrame({
+            "Parámetro": params,
+            "Valor_Base": x0,
+            "Valor_Bajo": [inputs[p][2 * k + 1] for k, p in enumerate(params)],
+            "Valor_Alto": [inputs[p][2 * k + 2] for k, p in enumerate(params)],
+            "TIR_Bajo": irr[lo],
+            "TIR_Alto": irr[hi],
+            "VAN_Bajo": npv[lo],
+            "VAN_Alto": npv[hi],
+            "Swing_TIR": np.abs(irr[hi] - irr[lo]),
+            "Swing_VAN": np.abs(npv[hi] - npv[lo]),
+            "Elasticidad_TIR": (irr[hi] - irr[lo]) / irr[0] / dx,
+            "Elasticidad_VAN": (npv[hi] - npv[lo]) / npv[0] / dx,
+        })
+    out = out.sort_values("Swing_VAN", ascending=False, ignore_index=True)
+    out.attrs["base"] = {"irr": irr[0], "npv": npv[0]}
+    return out
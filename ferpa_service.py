@@ -0,0 +1,399 @@
+import argparse
+import asyncio
+import io
+import json
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pyarrow as pa
+
+from ferpa_cache import LRUCache, canonical_key
+from ferpa_logic import BATCH_PARAMS, COLUMNAS, DEFAULT_PARAMS, run_batch
+from ferpa_sweep import grid_points, grid_size, summarize
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+MAX_BODY = 64 * 2**20
+MAX_SWEEP = 50_000_000
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_list(values):
+    # NaN / inf (IRR without root, payback never reached) are not valid JSON -> null
+    values = np.asarray(values)
+    if values.dtype.kind == "f" and not np.isfinite(values).all():
+        return np.where(np.isfinite(values), values, None).tolist()
+    return values.tolist()
+
+
+def _scenario_inputs(obj):
+    """(params, years, discount_rate) of one scenario; missing parameters take the app defaults."""
+    unknown = sorted(set(obj) - set(BATCH_PARAMS) - {"years", "discount_rate", "format"})
+    if unknown:
+        raise HTTPError(400, f"Parámetros desconocidos: {unknown}")
+    try:
+        params = {p: float(obj.get(p, DEFAULT_PARAMS[p])) for p in BATCH_PARAMS}
+        years = int(obj.get("years", 10))
+        discount_rate = float(obj.get("discount_rate", 0.12))
+    except (TypeError, ValueError) as exc:
+        raise HTTPError(400, f"Parámetro inválido: {exc}")
+    if not 1 <= years <= 100:
+        raise HTTPError(400, "years debe estar entre 1 y 100")
+    return params, years, discount_rate
+
+
+def _flag(value):
+    # JSON booleans or query-string "1" / "true"
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def _grid_values(spec):
+    # [v1, v2, ...] or {"start": a, "stop": b, "num": n}
+    if isinstance(spec, dict):
+        return np.linspace(float(spec["start"]), float(spec["stop"]), int(spec["num"])).tolist()
+    return [float(v) for v in spec]
+
+
+class Coalescer:
+    """Collects single-scenario requests for `window` seconds and answers them with one run_batch call.
+
+    Requests are grouped by horizon (years); discount rates may differ inside a batch. A
+    group is flushed when its window expires or as soon as it holds `max_batch` scenarios;
+    the batch runs in the loop's executor, so the event loop keeps serving meanwhile.
+    """
+
+    def __init__(self, window=0.002, max_batch=1024):
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = {}
+        self.batches = 0
+        self.scenarios = 0
+
+    def submit(self, params, years, discount_rate):
+        """Future resolving to (run_batch result, summarize() of it, row of this scenario)."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queue = self.pending.setdefault(years, [])
+        queue.append((params, discount_rate, future))
+        if len(queue) == 1:
+            loop.call_later(self.window, self.flush, years)
+        elif len(queue) >= self.max_batch:
+            self.flush(years)
+        return future
+
+    def flush(self, years):
+        queue = self.pending.pop(years, None)
+        if not queue:
+            return
+        done = asyncio.get_running_loop().run_in_executor(None, self._evaluate, queue, years)
+        done.add_done_callback(lambda f: self._resolve(queue, f))
+
+    @staticmethod
+    def _evaluate(queue, years):
+        res = run_batch(**{p: np.array([q[0][p] for q in queue]) for p in BATCH_PARAMS}, years=years,
+                        discount_rate=np.array([q[1] for q in queue]))
+        return res, summarize(res)
+
+    def _resolve(self, queue, done):
+        # Runs on the event loop once the executor has finished the batch
+        exc = done.exception()
+        if exc is None:
+            res, summary = done.result()
+            self.batches += 1
+            self.scenarios += len(queue)
+        for i, (_, _, future) in enumerate(queue):
+            if future.done():
+                continue
+            if exc is None:
+                future.set_result((res, summary, i))
+            else:
+                future.set_exception(exc)
+
+
+class _ArrowStream:
+    """Incremental Arrow IPC stream: every write returns the bytes produced so far."""
+
+    def __init__(self):
+        self.sink = io.BytesIO()
+        self.writer = None
+
+    def _take(self):
+        data = self.sink.getvalue()
+        self.sink.seek(0)
+        self.sink.truncate()
+        return data
+
+    def write(self, table):
+        if self.writer is None:
+            self.writer = pa.ipc.new_stream(self.sink, table.schema)
+        self.writer.write_table(table)
+        return self._take()
+
+    def close(self):
+        if self.writer is None:
+            return b""
+        self.writer.close()
+        return self._take()
+
+
+class FerpaService:
+    """HTTP/1.1 front-end of the model on asyncio streams (no web framework needed).
+
+    GET|POST /simulate   one scenario (query string or JSON body) -> JSON or Arrow
+    POST /batch          {"scenarios": [{...}, ...], "table": false} -> JSON lines or Arrow stream
+    POST /sweep          {"grid": {param: [..] | {"start","stop","num"}}, "fixed": {...}} -> idem
+    GET /health, /stats
+
+    Missing parameters take DEFAULT_PARAMS; "years" and "discount_rate" are accepted
+    everywhere. Arrow is chosen with ?format=arrow or Accept: application/vnd.apache.arrow.stream.
+    Single scenarios are coalesced (Coalescer) and their encoded responses kept in an LRU
+    cache of hot parameter sets; batch and sweep chunks run in a worker thread and are
+    streamed as they finish.
+    """
+
+    def __init__(self, window=0.002, max_batch=1024, cache_entries=4096, chunk_size=20_000):
+        self.coalescer = Coalescer(window, max_batch)
+        self.cache = LRUCache(max_entries=cache_entries, max_bytes=64 * 2**20)
+        self.chunk_size = chunk_size
+        self.requests = 0
+
+    # --- HTTP ---
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._send(writer, 400, b'{"error": "bad request line"}', "application/json", False)
+                    break
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._send(writer, 400, b'{"error": "bad content-length"}', "application/json", False)
+                    break
+                if length > MAX_BODY:
+                    await self._send(writer, 413, b'{"error": "body too large"}', "application/json", False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                keep_alive = await self.dispatch(method, target, headers, body, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, headers, body, writer, keep_alive):
+        """Answer one request; returns whether the connection can serve another one."""
+        self.requests += 1
+        url = urlsplit(target)
+        query = dict(parse_qsl(url.query))
+        routes = {
+            "/simulate": ({"GET", "POST"}, self.simulate),
+            "/batch": ({"POST"}, self.batch),
+            "/sweep": ({"POST"}, self.sweep),
+            "/health": ({"GET"}, self.health),
+            "/stats": ({"GET"}, self.stats),
+        }
+        try:
+            if url.path not in routes:
+                raise HTTPError(404, f"Ruta desconocida: {url.path}")
+            methods, handler = routes[url.path]
+            if method not in methods:
+                raise HTTPError(405, f"{method} no admitido en {url.path}")
+            try:
+                payload = json.loads(body) if body else {}
+            except ValueError:
+                raise HTTPError(400, "El cuerpo no es JSON válido")
+            if not isinstance(payload, dict):
+                raise HTTPError(400, "El cuerpo debe ser un objeto JSON")
+            arrow = query.pop("format", payload.get("format", "")) == "arrow" or ARROW_STREAM in headers.get("accept", "")
+            result = await handler({**payload, **query}, arrow)
+        except HTTPError as exc:
+            await self._send(writer, exc.status, json.dumps({"error": str(exc)}).encode(), "application/json", keep_alive)
+            return keep_alive
+        except Exception as exc:
+            await self._send(writer, 500, json.dumps({"error": repr(exc)}).encode(), "application/json", keep_alive)
+            return keep_alive
+        if isinstance(result, tuple):
+            await self._send(writer, 200, *result, keep_alive)
+            return keep_alive
+        return await self._stream(writer, result, arrow, keep_alive)
+
+    async def _send(self, writer, status, body, content_type, keep_alive):
+        head = (f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode() + body)
+        await writer.drain()
+
+    async def _stream(self, writer, chunks, arrow, keep_alive):
+        # Chunked transfer: each model chunk is sent as soon as it is encoded. A chunk that
+        # fails after the 200 header is out can no longer become an error status: JSON lines
+        # get a final {"error": ...} line, then the connection is closed without the
+        # terminating chunk, so clients see an incomplete response instead of a short one
+        content_type = ARROW_STREAM if arrow else "application/x-ndjson"
+        writer.write((f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nTransfer-Encoding: chunked\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode())
+        try:
+            async for data in chunks:
+                if data:
+                    writer.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                    await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception as exc:
+            if not arrow:
+                data = (json.dumps({"error": repr(exc)}) + "\n").encode()
+                writer.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                await writer.drain()
+            return False
+        finally:
+            await chunks.aclose()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        return keep_alive
+
+    # --- ENDPOINTS ---
+    async def health(self, payload, arrow):
+        return b'{"status": "ok"}', "application/json"
+
+    async def stats(self, payload, arrow):
+        stats = {"requests": self.requests, "cache": self.cache.stats(),
+                 "coalescer": {"batches": self.coalescer.batches, "scenarios": self.coalescer.scenarios}}
+        return json.dumps(stats).encode(), "application/json"
+
+    async def simulate(self, payload, arrow):
+        params, years, discount_rate = _scenario_inputs(payload)
+        key = (arrow, canonical_key({**params, "years": years, "discount_rate": discount_rate}))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        res, summary, i = await self.coalescer.submit(params, years, discount_rate)
+        metrics = {k: v[i].item() for k, v in summary.items()}
+        metrics.update(total_prod=res["metrics"]["total_prod"][i].item(), capex=params["capex"])
+        table = res["data"][i].T
+        if arrow:
+            cols = {"Año": res["years"], **dict(zip(COLUMNAS, table))}
+            meta = {"params": json.dumps(params), "metrics": json.dumps(metrics)}
+            stream = _ArrowStream()
+            body = stream.write(pa.table(cols).replace_schema_metadata(meta)) + stream.close()
+            response = (body, ARROW_STREAM)
+        else:
+            metrics = {k: _json_list(v) for k, v in metrics.items()}
+            doc = {"params": params, "years": years, "discount_rate": discount_rate, "metrics": metrics,
+                   "table": {"Año": res["years"].tolist(), **{c: v for c, v in zip(COLUMNAS, table.tolist())}}}
+            response = (json.dumps(doc).encode(), "application/json")
+        return self.cache.put(key, response)
+
+    async def batch(self, payload, arrow):
+        scenarios = payload.get("scenarios")
+        if not isinstance(scenarios, list) or not scenarios:
+            raise HTTPError(400, "Se espera 'scenarios': lista no vacía de objetos")
+        shared = {k: payload[k] for k in ("years", "discount_rate") if k in payload}
+        inputs = [_scenario_inputs({**shared, **s}) if isinstance(s, dict) else None for s in scenarios]
+        if None in inputs:
+            raise HTTPError(400, "Cada escenario debe ser un objeto JSON")
+        if len({years for _, years, _ in inputs}) > 1:
+            raise HTTPError(400, "Todos los escenarios de un lote deben tener el mismo 'years'")
+        years = inputs[0][1]
+        params = {p: np.array([s[0][p] for s in inputs]) for p in BATCH_PARAMS}
+        rates = np.array([s[2] for s in inputs])
+        return self._rows(len(inputs), lambda lo, hi: ({p: v[lo:hi] for p, v in params.items()}, rates[lo:hi]),
+                          years, _flag(payload.get("table")), arrow)
+
+    async def sweep(self, payload, arrow):
+        spec = payload.get("grid")
+        if not isinstance(spec, dict) or not spec:
+            raise HTTPError(400, "Se espera 'grid': {parámetro: valores}")
+        unknown = sorted(set(spec) - set(BATCH_PARAMS))
+        if unknown:
+            raise HTTPError(400, f"Parámetros sin efecto en el modelo: {unknown}")
+        try:
+            grid = {p: _grid_values(v) for p, v in spec.items()}
+        except (KeyError, TypeError, ValueError) as exc:
+            raise HTTPError(400, f"Grilla inválida: {exc}")
+        if not isinstance(payload.get("fixed", {}), dict):
+            raise HTTPError(400, "'fixed' debe ser un objeto JSON")
+        fixed, years, discount_rate = _scenario_inputs({**payload.get("fixed", {}),
+                                                       **{k: payload[k] for k in ("years", "discount_rate") if k in payload}})
+        total = grid_size(grid)
+        if total > MAX_SWEEP:
+            raise HTTPError(400, f"Grilla de {total:,} escenarios (máximo {MAX_SWEEP:,})")
+
+        def chunk(lo, hi):
+            return {**{p: v for p, v in fixed.items() if p not in grid}, **grid_points(grid, lo, hi)}, discount_rate
+        return self._rows(total, chunk, years, _flag(payload.get("table")), arrow)
+
+    async def _rows(self, total, chunk_inputs, years, with_table, arrow):
+        # One row per scenario: index, inputs and summarize() metrics (+ yearly table if asked)
+        loop = asyncio.get_running_loop()
+        stream = _ArrowStream() if arrow else None
+        for lo in range(0, total, self.chunk_size):
+            hi = min(lo + self.chunk_size, total)
+            params, rates = chunk_inputs(lo, hi)
+            res = await loop.run_in_executor(None, lambda: run_batch(**params, years=years, discount_rate=rates))
+            cols = {"scenario": np.arange(lo, hi)}
+            cols.update({p: np.broadcast_to(np.asarray(v, dtype=float), (hi - lo,)) for p, v in params.items()})
+            cols.update(summarize(res))
+            if arrow:
+                table = pa.table(cols)
+                if with_table:
+                    table = table.append_column("table", pa.FixedShapeTensorArray.from_numpy_ndarray(
+                        np.ascontiguousarray(res["data"])))
+                yield stream.write(table)
+            else:
+                lists = {k: _json_list(v) for k, v in cols.items()}
+                if with_table:
+                    lists["table"] = [dict(zip(COLUMNAS, m)) for m in res["data"].transpose(0, 2, 1).tolist()]
+                keys = list(lists)
+                yield "".join(json.dumps(dict(zip(keys, row))) + "\n" for row in zip(*lists.values())).encode()
+        if arrow:
+            yield stream.close()
+
+
+async def serve(host="127.0.0.1", port=8765, **options):
+    service = FerpaService(**options)
+    server = await asyncio.start_server(service.handle, host, port)
+    return service, server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP del modelo FERPA (escenario, lote y barrido).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--window-ms", type=float, default=2.0, help="ventana de agrupación de escenarios")
+    parser.add_argument("--max-batch", type=int, default=1024)
+    parser.add_argument("--cache-entries", type=int, default=4096)
+    args = parser.parse_args(argv)
+
+    async def run():
+        _, server = await serve(args.host, args.port, window=args.window_ms / 1000, max_batch=args.max_batch,
+                                cache_entries=args.cache_entries)
+        print(f"FERPA service en http://{args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
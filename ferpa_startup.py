@@ -0,0 +1,186 @@
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SCENARIO_PATH = os.path.join(HERE, "default_scenario.json")
+# A precomputed scenario is only valid for the model code that produced it
+MODEL_SOURCES = ["ferpa_logic.py", "ferpa_debt.py", "ferpa_config.py", "ferpa_irr.py", "ferpa_stages.py"]
+# Modules whose cold import cost the startup report measures
+HEAVY_MODULES = ["streamlit", "numpy", "pandas", "plotly.graph_objects", "plotly.express", "numpy_financial",
+                 "scipy.stats", "scipy.optimize", "statsmodels.api", "streamlit_extras", "pyarrow.dataset",
+                 "pyarrow.parquet", "openpyxl"]
+
+# app.py simulate() inputs at the sidebar's initial values (tax and inflation already as fractions)
+SIDEBAR_DEFAULTS = {
+    "t_dia": 300, "p_base_bloque": 0.55, "p_tipping": 15.0, "p_recic": 120.0, "p_bono_co2": 15.0,
+    "p_bono_agua": 10.0, "capex": 10000000, "interest_rate": 0.08, "tax_rate": 0.30, "inflation": 0.03,
+    "roi_target": 3, "debt_share": 0.0, "debt_tenor": 7, "debt_grace": 1, "debt_profile": "annuity",
+    "debt_dscr": 1.3, "lockup_dscr": 1.2, "cash_sweep": 0.0,
+}
+
+
+class StartupClock:
+    """Cold-start timeline of the process: phase marks and the imports deferred by lazy().
+
+    Times are ms since this module was imported (the first line of both dashboards).
+    Streamlit reruns the script on every interaction; only the first occurrence of each
+    phase is kept, so the report describes the cold start.
+    """
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.phases = {}
+        self.imports = []
+        self._lock = threading.Lock()
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.t0) * 1e3
+
+    def mark(self, phase):
+        with self._lock:
+            self.phases.setdefault(phase, self.elapsed_ms())
+
+    def load(self, name):
+        t0 = time.perf_counter()
+        module = importlib.import_module(name)
+        with self._lock:
+            self.imports.append({"module": name, "at_ms": (t0 - self.t0) * 1e3,
+                                 "ms": (time.perf_counter() - t0) * 1e3})
+        return module
+
+    def report(self):
+        """(phases, deferred imports) as DataFrames."""
+        import pandas as pd
+        with self._lock:
+            phases = pd.DataFrame({"fase": list(self.phases), "ms": list(self.phases.values())})
+            imports = pd.DataFrame(self.imports, columns=["module", "at_ms", "ms"])
+        return phases, imports
+
+    def render_panel(self):
+        """Streamlit panel: cold-start phases, deferred imports and a cold import measurement."""
+        import streamlit as st
+        with st.expander("🚀 Arranque en frío", expanded=False):
+            phases, imports = self.report()
+            st.dataframe(phases.style.format({"ms": "{:,.1f}"}), hide_index=True, use_container_width=True)
+            st.caption("Importaciones diferidas (cargadas al primer uso)")
+            st.dataframe(imports.style.format({"at_ms": "{:,.1f}", "ms": "{:,.1f}"}), hide_index=True,
+                         use_container_width=True)
+            if st.button("Medir costo de importación por módulo"):
+                st.dataframe(import_costs().style.format({"self_ms": "{:,.1f}", "cumulative_ms": "{:,.1f}"}),
+                             hide_index=True, use_container_width=True)
+
+
+class LazyModule:
+    """Stand-in for a module that imports it on first attribute access (timed by STARTUP)."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = STARTUP.load(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}{' (loaded)' if self._module is not None else ''}>"
+
+
+def lazy(name):
+    """`name` itself if already imported, otherwise a LazyModule for it."""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def import_costs(modules=HEAVY_MODULES):
+    """Cold import cost of each module, measured alone in a fresh interpreter (-X importtime).
+
+    self_ms is the module's own body, cumulative_ms includes everything it pulled in;
+    modules that are not installed are reported with NaN.
+    """
+    import pandas as pd
+    rows = []
+    for name in modules:
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {name}"], capture_output=True,
+                              text=True, cwd=HERE)
+        row = {"module": name, "self_ms": float("nan"), "cumulative_ms": float("nan")}
+        if proc.returncode == 0:
+            for line in proc.stderr.splitlines():
+                m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)", line)
+                if m and m.group(4) == name:
+                    row.update(self_ms=int(m.group(1)) / 1e3, cumulative_ms=int(m.group(2)) / 1e3)
+        rows.append(row)
+    return pd.DataFrame(rows).sort_values("cumulative_ms", ascending=False, ignore_index=True)
+
+
+def model_version():
+    """Content hash of the model sources a precomputed scenario depends on."""
+    h = hashlib.blake2b(digest_size=16)
+    for name in MODEL_SOURCES:
+        with open(os.path.join(HERE, name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def precompute_default(path=DEFAULT_SCENARIO_PATH, plan=None):
+    """Evaluate SIDEBAR_DEFAULTS under `plan` and write it for load_default() (build step)."""
+    from ferpa_config import DEFAULT_PLAN, compile_config
+    from ferpa_logic import BATCH_PARAMS, batch_result, run_batch
+    plan = DEFAULT_PLAN if plan is None else compile_config(plan)
+    # Unlevered at the sidebar defaults (debt_share 0), like app.py's simulate()
+    inputs = {k: SIDEBAR_DEFAULTS[k] for k in BATCH_PARAMS + ["interest_rate", "roi_target"]}
+    res = batch_result(run_batch(**inputs, plan=plan), 0)
+    doc = {"version": model_version(), "plan": plan.key, "params": SIDEBAR_DEFAULTS,
+           "years": res.years.tolist(), "columns": res.columns, "values": res.values.tolist(),
+           "metrics": res.metrics}
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def load_default(plan, path=DEFAULT_SCENARIO_PATH):
+    """(params, SimulationResult) precomputed for `plan`, or None if missing or stale."""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        doc = json.load(f)
+    if doc.get("plan") != plan.key or doc.get("version") != model_version():
+        return None
+    import numpy as np
+    from ferpa_logic import COLUMNAS, SimulationResult
+    columns = COLUMNAS if doc["columns"] == COLUMNAS else doc["columns"]
+    return doc["params"], SimulationResult(np.array(doc["years"]), np.array(doc["values"]), doc["metrics"], columns)
+
+
+# One clock per process, started by the first import (the first line of both dashboards)
+STARTUP = StartupClock()
+
+
+def main(argv=None):
+    # python ferpa_startup.py precompute      (image build: ship default_scenario.json)
+    # python ferpa_startup.py report
+    parser = argparse.ArgumentParser(description="Arranque rápido de los tableros FERPA.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    pre = sub.add_parser("precompute", help="precalcula el escenario por defecto del sidebar")
+    pre.add_argument("--out", default=DEFAULT_SCENARIO_PATH)
+    pre.add_argument("--config", default=None, help="configuración JSON/YAML del modelo")
+    rep = sub.add_parser("report", help="costo de importación en frío por módulo")
+    rep.add_argument("modules", nargs="*", default=HEAVY_MODULES)
+    args = parser.parse_args(argv)
+
+    if args.cmd == "precompute":
+        print(precompute_default(args.out, args.config))
+    else:
+        print(import_costs(args.modules).to_string(index=False, float_format=lambda v: f"{v:,.1f}"))
+
+
+if __name__ == "__main__":
+    main()
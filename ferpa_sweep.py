@@ -0,0 +1,201 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from ferpa_config import DEFAULT_PLAN, compile_config
+from ferpa_debt import debt_scenarios
+from ferpa_goalseek import payback_years
+from ferpa_logic import BATCH_PARAMS, COLUMNAS, DEFAULT_PARAMS, SIDEBAR_RANGES, run_batch
+
+MANIFEST = "sweep.json"
+# Per-scenario metrics of every part, besides the swept parameters (see summarize)
+METRIC_COLUMNS = ["irr", "npv", "payback", "ebitda_y1", "ebitda_mean", "caja_min", "investor_total"]
+
+
+def sidebar_grid(points, params=None):
+    """Evenly spaced grid over the sidebar range of each param (`points`: int or dict param -> int)."""
+    params = params or list(SIDEBAR_RANGES)
+    counts = points if isinstance(points, dict) else dict.fromkeys(params, points)
+    return {p: np.linspace(*SIDEBAR_RANGES[p], counts[p]).tolist() for p in params}
+
+
+def grid_size(grid):
+    return int(np.prod([len(v) for v in grid.values()], dtype=np.int64))
+
+
+def grid_points(grid, start, stop):
+    """Parameter arrays for linear indices [start, stop) of the Cartesian product, without materializing it."""
+    names = list(grid)
+    idx = np.unravel_index(np.arange(start, stop), [len(grid[n]) for n in names])
+    return {n: np.asarray(grid[n], dtype=float)[i] for n, i in zip(names, idx)}
+
+
+def _chunk_path(out_dir, chunk):
+    return os.path.join(out_dir, f"part-{chunk:06d}.parquet")
+
+
+def summarize(res):
+    """Per-scenario summary metrics of a run_batch result (the columns of every sweep part)."""
+    data = res["data"]
+    return {
+        "irr": res["metrics"]["irr"],
+        "irr_converged": res["metrics"]["irr_converged"],
+        "npv": res["metrics"]["npv"],
+        "payback": payback_years(res),
+        "ebitda_y1": data[:, 0, COLUMNAS.index("EBITDA")],
+        "ebitda_mean": data[:, :, COLUMNAS.index("EBITDA")].mean(axis=1),
+        "caja_min": data[:, :, COLUMNAS.index("Caja_Ferpa")].min(axis=1),
+        "investor_total": data[:, :, COLUMNAS.index("Flujo_Investor_Total")].sum(axis=1),
+    }
+
+
+def run_chunk(spec, chunk, plan=None):
+    """Evaluate one chunk and write it atomically as part-NNNNNN.parquet; returns (chunk, scenarios)."""
+    grid, fixed = spec["grid"], spec["fixed"]
+    start = chunk * spec["chunk_size"]
+    stop = min(start + spec["chunk_size"], spec["total"])
+    varied = grid_points(grid, start, stop)
+    res = run_batch(**{**fixed, **varied}, years=spec["years"], discount_rate=spec["discount_rate"], plan=plan,
+                    interest_rate=spec.get("interest_rate", 0.0), debt=spec.get("debt"))
+    cols = {"scenario": np.arange(start, stop, dtype=np.int64)}
+    cols.update(varied)
+    cols.update(summarize(res))
+    path = _chunk_path(spec["out_dir"], chunk)
+    pq.write_table(pa.table(cols), path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return chunk, stop - start
+
+
+def run_sweep(grid, out_dir, fixed=None, chunk_size=50_000, workers=None, years=10, discount_rate=0.12,
+              progress=None, plan=None, interest_rate=0.0, debt=None):
+    """Sweep the Cartesian product of `grid` (param -> values) across a process pool.
+
+    Parameters not in `grid` take `fixed` (default: app.py sidebar defaults). `plan`
+    (ModelPlan, config dict or path) and the JSON-able `debt` structure of ferpa_debt,
+    with scalar terms, apply to every scenario. Chunks already present in `out_dir` are
+    skipped, so an interrupted sweep resumes where it stopped; resuming with a different
+    grid, plan or financing is refused. Returns run statistics including throughput in
+    scenarios per second.
+    """
+    unknown = [p for p in grid if p not in BATCH_PARAMS]
+    if unknown:
+        raise ValueError(f"Parámetros sin efecto en el modelo: {unknown}")
+    if debt is not None and debt_scenarios(debt, interest_rate) != 1:
+        raise ValueError("Un barrido aplica la misma deuda a todos los escenarios: use términos escalares")
+    plan = DEFAULT_PLAN if plan is None else compile_config(plan)
+    fixed = {p: v for p, v in {**DEFAULT_PARAMS, **(fixed or {})}.items() if p not in grid}
+    grid = {p: [float(v) for v in values] for p, values in grid.items()}
+    total = grid_size(grid)
+    spec = {"grid": grid, "fixed": fixed, "total": total, "chunk_size": chunk_size, "years": years,
+            "discount_rate": discount_rate, "plan": plan.key}
+    # Financing only enters the key when there is debt, like ferpa_scenarios.scenario_id
+    if debt is not None:
+        spec.update(interest_rate=float(interest_rate), debt=debt)
+    key = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            if json.load(f)["key"] != key:
+                raise ValueError(f"{out_dir} contiene otro barrido; use un directorio nuevo")
+    else:
+        with open(manifest_path, "w") as f:
+            json.dump({"key": key, **spec}, f, indent=2)
+
+    n_chunks = -(-total // chunk_size)
+    pending = [c for c in range(n_chunks) if not os.path.exists(_chunk_path(out_dir, c))]
+    spec["out_dir"] = out_dir
+    workers = workers or os.cpu_count() or 1
+
+    t0 = time.perf_counter()
+    done = 0
+    if workers == 1:
+        results = (run_chunk(spec, c, plan) for c in pending)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = (f.result() for f in as_completed([pool.submit(run_chunk, spec, c, plan) for c in pending]))
+    try:
+        for k, (chunk, count) in enumerate(results, 1):
+            done += count
+            if progress:
+                elapsed = time.perf_counter() - t0
+                progress(f"chunk {chunk} ({k}/{len(pending)}) · {done / elapsed:,.0f} escenarios/s")
+    finally:
+        if workers != 1:
+            pool.shutdown(cancel_futures=True)
+    elapsed = time.perf_counter() - t0
+    return {"scenarios": total, "computed": done, "chunks": n_chunks, "skipped_chunks": n_chunks - len(pending),
+            "seconds": elapsed, "scenarios_per_sec": done / elapsed if elapsed > 0 else float("nan"),
+            "workers": workers}
+
+
+def load_sweep(out_dir, columns=None, filter=None):
+    """Read the finished chunks of a sweep as a pyarrow Table (columns/filter pushed down)."""
+    parts = sorted(glob.glob(os.path.join(out_dir, "part-*.parquet")))
+    return ds.dataset(parts, format="parquet").to_table(columns=columns, filter=filter)
+
+
+def sweep_columns(out_dir):
+    """Swept parameters and per-scenario metrics of a sweep directory, in that order."""
+    with open(os.path.join(out_dir, MANIFEST)) as f:
+        return list(json.load(f)["grid"]) + METRIC_COLUMNS
+
+
+def _parse_values(text):
+    # "start:stop:num" -> linspace, otherwise a comma-separated list
+    if ":" in text:
+        start, stop, num = text.split(":")
+        return np.linspace(float(start), float(stop), int(num)).tolist()
+    return [float(v) for v in text.split(",")]
+
+
+def main(argv=None):
+    # python ferpa_sweep.py sweeps/run1 --t_dia 100:500:41 --capex 5e6:20e6:16 --tax_rate 0,0.15,0.30
+    # python ferpa_sweep.py sweeps/full --sidebar 6 --workers 16
+    parser = argparse.ArgumentParser(description="Barrido en paralelo del modelo FERPA sobre una grilla cartesiana.")
+    parser.add_argument("out_dir")
+    for p in BATCH_PARAMS:
+        parser.add_argument(f"--{p}", type=_parse_values, help="inicio:fin:n o lista v1,v2,...")
+    parser.add_argument("--sidebar", type=int, default=None, metavar="N",
+                        help="barrer con N puntos el rango del sidebar de cada parámetro no indicado")
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--discount-rate", type=float, default=0.12)
+    parser.add_argument("--config", default=None, help="configuración JSON/YAML del modelo")
+    parser.add_argument("--debt", default=None, help="estructura de deuda JSON (ferpa_debt), texto o archivo")
+    parser.add_argument("--interest-rate", type=float, default=0.0, help="tasa de los tramos sin 'rate'")
+    args = parser.parse_args(argv)
+
+    grid = {p: getattr(args, p) for p in BATCH_PARAMS if getattr(args, p) is not None}
+    if args.sidebar:
+        grid = {**sidebar_grid(args.sidebar, [p for p in BATCH_PARAMS if p not in grid]), **grid}
+    if not grid:
+        parser.error("indique al menos un parámetro a barrer")
+    debt = None
+    if args.debt:
+        if os.path.exists(args.debt):
+            with open(args.debt, encoding="utf-8") as f:
+                debt = json.load(f)
+        else:
+            debt = json.loads(args.debt)
+    stats = run_sweep(grid, args.out_dir, chunk_size=args.chunk_size, workers=args.workers, years=args.years,
+                      discount_rate=args.discount_rate, progress=print, plan=args.config,
+                      interest_rate=args.interest_rate, debt=debt)
+    print(f"{stats['computed']:,} de {stats['scenarios']:,} escenarios en {stats['seconds']:.1f} s "
+          f"({stats['scenarios_per_sec']:,.0f} escenarios/s, {stats['workers']} procesos, "
+          f"{stats['skipped_chunks']} chunks reanudados)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import numpy as np
+import numpy_financial as npf
+import pandas as pd
+
+from ferpa_logic import COLUMNAS, SimuladorFerpaV5, batch_result, run_batch
+
+MIX = [("Bloque #5", 0.70, 1.0), ("Adoquín Pesado", 0.20, 1.3), ("Ladrillo Decorativo", 0.10, 1.6)]
+
+
+def reference_run(t_dia, p_base_bloque, p_tipping, p_recic, p_bono_co2, p_bono_agua, capex, tax_rate, inflation,
+                  years=10, discount_rate=0.12):
+    """The original per-year loop of SimuladorFerpaV5.run_simulation (default config), one scenario."""
+    ton_input = t_dia * 365
+    total_units = ton_input * 0.87 * 1.4 * 380
+    rows = []
+    saldo = capex
+    for i in range(1, years + 1):
+        inf_index = (1 + inflation) ** (i - 1)
+        rev_bloques = total_units * sum([s * f for _, s, f in MIX]) * p_base_bloque * inf_index
+        detail = {name: total_units * s * (p_base_bloque * f * inf_index) for name, s, f in MIX}
+        rev_recic = ton_input * 0.13 * p_recic * inf_index
+        rev_tip = ton_input * p_tipping * inf_index
+        rev_green = (ton_input * 1.5 * p_bono_co2 * inf_index) + (ton_input * 0.4 * p_bono_agua * inf_index)
+        energy, payroll = 500000 * inf_index, 1500000 * inf_index
+        variable = max(rev_bloques * 0.45 - energy - payroll, 0)
+        opex = energy + payroll + variable
+        ingresos = rev_bloques + rev_recic + rev_tip + rev_green
+        ebitda = ingresos - opex
+        deprec = capex / 10
+        taxes = max(0, (ebitda - deprec) * tax_rate)
+        net = ebitda - deprec - taxes
+        ret = {1: capex * 0.5, 2: capex * 0.5}.get(i, 0)
+        remanente = net + deprec - ret
+        dividend = remanente * 0.30 if remanente > 0 else 0
+        saldo = max(saldo - ret, 0)
+        rows.append({"Ingresos": ingresos, "Rev_Bloques": rev_bloques, "Rev_Recic": rev_recic, "Rev_Tipping": rev_tip,
+                     "Rev_Bonos": rev_green, "OPEX_Total": opex, "Cost_Energy": energy, "Cost_Payroll": payroll,
+                     "Cost_Variable": variable, "EBITDA": ebitda, "Deprec": deprec, "Impuestos": taxes,
+                     "Utilidad_Neta": net, "Flujo_Operativo": net + deprec, "Pago_Retorno_Capital": ret,
+                     "Pago_Dividendos": dividend, "Caja_Ferpa": remanente - dividend, "Saldo_Inversion": saldo,
+                     "Flujo_Investor_Total": ret + dividend, "Unidades_Total": total_units, **detail})
+    df = pd.DataFrame(rows)
+    flows = [-capex] + df["Flujo_Investor_Total"].tolist()
+    return df[COLUMNAS].to_numpy(), npf.irr(flows), npf.npv(discount_rate, flows)
+
+
+def random_inputs(n, seed=0):
+    # Wide enough to hit the tax floor, the variable-cost clamp and the dividend gate
+    rng = np.random.default_rng(seed)
+    return {
+        "t_dia": rng.uniform(20, 600, n), "p_base_bloque": rng.uniform(0.05, 1.2, n),
+        "p_tipping": rng.uniform(0, 40, n), "p_recic": rng.uniform(0, 200, n), "p_bono_co2": rng.uniform(0, 30, n),
+        "p_bono_agua": rng.uniform(0, 20, n), "capex": rng.uniform(2e6, 40e6, n), "tax_rate": rng.uniform(0, 0.4, n),
+        "inflation": rng.uniform(-0.02, 0.10, n),
+    }
+
+
+def test_run_batch_matches_original_loop():
+    inputs = random_inputs(200)
+    res = run_batch(**inputs)
+    taxes, dividends = res["data"][..., COLUMNAS.index("Impuestos")], res["data"][..., COLUMNAS.index("Pago_Dividendos")]
+    assert (taxes == 0).any() and (dividends == 0).any() and (res["data"][..., COLUMNAS.index("Cost_Variable")] == 0).any()
+    for i in range(200):
+        data, irr, npv = reference_run(**{p: v[i] for p, v in inputs.items()})
+        np.testing.assert_allclose(res["data"][i], data, rtol=1e-12, atol=1e-6)
+        np.testing.assert_allclose(res["metrics"]["npv"][i], npv, rtol=1e-10)
+        if np.isfinite(irr):
+            np.testing.assert_allclose(res["metrics"]["irr"][i], irr, rtol=1e-9, atol=1e-12)
+
+
+def test_run_batch_matches_run_simulation():
+    inputs = random_inputs(50, seed=1)
+    res = run_batch(**inputs, years=12, discount_rate=0.1, start_year=2030)
+    for i in range(50):
+        sim = SimuladorFerpaV5(**{p: v[i] for p, v in inputs.items()}, interest_rate=0.0, roi_target=None)
+        single = sim.run_simulation(years=12, discount_rate=0.1, start_year=2030)
+        pd.testing.assert_frame_equal(single["df"], batch_result(res, i)["df"])
+        assert single["metrics"] == batch_result(res, i)["metrics"]
@@ -0,0 +1,43 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from ferpa_columnar import SHEETS, load_workbook
+
+
+def write_workbook(path, scale=1.0):
+    frame = pd.DataFrame({"Año": np.arange(2025, 2035), "Valor": scale * np.arange(10.0)})
+    with pd.ExcelWriter(path) as book:
+        for name, header in SHEETS.items():
+            frame.to_excel(book, sheet_name=name, startrow=header, index=False)
+
+
+def test_roundtrip_and_refresh(tmp_path):
+    xlsx, cache = str(tmp_path / "book.xlsx"), str(tmp_path / "cache")
+    write_workbook(xlsx)
+    first = load_workbook(xlsx, cache)
+    assert list(first["DATA_POWERBI"]["Valor"]) == list(np.arange(10.0))
+    assert all(first[name] is not None for name in SHEETS)
+    write_workbook(xlsx, scale=2.0)
+    assert load_workbook(xlsx, cache)["ESTADO_RESULTADOS"]["Valor"].iloc[-1] == 18.0
+
+
+def test_concurrent_sessions_convert_safely(tmp_path):
+    xlsx, cache = str(tmp_path / "book.xlsx"), str(tmp_path / "cache")
+    write_workbook(xlsx)
+    errors, results = [], []
+
+    def session():
+        try:
+            results.append(load_workbook(xlsx, cache)["FLUJO_CAJA_LIBRE"]["Valor"].sum())
+        except Exception as exc:
+            errors.append(exc)
+    threads = [threading.Thread(target=session) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors and results == [45.0] * 8
+    assert not [f for f in os.listdir(cache) if f.endswith(".tmp")]
@@ -0,0 +1,36 @@
+import copy
+
+import numpy as np
+import pytest
+
+from ferpa_config import DEFAULT_PLAN, ModelPlan
+from ferpa_logic import COLUMNAS, DEFAULT_PARAMS, run_batch
+
+
+def config_with(**opex):
+    config = copy.deepcopy(DEFAULT_PLAN.config)
+    config["opex"].update(opex)
+    return config
+
+
+def test_fixed_lines_keep_their_names_and_sum_per_column():
+    plan = ModelPlan(config_with(fixed=[{"name": "Energía", "column": "Cost_Energy", "amount": 700000},
+                                        {"name": "Nómina", "column": "Cost_Payroll", "amount": 1200000},
+                                        {"name": "Seguros", "column": "Cost_Payroll", "amount": 300000}]))
+    assert plan.fixed_lines == [("Energía", "Cost_Energy", 700000.0), ("Nómina", "Cost_Payroll", 1200000.0),
+                                ("Seguros", "Cost_Payroll", 300000.0)]
+    assert plan.fixed_costs == {"Cost_Energy": 700000.0, "Cost_Payroll": 1500000.0}
+    data = run_batch(**DEFAULT_PARAMS, plan=plan)["data"][0]
+    np.testing.assert_allclose(data[0, COLUMNAS.index("Cost_Payroll")], 1500000.0)
+
+
+def test_opex_share_comes_from_the_config():
+    plan = ModelPlan(config_with(pct_rev_bloques=0.40))
+    data = run_batch(**DEFAULT_PARAMS, plan=plan)["data"][0]
+    np.testing.assert_allclose(data[:, COLUMNAS.index("OPEX_Total")], 0.40 * data[:, COLUMNAS.index("Rev_Bloques")])
+
+
+def test_repeated_fixed_line_names_are_rejected():
+    lines = [{"name": "Energía", "column": "Cost_Energy", "amount": 1.0}] * 2
+    with pytest.raises(ValueError):
+        ModelPlan(config_with(fixed=lines))
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from ferpa_logic import DEFAULT_PARAMS, SimuladorFerpaV5, run_batch
+from ferpa_portfolio import run_portfolio
+
+# A plant whose cash flow does not cover its debt at once, so schedules bind
+TIGHT = dict(DEFAULT_PARAMS, t_dia=120, capex=25e6)
+
+
+def random_inputs(n, seed):
+    rng = np.random.default_rng(seed)
+    return {
+        "t_dia": rng.uniform(20, 600, n), "p_base_bloque": rng.uniform(0.05, 1.2, n),
+        "p_tipping": rng.uniform(0, 40, n), "p_recic": rng.uniform(0, 200, n), "p_bono_co2": rng.uniform(0, 30, n),
+        "p_bono_agua": rng.uniform(0, 20, n), "capex": rng.uniform(2e6, 40e6, n), "tax_rate": rng.uniform(0, 0.4, n),
+        "inflation": rng.uniform(-0.02, 0.10, n),
+    }
+
+
+def test_zero_debt_equals_unlevered():
+    inputs = random_inputs(40, seed=3)
+    base = run_batch(**inputs)
+    for debt in ({"tranches": [{"share": 0.0}]}, [{"amount": 0.0, "profile": "bullet"}]):
+        levered = run_batch(**inputs, debt=debt, interest_rate=0.08)
+        np.testing.assert_allclose(levered["data"], base["data"], rtol=1e-12, atol=1e-6)
+        np.testing.assert_allclose(levered["metrics"]["npv"], base["metrics"]["npv"], rtol=1e-12)
+        np.testing.assert_allclose(levered["metrics"]["irr"], base["metrics"]["irr"], rtol=1e-10)
+        assert base["debt"] is None and levered["debt"] is not None
+
+
+@pytest.mark.parametrize("profile", ["annuity", "linear", "sculpted", "bullet"])
+@pytest.mark.parametrize("params", [DEFAULT_PARAMS, TIGHT])
+def test_balances_amortize_to_zero_by_tenor(profile, params):
+    debt = {"tranches": [{"share": 0.5, "tenor": 6, "grace": 1, "rate": 0.09, "profile": profile}]}
+    sched = run_batch(**params, debt=debt)["debt"]
+    balance = sched["Saldo_Deuda"][0, 0]
+    assert (balance[:5] >= 0).all() and balance[5] == pytest.approx(0.0, abs=1e-6)
+    assert np.allclose(balance[5:], 0.0) and np.allclose(sched["Amortizacion"][0, 0, 6:], 0.0)
+    np.testing.assert_allclose(sched["Amortizacion"][0, 0].sum() + sched["Prepago"][0, 0].sum(), 0.5 * params["capex"])
+
+
+def test_sculpted_service_holds_the_target_dscr():
+    debt = {"tranches": [{"share": 0.6, "tenor": 10, "rate": 0.08, "profile": "sculpted", "dscr": 1.3}]}
+    sched = run_batch(**TIGHT, debt=debt)["debt"]
+    # Before the last repayment the sculpted principal is exactly what CFADS / dscr allows
+    still_owed = sched["Saldo_Deuda"][0, 0] > 0
+    assert still_owed.sum() >= 2
+    np.testing.assert_allclose(sched["DSCR"][0, still_owed], 1.3, rtol=1e-12)
+
+
+def test_sweep_prepays_in_seniority_order():
+    debt = {"tranches": [{"share": 0.3, "tenor": 8, "rate": 0.08, "profile": "bullet"},
+                         {"share": 0.3, "tenor": 9, "rate": 0.10}], "sweep": 0.5}
+    sched = run_batch(**TIGHT, debt=debt)["debt"]
+    prepay, balance = sched["Prepago"][0], sched["Saldo_Deuda"][0]
+    assert prepay[0].sum() > 0 and prepay[1].sum() > 0
+    # The junior tranche is only prepaid in years that leave the senior one repaid
+    junior_years = prepay[1] > 0
+    np.testing.assert_allclose(balance[0, junior_years], 0.0, atol=1e-6)
+
+
+def test_monthly_mode_refuses_debt():
+    sim = SimuladorFerpaV5(**DEFAULT_PARAMS, interest_rate=0.08, roi_target=None, debt=[{"share": 0.6}])
+    with pytest.raises(ValueError):
+        sim.run_monthly(years=5)
+
+
+def test_portfolio_carries_financing():
+    plants = [dict(DEFAULT_PARAMS, start_year=2025), dict(DEFAULT_PARAMS, start_year=2027)]
+    debt = {"tranches": [{"share": 0.6, "tenor": 8}]}
+    levered = run_portfolio(plants, horizon=10, interest_rate=0.08, debt=debt)
+    single = run_batch(**DEFAULT_PARAMS, interest_rate=0.08, debt=debt)
+    np.testing.assert_array_equal(levered["plants"][0], single["data"][0])
+    assert levered["flows"][0, 0] == -single["metrics"]["equity"][0]
+    assert levered["metrics"]["npv"] != run_portfolio(plants, horizon=10)["metrics"]["npv"]
@@ -0,0 +1,24 @@
+import numpy as np
+
+from ferpa_density import DensityGrid
+
+
+def test_base_view_equals_points_view():
+    rng = np.random.default_rng(11)
+    x, y = rng.normal(size=50_000), rng.uniform(-3, 5, 50_000)
+    z = x * y + rng.normal(size=50_000)
+    aligned = DensityGrid(x, y, z, base_bins=64)
+    # 63 base cells never line up with these windows, so the same view is re-binned from the points
+    unaligned = DensityGrid(x, y, z, base_bins=63)
+    (x0, x1), (y0, y1) = aligned.x_extent, aligned.y_extent
+    wx, wy = (x1 - x0) / 64, (y1 - y0) / 64
+    windows = [(None, None, 16), ((x0 + 16 * wx, x0 + 48 * wx), (y0 + 8 * wy, y0 + 40 * wy), 8)]
+    for x_range, y_range, bins in windows:
+        base = aligned.view(x_range, y_range, bins)
+        points = unaligned.view(x_range, y_range, bins)
+        assert base["source"] == "base" and points["source"] == "points"
+        np.testing.assert_allclose(base["x_edges"], points["x_edges"], rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(base["y_edges"], points["y_edges"], rtol=1e-12, atol=1e-12)
+        np.testing.assert_array_equal(base["counts"], points["counts"])
+        np.testing.assert_allclose(base["mean"], points["mean"], rtol=1e-9, atol=1e-12)
+        assert base["points"] == points["points"] > 0
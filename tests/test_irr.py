@@ -0,0 +1,40 @@
+import numpy as np
+import numpy_financial as npf
+
+from ferpa_irr import solve_irr
+
+
+def test_solve_irr_matches_numpy_financial():
+    rng = np.random.default_rng(2)
+    flows = np.column_stack([-rng.uniform(1e6, 2e7, 300), rng.uniform(-1e6, 6e6, (300, 10))])
+    flows[:20, 1:] = np.abs(flows[:20, 1:])
+    out = solve_irr(flows)
+    for row, irr in zip(flows, out["irr"]):
+        expected = npf.irr(row)
+        if np.isnan(expected):
+            assert np.isnan(irr)
+        else:
+            np.testing.assert_allclose(irr, expected, rtol=1e-9, atol=1e-12)
+
+
+def test_single_row_matches_vectorized_path():
+    rng = np.random.default_rng(5)
+    flows = np.column_stack([-rng.uniform(1e6, 2e7, 200), rng.uniform(-1e6, 6e6, (200, 10))])
+    flows[:20, 1:] = np.abs(flows[:20, 1:])
+    flows[20:25, 0] = 0.0
+    flows[25:30] = np.abs(flows[25:30])
+    batch = solve_irr(flows)
+    for i, row in enumerate(flows):
+        single = solve_irr(row)
+        np.testing.assert_array_equal(single["irr"], batch["irr"][i:i + 1])
+        np.testing.assert_array_equal(single["converged"], batch["converged"][i:i + 1])
+        np.testing.assert_array_equal(single["sign_changes"], batch["sign_changes"][i:i + 1])
+
+
+def test_several_sign_changes_keep_numpy_financial_root():
+    # Roots at 10% and 20%: npf.irr picks the one closest to zero
+    flows = np.array([-1.0, 2.3, -1.32])
+    for out in (solve_irr(flows), solve_irr(np.vstack([flows, [-1.0, 1.1, 0.0]]))):
+        assert out["sign_changes"][0] == 2
+        np.testing.assert_allclose(out["irr"][0], npf.irr(flows), rtol=1e-12)
+        np.testing.assert_allclose(out["irr"][0], 0.1, rtol=1e-9)
@@ -0,0 +1,36 @@
+import numpy as np
+
+from ferpa_montecarlo import QuantileSketch
+
+Q = np.linspace(0.01, 0.99, 99)
+
+
+def rank_errors(sketch, data):
+    # |rank(returned quantile) / n - q| for every q and column
+    values = sketch.quantile(Q)
+    ranks = np.column_stack([np.searchsorted(np.sort(data[:, j]), values[:, j], side="right")
+                             for j in range(data.shape[1])])
+    return np.abs(ranks / len(data) - Q[:, None])
+
+
+def test_quantiles_within_rank_error():
+    rng = np.random.default_rng(7)
+    data = np.column_stack([rng.standard_normal(300_000), rng.exponential(size=300_000)])
+    sketch = QuantileSketch(2, k=256)
+    for chunk in np.array_split(data, 37):
+        sketch.update(chunk)
+    assert sketch.n == len(data) and len(sketch.levels) > 5
+    assert rank_errors(sketch, data).max() <= sketch.rank_error
+
+
+def test_merged_quantiles_within_rank_error():
+    rng = np.random.default_rng(8)
+    data = rng.lognormal(size=(200_000, 1))
+    parts = [QuantileSketch(1, k=128) for _ in range(4)]
+    for part, chunk in zip(parts, np.array_split(data, 4)):
+        part.update(chunk)
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert merged.n == len(data)
+    assert rank_errors(merged, data).max() <= merged.rank_error
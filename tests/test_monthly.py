@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from ferpa_logic import COLUMNAS, DEFAULT_PARAMS, SimuladorFerpaV5
+
+
+def simulator(**params):
+    return SimuladorFerpaV5(**{**DEFAULT_PARAMS, **params}, interest_rate=0.0, roi_target=None)
+
+
+def test_flat_monthly_run_reproduces_the_annual_model():
+    sim = simulator(inflation=0.05, tax_rate=0.25)
+    annual = sim.run_simulation(years=12)
+    monthly = sim.run_monthly(years=12)
+    np.testing.assert_allclose(monthly["df"][COLUMNAS].to_numpy(), annual["df"][COLUMNAS].to_numpy(),
+                               rtol=1e-12, atol=1e-6)
+    assert list(monthly["df"]["Año"]) == list(annual["df"]["Año"])
+    np.testing.assert_allclose(monthly["metrics"]["total_prod"], annual["metrics"]["total_prod"], rtol=1e-12)
+
+
+def test_frames_are_built_on_first_use():
+    res = simulator().run_monthly(years=3, ramp=4, dso_days=30)
+    assert res._df is None and res._monthly is None
+    monthly = res["monthly"]
+    assert isinstance(monthly.index, pd.PeriodIndex) and len(monthly) == 36
+    np.testing.assert_array_equal(monthly["EBITDA"].to_numpy(), res["EBITDA"])
+    assert res["df"] is res["df"]
+    np.testing.assert_allclose(res["df"]["Utilizacion"].iloc[0], np.r_[np.arange(1, 5) / 4, np.ones(8)].mean())
+
+
+def test_working_capital_delays_cash_not_profit():
+    base, lagged = simulator().run_monthly(years=5), simulator().run_monthly(years=5, dso_days=60)
+    np.testing.assert_allclose(lagged["Utilidad_Neta"], base["Utilidad_Neta"])
+    assert lagged["Flujo_Caja"][0] < base["Flujo_Caja"][0]
+    assert lagged["metrics"]["npv"] < base["metrics"]["npv"]
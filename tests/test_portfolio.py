@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from ferpa_logic import COLUMNAS, DEFAULT_PARAMS, run_batch
+from ferpa_portfolio import parse_ramp, run_portfolio
+
+
+def test_later_plants_share_the_calendar_price_level():
+    plants = [dict(DEFAULT_PARAMS, start_year=2025), dict(DEFAULT_PARAMS, start_year=2028)]
+    cube = run_portfolio(plants, horizon=8)["plants"]
+    for column in ("Rev_Bloques", "Cost_Energy", "Cost_Payroll", "Ingresos", "EBITDA"):
+        k = COLUMNAS.index(column)
+        np.testing.assert_allclose(cube[1, 3:, k], cube[0, 3:, k], rtol=1e-12)
+        assert (cube[1, :3, k] == 0).all()
+
+
+def test_single_plant_matches_run_batch():
+    port = run_portfolio([dict(DEFAULT_PARAMS, start_year=2025)], horizon=10)
+    res = run_batch(**DEFAULT_PARAMS)
+    np.testing.assert_array_equal(port["plants"][0], res["data"][0])
+    np.testing.assert_allclose(port["metrics"]["npv"], res["metrics"]["npv"][0], rtol=1e-12)
+
+
+@pytest.mark.parametrize("text", ["0.5; 0.8", "0.5, x", "1.5", "-0.1"])
+def test_parse_ramp_rejects_bad_input(text):
+    with pytest.raises(ValueError):
+        parse_ramp(text)
+
+
+def test_parse_ramp():
+    assert parse_ramp(" 0.4, 0.7,0.9 ") == [0.4, 0.7, 0.9]
+    assert parse_ramp("") is None
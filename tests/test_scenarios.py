@@ -0,0 +1,21 @@
+import numpy as np
+
+from ferpa_logic import COLUMNAS, DEFAULT_PARAMS, run_batch
+from ferpa_scenarios import ScenarioStore
+
+
+def test_scenario_store_dedup_and_roundtrip(tmp_path):
+    store = ScenarioStore(str(tmp_path))
+    scenarios = [{"t_dia": 250.0}, {"t_dia": 350.0}, {"t_dia": 250.0}]
+    ids = store.add(scenarios, names=["a", "b", "c"])
+    assert ids[0] == ids[2] and len(store) == 2
+    assert store.add([{"t_dia": 350.0}]) == [ids[1]] and len(store) == 2
+    debt = {"tranches": [{"share": 0.4, "tenor": 6}]}
+    levered = store.add([{"t_dia": 250.0}], debt=debt, interest_rate=0.07)
+    assert levered[0] not in ids
+
+    reopened = ScenarioStore(str(tmp_path))
+    assert len(reopened) == 3
+    stored = reopened.results([ids[1]], columns=COLUMNAS).sort_values("Año")
+    res = run_batch(**{**DEFAULT_PARAMS, "t_dia": 350.0})
+    np.testing.assert_array_equal(stored[COLUMNAS].to_numpy(), res["data"][0])
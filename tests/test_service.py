@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import pytest
+
+import ferpa_service
+from ferpa_service import FerpaService
+
+
+async def exchange(port, raw):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return data
+
+
+def post(path, payload, headers=""):
+    body = json.dumps(payload).encode()
+    return (f"POST {path} HTTP/1.1\r\nHost: x\r\nContent-Length: {len(body)}\r\nConnection: close\r\n{headers}\r\n"
+            .encode() + body)
+
+
+def serve(scenario, **options):
+    async def main():
+        service = FerpaService(**options)
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        try:
+            return await scenario(service, server.sockets[0].getsockname()[1])
+        finally:
+            server.close()
+            await server.wait_closed()
+    return asyncio.run(main())
+
+
+def test_concurrent_requests_share_one_batch():
+    async def scenario(service, port):
+        replies = await asyncio.gather(*[exchange(port, post("/simulate", {"t_dia": 100 + i})) for i in range(6)])
+        return service, replies
+    service, replies = serve(scenario)
+    assert all(r.startswith(b"HTTP/1.1 200") for r in replies)
+    assert service.coalescer.batches == 1 and service.coalescer.scenarios == 6
+
+
+@pytest.mark.parametrize("length", ["abc", "-1", "1e3"])
+def test_invalid_content_length_is_a_400(length):
+    raw = f"POST /simulate HTTP/1.1\r\nHost: x\r\nContent-Length: {length}\r\n\r\n{{}}".encode()
+    reply = serve(lambda service, port: exchange(port, raw))
+    assert reply.startswith(b"HTTP/1.1 400")
+
+
+def test_failing_chunk_ends_the_stream_without_terminator(monkeypatch):
+    calls = []
+    real = ferpa_service.run_batch
+
+    def flaky(**kwargs):
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError("boom")
+        return real(**kwargs)
+    monkeypatch.setattr(ferpa_service, "run_batch", flaky)
+    reply = serve(lambda service, port: exchange(port, post("/batch", {"scenarios": [{"t_dia": 100}] * 5})),
+                  chunk_size=2)
+    assert reply.startswith(b"HTTP/1.1 200") and b"RuntimeError('boom')" in reply
+    assert not reply.endswith(b"0\r\n\r\n")
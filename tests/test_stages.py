@@ -0,0 +1,22 @@
+import numpy as np
+
+from ferpa_logic import DEFAULT_PARAMS, run_batch
+from ferpa_stages import IncrementalModel
+
+
+def test_incremental_model_matches_full_run():
+    model = IncrementalModel()
+    params = dict(DEFAULT_PARAMS)
+    steps = [{}, {"tax_rate": 0.15}, {"p_tipping": 22.0}, {"t_dia": 410.0}, {"tax_rate": 0.15}]
+    expected_runs = [None, ["waterfall", "metrics"], None, None, []]
+    for change, runs in zip(steps, expected_runs):
+        params.update(change)
+        res = model.run(**params)
+        full = run_batch(**params)
+        np.testing.assert_array_equal(res["data"], full["data"])
+        np.testing.assert_array_equal(res["metrics"]["npv"], full["metrics"]["npv"])
+        if runs is not None:
+            assert model.stages_run() == runs
+    # Results handed out must not alias the stage caches
+    res["flows"][:] = 0.0
+    np.testing.assert_array_equal(model.run(**params)["flows"], run_batch(**params)["flows"])
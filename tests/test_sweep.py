@@ -0,0 +1,25 @@
+import os
+
+import numpy as np
+import pytest
+
+from ferpa_logic import DEFAULT_PARAMS, run_batch
+from ferpa_sweep import load_sweep, run_sweep
+
+
+def test_sweep_resumes_missing_chunks(tmp_path):
+    out = str(tmp_path / "sweep")
+    grid = {"t_dia": [150.0, 300.0, 450.0], "capex": [6e6, 12e6, 18e6]}
+    first = run_sweep(grid, out, chunk_size=2, workers=1)
+    assert first["computed"] == 9 and first["chunks"] == 5
+    os.remove(os.path.join(out, "part-000002.parquet"))
+    again = run_sweep(grid, out, chunk_size=2, workers=1)
+    assert again["computed"] == 2 and again["skipped_chunks"] == 4
+
+    table = load_sweep(out).to_pandas().sort_values("scenario")
+    res = run_batch(**{**DEFAULT_PARAMS, "t_dia": table["t_dia"].to_numpy(), "capex": table["capex"].to_numpy()})
+    np.testing.assert_array_equal(table["npv"].to_numpy(), res["metrics"]["npv"])
+    with pytest.raises(ValueError):
+        run_sweep({**grid, "t_dia": [150.0]}, out, chunk_size=2, workers=1)
+    with pytest.raises(ValueError):
+        run_sweep(grid, out, chunk_size=2, workers=1, debt={"tranches": [{"share": 0.5}]})